@@ -24,6 +24,7 @@ from covsirphy.util.filer import save_dataframe
 from covsirphy.util.argument import find_args
 from covsirphy.util.filer import Filer
 from covsirphy.util.evaluator import Evaluator
+from covsirphy.util.executor import ParallelExecutor
 from covsirphy.util.validator import Validator
 from covsirphy.util.term import Term, Word
 # visualization
@@ -69,6 +70,10 @@ from covsirphy.ode.sirf import SIRF
 from covsirphy.ode.sirfv import SIRFV
 from covsirphy.ode.sewirf import SEWIRF
 from covsirphy.ode.ode_handler import ODEHandler
+from covsirphy.ode.ode_cache import SimulationCache
+from covsirphy.ode.trajectory_store import TrajectoryStore
+from covsirphy.ode.metapopulation import Metapopulation
+from covsirphy.ode.budget_scheduler import BudgetScheduler
 # simulation
 from covsirphy.simulation.estimator import Estimator, Optimizer
 from covsirphy.simulation.simulator import ODESimulator
@@ -114,7 +119,7 @@ def get_citation():
 
 __all__ = [
     # util
-    "StopWatch", "deprecate", "Term", "Filer", "Evaluator",
+    "StopWatch", "deprecate", "Term", "Filer", "Evaluator", "ParallelExecutor",
     "SubsetNotFoundError", "ScenarioNotFoundError",
     "PCRIncorrectPreconditionError", "NotInteractiveError",
     "NotRegisteredError", "NotRegisteredMainError", "NotRegisteredExtraError",
@@ -141,7 +146,7 @@ __all__ = [
     # trend
     "TrendDetector", "TrendPlot", "trend_plot",
     # ode
-    "ModelBase", "SIR", "SIRD", "SIRF", "SEWIRF", "ODEHandler",
+    "ModelBase", "SIR", "SIRD", "SIRF", "SEWIRF", "ODEHandler", "SimulationCache", "TrajectoryStore", "Metapopulation", "BudgetScheduler",
     # regression
     "RegressionHandler",
     # automl
@@ -9,6 +9,7 @@ from covsirphy.util.error import NAFoundError, UnExecutedError
 from covsirphy.util.validator import Validator
 from covsirphy.util.term import Term
 from covsirphy.ode.mbase import ModelBase
+from covsirphy.ode.ode_solver import _ODESolver
 from covsirphy.ode.ode_handler import ODEHandler
 from covsirphy.trend.trend_detector import TrendDetector
 
@@ -30,6 +31,7 @@ class Dynamics(Term):
                 - (numpy.float64): ODE parameter values defined with model.PARAMETERS
         tau (int or None): tau value [min] or None (to be estimated with covsirphy.Dynamics.estimate())
         area (str): area name (used in the figure title)
+        method (str): integration method of ODE, refer to covsirphy.ODEHandler
         **kwargs: keyword arguments of covsirphy.Dynamics.timepoints()
 
     Raises:
@@ -43,10 +45,11 @@ class Dynamics(Term):
     _PH = "Phase_ID"
     _SIFR = [Term.S, Term.CI, Term.F, Term.R]
 
-    def __init__(self, model, data, tau=None, area="Selected area", **kwargs):
+    def __init__(self, model, data, tau=None, area="Selected area", method="RK45", **kwargs):
         self._model = Validator(model, "model").subclass(ModelBase)
         self._area = str(area)
         self._tau = Validator(tau, "tau").tau(default=None)
+        self._method = Validator([method], "method").sequence(candidates=_ODESolver.METHODS)[0]
         # Records and date
         Validator(data, "data").dataframe(columns=[self.DATE, *self._SIFR, *self._model.PARAMETERS])
         self._data_df = data.set_index(self.DATE)
@@ -99,6 +102,7 @@ class Dynamics(Term):
                 last_date (str or pandas.Timestamp): the last date of simulation, default is today when executed + 180 days
                 tau (int or None): tau value [min] or None, default is 1440
                 area (str): area name, default is @model.NAME
+                method (str): integration method of ODE, default is "RK45"
         """
         today = datetime.now()
         cls_dict = {
@@ -222,12 +226,13 @@ class Dynamics(Term):
         detector = TrendDetector(data=df, area=self._area, min_size=min_size)
         return detector.sr(algo=algo, **kwargs)
 
-    def estimate(self, metric="RMSLE", n_jobs=-1, **kwargs):
+    def estimate(self, metric="RMSLE", n_jobs=-1, executor=None, **kwargs):
         """Estimate ODE parameter values and tau value of phases.
 
         Args:
             metric (str): metric name for estimation
             n_jobs (int): the number of parallel jobs or -1 (CPU count)
+            executor (covsirphy.ParallelExecutor or None): executor to keep alive across calls (e.g. regions) or None (use @n_jobs)
             kwargs: keyword arguments of ODEHandler.estimate_tau() and .estimate_param()
 
         Raises:
@@ -238,32 +243,135 @@ class Dynamics(Term):
 
         Note:
             Records except for NAs until today will be used for ODE parameter estimation.
+
+        Note:
+            With storage="sqlite:///estimation.db" (keyword argument of ODEHandler.estimate_param()), studies of Optuna will be saved
+            with the area name as the prefix of the study names and the estimation can be resumed.
+        """
+        handler, data_df, _ = self._estimation_handler(metric=metric, n_jobs=n_jobs, executor=executor, warm_start=False)
+        # Estimate tau (if necessary) and ODE parameter values
+        try:
+            self._tau, est_dict = handler.estimate(data_df, **{"study_name": self._area, **kwargs})
+        except UnExecutedError:
+            raise UnExecutedError("covsirphy.Dynamics.update()", details="No phases are filled with records.") from None
+        self._register(est_dict, overwrite=False)
+        return self
+
+    def extend(self, data, metric="RMSLE", n_jobs=-1, executor=None, **kwargs):
+        """Add new records (e.g. daily update) and re-estimate ODE parameter values of the phases which have the new records.
+
+        Args:
+            data (pandas.DataFrame): new records, overwriting the registered records of the same dates
+                Index
+                    reset index
+                Columns
+                    - Date (pandas.Timestamp): Observation date
+                    - Susceptible (int): the number of susceptible cases
+                    - Infected (int): the number of currently infected cases
+                    - Fatal (int): the number of fatal cases
+                    - Recovered (int): the number of recovered cases
+            metric (str): metric name for estimation
+            n_jobs (int): the number of parallel jobs or -1 (CPU count)
+            executor (covsirphy.ParallelExecutor or None): executor to keep alive across calls (e.g. regions) or None (use @n_jobs)
+            kwargs: keyword arguments of ODEHandler.estimate_param()
+
+        Raises:
+            UnExecutedError: tau value was not estimated yet, please use covsirphy.Dynamics.estimate() at first
+
+        Returns:
+            covsirphy.Dynamics: self
+
+        Note:
+            New dates after the last date will be added to the last phase and the last date will be moved.
+            Today will be moved to the last date of the new records when it is earlier (not beyond the last date).
+            Only the phases which include new or changed records will be re-estimated with the registered tau value,
+            starting from the registered parameter values (warm start). The other phases will not be changed.
+        """
+        if self._tau is None:
+            raise UnExecutedError("covsirphy.Dynamics.estimate()", details="Tau value is required to extend the records.")
+        Validator(data, "data").dataframe(columns=[self.DATE, *self._SIFR])
+        new_df = data.loc[:, [self.DATE, *self._SIFR]].set_index(self.DATE)
+        new_df.index = pd.to_datetime(new_df.index)
+        # Dates with new or changed records
+        old_df = self._all_df.reindex(index=new_df.index, columns=self._SIFR)
+        changed = new_df.index[(new_df.ne(old_df) & new_df.notna()).any(axis=1)]
+        if changed.empty:
+            return self
+        # Update records and time points, new dates will be included in the last phase
+        self._data_df = new_df.combine_first(self._data_df)
+        last = max(self._last, new_df.index.max())
+        if last > self._last:
+            ph_series = self._all_df[self._PH]
+            df = self._all_df.reindex(index=pd.date_range(start=self._first, end=last, freq="D"))
+            df.loc[df.index > self._last, [self._PH, self.ODE, self.TAU]] = [ph_series.iloc[-1], self._model.NAME, self._tau]
+            df[self._PH] = df[self._PH].astype(ph_series.dtype)
+            df.index.name = self.DATE
+            self._all_df = df.copy()
+            self._last = last
+        self._all_df.update(new_df)
+        # Today will be moved to the last date of the new records so that the phases include them
+        self._today = min(max(self._today, new_df.index.max()), self._last)
+        # Re-estimate the phases with the changed records
+        handler, data_df, phase_dict = self._estimation_handler(metric=metric, n_jobs=n_jobs, executor=executor, warm_start=True)
+        phases = [
+            phase for (phase, (start, end)) in phase_dict.items() if ((start <= changed) & (changed <= end)).any()]
+        if not phases:
+            return self
+        est_dict = handler.estimate_params(data_df, phases=phases, **{"study_name": self._area, **kwargs})
+        self._register(est_dict, overwrite=True)
+        return self
+
+    def _estimation_handler(self, metric, n_jobs, executor, warm_start):
+        """Create ODE handler with the phases filled with records until today for estimation.
+
+        Args:
+            metric (str): metric name for estimation
+            n_jobs (int): the number of parallel jobs or -1 (CPU count)
+            executor (covsirphy.ParallelExecutor or None): executor to keep alive across calls (e.g. regions) or None (use @n_jobs)
+            warm_start (bool): whether register the parameter values of the phases (when all of them were set) or not
+
+        Returns:
+            tuple(covsirphy.ODEHandler, pandas.DataFrame, dict[str, tuple(pandas.Timestamp, pandas.Timestamp)]):
+                - ODE handler
+                - records with phase IDs (reset index)
+                - start dates and end dates of the phases registered to the handler
         """
         data_df = self._all_df.loc[:self._today, [self._PH, *self._SIFR]]
         data_df = data_df.dropna(axis=0, how="any").reset_index()
         data_df[self._PH], _ = data_df[self._PH].factorize()
         start_dates = data_df.groupby(self._PH).first()[self.DATE].sort_values()
         end_dates = data_df.groupby(self._PH).last()[self.DATE].sort_values()
-        handler = ODEHandler(model=self._model, first_date=self._first, tau=self._tau, metric=metric, n_jobs=n_jobs)
+        handler = ODEHandler(
+            model=self._model, first_date=self._first, tau=self._tau, metric=metric, n_jobs=n_jobs, method=self._method,
+            executor=executor)
+        phase_dict = {}
         for start, end in zip(start_dates, end_dates):
             if end < start + timedelta(days=2):
                 continue
             if data_df[data_df[self.DATE] == end].isna().any().any():
                 continue
             y0_series = self._model.convert(data_df.loc[data_df[self.DATE] >= start], tau=None).iloc[0]
-            _ = handler.add(end, y0_dict=y0_series.to_dict())
-        # Estimate tau (if necessary) and ODE parameter values
-        try:
-            self._tau, est_dict = handler.estimate(data_df, **kwargs)
-        except UnExecutedError:
-            raise UnExecutedError("covsirphy.Dynamics.update()", details="No phases are filled with records.") from None
-        # Register phase information to self
+            param_dict = self._all_df.loc[start, self._model.PARAMETERS].to_dict() if warm_start else {}
+            param_dict = {k: v for (k, v) in param_dict.items() if pd.notna(v)}
+            _ = handler.add(end, y0_dict=y0_series.to_dict(), param_dict=param_dict)
+            phase_dict[self.num2str(len(phase_dict))] = (start, end)
+        return handler, data_df, phase_dict
+
+    def _register(self, est_dict, overwrite):
+        """Register the estimated values to self.
+
+        Args:
+            est_dict (dict(str, dict[str, object])): output of ODEHandler.estimate_params()
+            overwrite (bool): whether overwrite the registered values or not (only fill NAs)
+        """
         df = pd.DataFrame.from_dict(est_dict, orient="index")
         df[self.DATE] = df[[self.START, self.END]].apply(lambda x: pd.date_range(x[0], x[1]), axis=1)
         df = df.explode(self.DATE).drop([self.START, self.END], axis=1).set_index(self.DATE)
         df[self.TAU] = self._tau
-        self._all_df = self._all_df.combine_first(df)
-        return self
+        all_df = self._all_df.combine_first(df)
+        if overwrite:
+            all_df.update(df)
+        self._all_df = all_df
 
     def update(self, start_date, end_date, variable, value):
         """Update data and parameter values.
@@ -288,11 +396,9 @@ class Dynamics(Term):
         else:
             new_df = self._all_df.loc[Validator(start_date).date(): Validator(end_date).date(), parameters]
             new_df[variable] = Validator(value, f"value of {variable}").float(value_range=(0, 1))
-            new_df[self.RT] = new_df.apply(lambda x: self._model(population=1, **x.to_dict()).calc_r0(), axis=1)
+            new_df[self.RT] = self._model.calc_r0_array(new_df)
             if self._tau is not None:
-                days_df = new_df.drop(self.RT, axis=1).apply(
-                    lambda x: self._model(population=1, **x.to_dict()).calc_days_dict(tau=self._tau), axis=1)
-                new_df = pd.concat([new_df, days_df], axis=1)
+                new_df = pd.concat([new_df, self._model.calc_days_array(new_df, tau=self._tau)], axis=1)
         self._all_df.update(new_df)
         return self
 
@@ -309,12 +415,13 @@ class Dynamics(Term):
         Validator([variable], "variable").sequence(candidates=[*self._SIFR, *self._model.PARAMETERS])
         return self._all_df.loc[Validator(date, "date").date(), variable]
 
-    def simulate(self, ffill=True, model_specific=False):
+    def simulate(self, ffill=True, model_specific=False, interpolation=None):
         """Perform simulation with the multi-phased ODE model.
 
         Args:
             ffill (bool): whether propagate last valid ODE parameter values forward to next valid or not
             model_specific (bool): whether convert S, I, F, R to model-specific variables or not
+            interpolation (str or None): None (restart the solver for each phase), "constant" or "spline", refer to covsirphy.ODEHandler.simulate()
 
         Returns:
             pandas.DataFrame:
@@ -329,6 +436,75 @@ class Dynamics(Term):
                         - Recovered (int): the number of recovered cases
                     - if @model_specific is True, variables defined by model.VARIABLES of covsirphy.Dynamics(model)
         """
+        handler = self._ode_handler(ffill=ffill)
+        sim_df = handler.simulate(interpolation=interpolation)
+        if model_specific:
+            return self._model.convert(sim_df, tau=self._tau).convert_dtypes()
+        return sim_df.convert_dtypes()
+
+    def simulate_ensemble(self, draws, q=(0.025, 0.5, 0.975), ffill=True, chunk_size=1000, bins=1024, filename=None):
+        """Perform simulation with sets of parameter values (e.g. samples of posterior distributions) and return quantiles for each date.
+
+        Args:
+            draws (pandas.DataFrame or dict[str, pandas.DataFrame]): parameter values of all phases or the phases (e.g. "0th")
+                Index
+                    reset index
+                Columns
+                    (float): a part or all of model.PARAMETERS (the values of the phases will be used for the others)
+            q (list[float]): quantiles in [0, 1]
+            ffill (bool): whether propagate last valid ODE parameter values forward to next valid or not
+            chunk_size (int): the number of draws to simulate at once
+            bins (int): the number of bins of histograms to estimate quantiles with, for each date and variable
+            filename (str or pathlib.Path or None): filename to save all trajectories with covsirphy.TrajectoryStore or None (not saved)
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    Date (pandas.Timestamp): observation dates
+                Columns
+                    pandas.MultiIndex: variables of the model (model.VARIABLES) and @q
+
+        Note:
+            Please refer to covsirphy.ODEHandler.simulate_ensemble() for details.
+        """
+        handler = self._ode_handler(ffill=ffill)
+        return handler.simulate_ensemble(draws=draws, q=q, chunk_size=chunk_size, bins=bins, filename=filename)
+
+    def simulate_stochastic(self, replicates=1000, q=(0.025, 0.5, 0.975), seed=0, ffill=True, chunk_size=1000, bins=1024, filename=None):
+        """Perform stochastic simulation (binomial chains) with replicates and return quantiles for each date.
+
+        Args:
+            replicates (int): the number of replicates
+            q (list[float]): quantiles in [0, 1]
+            seed (int or None): seed of the random number generator, None means un-reproducible results
+            ffill (bool): whether propagate last valid ODE parameter values forward to next valid or not
+            chunk_size (int): the number of replicates to simulate at once
+            bins (int): the number of bins of histograms to estimate quantiles with, for each date and variable
+            filename (str or pathlib.Path or None): filename to save all trajectories with covsirphy.TrajectoryStore or None (not saved)
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    Date (pandas.Timestamp): observation dates
+                Columns
+                    pandas.MultiIndex: variables of the model (model.VARIABLES) and @q
+
+        Note:
+            Please refer to covsirphy.ODEHandler.simulate_stochastic() for details.
+        """
+        handler = self._ode_handler(ffill=ffill)
+        return handler.simulate_stochastic(
+            replicates=replicates, q=q, seed=seed, chunk_size=chunk_size, bins=bins, filename=filename)
+
+    def _ode_handler(self, ffill):
+        """Create ODE handler with the phases.
+
+        Args:
+            ffill (bool): whether propagate last valid ODE parameter values forward to next valid or not
+
+        Returns:
+            covsirphy.ODEHandler: handler with the phases
+        """
         all_df = self._all_df.copy()
         date_df = all_df.loc[:, [self._PH]].reset_index()
         start_dates = date_df.groupby(self._PH).first()[self.DATE].sort_values()
@@ -336,8 +512,8 @@ class Dynamics(Term):
         param_df = all_df.loc[:, self._model.PARAMETERS]
         if ffill:
             param_df.ffill(inplace=True)
-        # Simulation
-        handler = ODEHandler(model=self._model, first_date=self._first, tau=self._tau)
+        # Register the phases
+        handler = ODEHandler(model=self._model, first_date=self._first, tau=self._tau, method=self._method)
         for start, end in zip(start_dates, end_dates):
             param_dict = param_df.loc[start].to_dict()
             if None in param_dict.values():
@@ -350,10 +526,7 @@ class Dynamics(Term):
             else:
                 y0_dict = self._model.convert(ph_df, tau=None).iloc[0].to_dict()
             _ = handler.add(end, param_dict=param_dict, y0_dict=y0_dict)
-        sim_df = handler.simulate()
-        if model_specific:
-            return self._model.convert(sim_df, tau=self._tau).convert_dtypes()
-        return sim_df.convert_dtypes()
+        return handler
 
     def track(self, ffill=True):
         """Track data with all dates.
@@ -390,14 +563,10 @@ class Dynamics(Term):
         # Reproduction number
         if self.RT not in df:
             df[self.RT] = None
-        df.loc[df[self.RT].isna(), self.RT] = df.loc[df[self.RT].isna(), parameters].apply(
-            lambda x: self._model(population=1, **x.to_dict()).calc_r0(), axis=1)
+        df.loc[df[self.RT].isna(), self.RT] = self._model.calc_r0_array(df.loc[df[self.RT].isna(), parameters])
         # Days-parameters
         if self._tau is not None:
-            days_df = df[parameters].apply(
-                lambda x: self._model(population=1, **x.to_dict()).calc_days_dict(tau=self._tau),
-                axis=1, result_type="expand")
-            df = df.combine_first(days_df)
+            df = df.combine_first(self._model.calc_days_array(df[parameters], tau=self._tau))
         # Set the order of columns
         fixed_cols = [
             self.DATE, self.C, self.CI, self.F, self.R, self.S, self.RT, *parameters, self.TAU, *self._model.DAY_PARAMETERS]
@@ -92,12 +92,11 @@ class ModelValidator(Term):
                     - step_n (int): step number of simulation
         """
         np.random.seed(self._seed)
-        population = model.EXAMPLE[self.N.lower()]
         # Parameter set
         parameters = model.PARAMETERS[:]
         df = pd.DataFrame(np.random.rand(self._n_trials, len(parameters)), columns=parameters)
         # Reproduction number
-        df[self.RT] = df.apply(lambda x: model(population, **x.to_dict()).calc_r0(), axis=1)
+        df[self.RT] = model.calc_r0_array(df)
         # Tau value
         df[self.TAU] = self._tau
         # Step number
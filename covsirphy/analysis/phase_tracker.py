@@ -396,14 +396,11 @@ class PhaseTracker(Term):
         new_df.insert(0, self.ODE, model.NAME)
         # Calculate reproduction number
         new_df.insert(1, self.RT, None)
-        new_df[self.RT] = new_df[model.PARAMETERS].apply(
-            lambda x: model(1, **x.to_dict()).calc_r0(), axis=1)
+        new_df[self.RT] = model.calc_r0_array(new_df[model.PARAMETERS])
         # Add tau
         new_df[self.TAU] = self._tau
         # Calculate days parameters
-        days_df = new_df[model.PARAMETERS].apply(
-            lambda x: pd.Series(model(1, **x.to_dict()).calc_days_dict(self._tau)), axis=1)
-        new_df = pd.concat([new_df, days_df], axis=1)
+        new_df = pd.concat([new_df, model.calc_days_array(new_df[model.PARAMETERS], tau=self._tau)], axis=1)
         # update tracker
         columns_include_dup = [*self._track_df.columns.tolist(), *new_df.columns.tolist()]
         track_df = self._track_df.reindex(
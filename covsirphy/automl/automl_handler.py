@@ -99,7 +99,7 @@ class AutoMLHandler(Term):
         df = self._pred_df.copy()
         # Calculate reproduction number to create phases
         df["param"] = df[self._model.PARAMETERS].to_dict(orient="records")
-        df[self.RT] = df.apply(lambda x: self._model(population=100, **x["param"]).calc_r0(), axis=1).round(1)
+        df[self.RT] = pd.Series(self._model.calc_r0_array(df), index=df.index).round(1)
         # Get start/end date
         criteria = [self.SERIES, self.RT]
         df = df.groupby(criteria).first().join(df[[*criteria, self.DATE]].groupby(criteria).last(), rsuffix="_last")
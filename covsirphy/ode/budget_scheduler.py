@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import functools
+import numpy as np
+from covsirphy.util.error import UnExecutedError, UnExpectedValueError
+from covsirphy.util.executor import ParallelExecutor
+from covsirphy.util.stopwatch import StopWatch
+from covsirphy.util.validator import Validator
+from covsirphy.util.term import Term
+from covsirphy.ode.ode_handler import ODEHandler
+from covsirphy.ode.param_estimator import _ParamEstimator
+
+
+class BudgetScheduler(Term):
+    """
+    Distribute a global trial budget and/or time budget of parameter estimation to the phases of ODEHandlers (e.g. regions) dynamically.
+
+    Args:
+        n_trials (int or None): the total number of trials of all phases or None (not limited with the number of trials)
+        timeout (float or None): total wall-clock time of optimization [sec] or None (not limited with time)
+        batch_size (int): the number of trials of a phase in one round (simulated at once)
+        tail_n (int): the number of rounds to decide whether score of a phase did not change for the last rounds
+        tolerance (float): relative improvement of the score to regard as converged over the last @tail_n rounds
+        allowance (tuple(float, float)): the allowance of the max predicted values
+        n_jobs (int): the number of parallel jobs or -1 (CPU count)
+        executor (covsirphy.ParallelExecutor or None): executor to keep alive across calls or None (use @n_jobs)
+
+    Raises:
+        ValueError: both of @n_trials and @timeout are None
+
+    Note:
+        Optimization runs in rounds. In a round, the study of each selected phase asks @batch_size trials of TPE sampler,
+        the trials of the phases are simulated in parallel and the scores are told to the studies.
+        Studies are kept in the main process and only the suggested parameter values are sent to the workers.
+        Phases converged (refer to @tail_n, @tolerance and @allowance) release their budget.
+        All phases will be selected in the first round within @n_trials. When the remaining budget is not enough for all active phases,
+        phases with higher priority, i.e. (the best score) * (1 + relative improvement of the score in the last @tail_n rounds),
+        will be selected. Phases which are poorly fit or still improving will get more trials.
+
+    Note:
+        Time cost of a phase in a round is estimated with its runtime of the last round, i.e. the runtime of asking and telling trials
+        in the main process and the runtime of the simulation in the workers with the overhead of parallel processing.
+        The next round will not start when it will exceed @timeout.
+
+    Examples:
+        >>> import covsirphy as cs
+        >>> scheduler = cs.BudgetScheduler(timeout=3600)
+        >>> for (region, record_df) in record_dict.items():
+        >>>     handler = cs.ODEHandler(cs.SIRF, first_date=record_df["Date"].min(), tau=1440)
+        >>>     ...
+        >>>     scheduler.add(region, handler, record_df)
+        >>> result_dict = scheduler.run()
+        >>> result_dict["Japan"]["0th"]["rho"]
+    """
+
+    def __init__(self, n_trials=None, timeout=None, batch_size=32, tail_n=4, tolerance=0.01, allowance=(0.99, 1.01), n_jobs=-1, executor=None):
+        if n_trials is None and timeout is None:
+            raise ValueError("Either @n_trials or @timeout must be specified.")
+        self._n_trials = Validator(n_trials, "n_trials").int(value_range=(1, None), default=None)
+        self._timeout = Validator(timeout, "timeout").float(value_range=(0, None), default=None)
+        self._batch_size = Validator(batch_size, "batch_size").int(value_range=(1, None))
+        self._tail_n = Validator(tail_n, "tail_n").int(value_range=(1, None))
+        self._tolerance = Validator(tolerance, "tolerance").float(value_range=(0, None))
+        self._allowance = tuple(Validator(allowance, "allowance").sequence())
+        self._executor = None if executor is None else Validator(executor, "executor").instance(ParallelExecutor)
+        self._n_jobs = n_jobs
+        # {(name, phase): [handler, estimator, priority]}
+        self._task_dict = {}
+
+    def add(self, name, handler, data, quantiles=(0.1, 0.9), phases=None, study_dict=None, **kwargs):
+        """
+        Register the phases of an ODEHandler.
+
+        Args:
+            name (str): name of the handler, e.g. region name
+            handler (covsirphy.ODEHandler): handler with tau value and phases
+            data (pandas.DataFrame): records, refer to covsirphy.ODEHandler.estimate_params()
+            quantiles (tuple(int, int)): quantiles to cut parameter range, like confidence interval
+            phases (list[str] or None): names of the phases to estimate (e.g. ["3rd"]) or None (all phases)
+            study_dict (dict[str, object] or None): setting of optimization study, refer to covsirphy.ODEHandler.estimate_params()
+            kwargs: we can set arguments of @study_dict directly
+
+        Raises:
+            covsirphy.UnExecutedError: either tau value or phase information was not set
+            covsirphy.UnExpectedValueError: the phases of the name were already registered
+
+        Returns:
+            covsirphy.BudgetScheduler: self
+
+        Note:
+            When "study_name" is not included in @study_dict, @name will be used as the prefix of the names of the studies.
+            Registered parameter values of the phases will be used as prior values (warm start).
+        """
+        name = str(name)
+        handler = Validator(handler, "handler").instance(ODEHandler)
+        Validator(data, "data").dataframe(columns=self.DSIFR_COLUMNS)
+        df = data.loc[:, self.DSIFR_COLUMNS]
+        if not handler._info_dict:
+            raise UnExecutedError("ODEHandler.add()")
+        if handler._tau is None:
+            raise UnExecutedError("ODEHandler.estimate_tau()", details="Tau value is required to schedule estimation")
+        if name in {task_name for (task_name, _) in self._task_dict.keys()}:
+            raise UnExpectedValueError("name", name, candidates=["names which are not registered"])
+        study_kwargs = {**handler._STUDY_DICT, "study_name": name}
+        study_kwargs.update(study_dict or {})
+        study_kwargs.update(kwargs)
+        all_phases = list(handler._info_dict.keys())
+        for phase in Validator(phases, "phases").sequence(default=all_phases, candidates=all_phases):
+            estimator = handler._estimator(phase, data=df, quantiles=quantiles, optimizer="tpe")
+            estimator.start(handler._study_dict(phase, study_kwargs, data=df), priors=handler._priors(phase), center=handler._center(phase))
+            self._task_dict[(name, phase)] = [handler, estimator, np.inf]
+        return self
+
+    @staticmethod
+    def _score(item, kwargs_dict):
+        """
+        Calculate scores of the trials of a phase.
+
+        Args:
+            item (tuple(tuple(str, str), numpy.ndarray)): name and phase, values of non-dimensional model parameters, shape (N, n_params)
+            kwargs_dict (dict[tuple(str, str), dict[str, object]]): keyword arguments of _ParamEstimator._score_params() for the phases
+
+        Returns:
+            tuple(numpy.ndarray, float): scores, shape (N,), and runtime [sec]
+        """
+        key, params = item
+        stopwatch = StopWatch()
+        scores = _ParamEstimator._score_params(params, **kwargs_dict[key])
+        return (scores, stopwatch.stop())
+
+    def _priority(self, estimator):
+        """
+        Return the priority of the phase.
+
+        Args:
+            estimator (_ParamEstimator): estimator of the phase
+
+        Returns:
+            float: (the best score) * (1 + relative improvement of the score in the last @tail_n rounds)
+        """
+        scores = estimator.scores
+        previous = scores[-min(self._tail_n, len(scores))]
+        improvement = (previous - scores[-1]) / previous if previous > 0 else 0
+        return scores[-1] * (1 + max(improvement, 0))
+
+    def _select(self, keys, trials_left, time_left, cost_dict):
+        """
+        Select the phases to run in the next round with the remaining budget.
+
+        Args:
+            keys (list[tuple(str, str)]): names and phases of the active tasks
+            trials_left (int or None): the remaining number of trials or None (not limited)
+            time_left (float or None): the remaining time [sec] or None (not limited)
+            cost_dict (dict[tuple(str, str), float]): estimated wall-clock time of the tasks in a round [sec]
+
+        Returns:
+            list[tuple(tuple(str, str), int)]: names and phases of the selected tasks and the numbers of trials
+        """
+        selected, trial_cost, time_cost = [], 0, 0
+        for key in sorted(keys, key=lambda x: self._task_dict[x][2], reverse=True):
+            size = self._batch_size if trials_left is None else min(self._batch_size, trials_left - trial_cost)
+            if size <= 0 or (time_left is not None and time_cost + cost_dict[key] > time_left):
+                continue
+            selected.append((key, size))
+            trial_cost, time_cost = trial_cost + size, time_cost + cost_dict[key]
+        return selected
+
+    def run(self):
+        """
+        Run parameter estimation of the registered phases with the budget and register the estimated values to the handlers.
+
+        Raises:
+            covsirphy.UnExecutedError: no phases were registered with BudgetScheduler.add()
+
+        Returns:
+            dict[str, dict[str, dict[str, object]]]: results of the names and phases, refer to covsirphy.ODEHandler.estimate_params()
+
+        Note:
+            @n_trials is a hard cap. When it is smaller than the number of the phases, some phases will not be estimated
+            and they will not be included in the returned dictionary.
+        """
+        if not self._task_dict:
+            raise UnExecutedError("BudgetScheduler.add()")
+        # Studies are kept in the main process and only the asked parameter values will be sent to the workers
+        keys = list(self._task_dict.keys())
+        score_f = functools.partial(self._score, kwargs_dict={key: self._task_dict[key][1].score_kwargs for key in keys})
+        with (contextlib.nullcontext(self._executor) if self._executor is not None else ParallelExecutor(n_jobs=self._n_jobs)) as executor:
+            n_jobs = executor.n_jobs
+            print(f"\n<Parameter estimation with budget: {self._n_trials} trials, {self._timeout} sec>")
+            print(f"Running optimization of {len(self._task_dict)} phases with {n_jobs} CPUs...")
+            stopwatch = StopWatch()
+            # Runtime of the tasks in the last round: in the main process (ask and tell) and in the workers (score)
+            used, serial_dict, parallel_dict, overhead = 0, dict.fromkeys(keys, 0.0), dict.fromkeys(keys, 0.0), 1.0
+            # The first round: all phases within the trial budget
+            selected = self._select(keys, trials_left=self._n_trials, time_left=None, cost_dict=serial_dict)
+            while selected:
+                round_start = stopwatch.stop()
+                asked_dict = {}
+                for (key, size) in selected:
+                    ask_start = stopwatch.stop()
+                    asked_dict[key] = self._task_dict[key][1].ask(size)
+                    serial_dict[key] = stopwatch.stop() - ask_start
+                results = executor.map(score_f, [(key, asked_dict[key][1]) for (key, _) in selected])
+                for ((key, size), (scores, score_runtime)) in zip(selected, results):
+                    tell_start = stopwatch.stop()
+                    parallel_dict[key] = score_runtime
+                    estimator = self._task_dict[key][1]
+                    estimator.tell(asked_dict[key][0], scores)
+                    self._task_dict[key][2] = self._priority(estimator)
+                    if estimator.is_converged(self._tail_n, self._tolerance, self._allowance):
+                        keys.remove(key)
+                    serial_dict[key] += stopwatch.stop() - tell_start
+                    used += size
+                # Overhead of scoring in the workers (e.g. communication), the estimated time costs sum up to the runtime of a round
+                serial_time = sum(serial_dict[key] for (key, _) in selected)
+                parallel_time = sum(parallel_dict[key] for (key, _) in selected) / n_jobs
+                if parallel_time > 0:
+                    overhead = max((stopwatch.stop() - round_start - serial_time) / parallel_time, 1.0)
+                cost_dict = {key: serial_dict[key] + last_runtime * overhead / n_jobs for (key, last_runtime) in parallel_dict.items()}
+                # Select phases with the remaining budget
+                trials_left = None if self._n_trials is None else self._n_trials - used
+                time_left = None if self._timeout is None else self._timeout - stopwatch.stop()
+                selected = self._select(keys, trials_left=trials_left, time_left=time_left, cost_dict=cost_dict)
+        # Register the estimated values
+        result_dict = {}
+        for ((name, phase), (handler, estimator, _)) in self._task_dict.items():
+            if not estimator.scores:
+                print(f"\t{name} {phase:>4} phase: skipped because of the budget")
+                continue
+            est_dict = estimator.result()
+            print(f"\t{name} {phase:>4} phase: finished {est_dict[self.TRIALS]:>4} trials in {est_dict[self.RUNTIME]}")
+            result_dict.setdefault(name, {})[phase] = handler._register_params(phase, est_dict)
+        print(f"Completed optimization. Total: {stopwatch.stop_show()}")
+        return result_dict
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from scipy.optimize import minimize
+from covsirphy.util.error import UnExpectedValueError
+from covsirphy.util.stopwatch import StopWatch
+from covsirphy.ode.ode_solver import _ODESolver
+from covsirphy.ode.param_estimator import _ParamEstimator
+
+
+class _GradientEstimator(_ParamEstimator):
+    """
+    Estimate ODE parameter values with records, using L-BFGS-B method and forward sensitivities.
+
+    Args:
+        model (covsirphy.ModelBase): ODE model
+        data (pandas.DataFrame):
+            Index
+                reset index
+            Columns
+                - Date (pd.Timestamp): Observation date
+                - Susceptible(int): the number of susceptible cases
+                - Infected (int): the number of currently infected cases
+                - Fatal(int): the number of fatal cases
+                - Recovered (int): the number of recovered cases
+        tau (int): tau value [min]
+        metric (str): metric to report the score with, MSLE or RMSLE
+        quantiles (tuple(int, int)): quantiles to cut parameter range, like confidence interval
+        method (str): integration method, refer to _ODESolver.METHODS
+
+    Raises:
+        covsirphy.UnExpectedValueError: @metric is not MSLE or RMSLE
+
+    Note:
+        Mean squared logarithmic error (MSLE) of the variables (except for Susceptible) will be minimized.
+        This is the same as minimizing RMSLE, but the other metrics are not supported.
+        Gradients are calculated with sensitivities dX/dp, solving forward sensitivity equations with the variables.
+    """
+    # Metrics minimized with MSLE
+    METRICS = ["MSLE", "RMSLE"]
+
+    def __init__(self, model, data, tau, metric, quantiles, method="RK45"):
+        super().__init__(model=model, data=data, tau=tau, metric=metric, quantiles=quantiles, method=method)
+        if self._metric not in self.METRICS:
+            raise UnExpectedValueError("metric", metric, candidates=self.METRICS, details="L-BFGS-B method minimizes MSLE")
+        # Bounds of parameter values: range was cut with the quantiles
+        ranges = [np.asarray(self._range_dict[param], dtype=np.float64) for param in model.PARAMETERS]
+        self._lower = np.array([np.nan_to_num(v.min(), nan=0, posinf=1, neginf=0) for v in ranges])
+        self._upper = np.array([np.nan_to_num(v.max(), nan=1, posinf=1, neginf=0) for v in ranges])
+        # Initial parameter values: median
+        guess_dict = model.guess(data, tau, q=0.5)
+        self._p0 = np.clip([guess_dict[param] for param in model.PARAMETERS], self._lower, self._upper)
+
+    def run(self, check_dict, study_dict, priors=None, center=None):
+        """
+        Perform parameter estimation of the ODE model, not including tau.
+
+        Args:
+            check_dict (dict[str, object]): setting of validation
+                - maxiter (int): the maximum number of iterations of L-BFGS-B method, 100 when not included
+                - the other keys will be ignored
+            study_dict (dict[str, object]): not used, kept for compatibility with _ParamEstimator.run()
+            priors (list[dict[str, float]] or None): prior parameter values (e.g. the last estimation) or None (median values of the guess)
+            center (dict[str, float] or None): parameter values to start with (e.g. the last estimation) or None (the first prior values)
+
+        Returns:
+            dict(str, object):
+                - Rt (float): phase-dependent reproduction number
+                - (dict(str, float)): estimated parameter values
+                - (dict(str, int or float)): day parameters, including 1/beta [days]
+                - {metric}: score with the estimated parameter values
+                - Trials (int): the number of solutions of the ODE with sensitivities
+                - Runtime (str): runtime of optimization
+
+        Note:
+            Parameter values are scaled to [0, 1] with the bounds for optimization.
+            With @priors, optimization will start with @center (or the first prior values) and the bounds will be extended to include them.
+        """
+        stopwatch = StopWatch()
+        priors = [center, *(priors or [])] if center is not None else priors
+        if priors:
+            prior_array = np.array([[prior_dict[param] for param in self._model.PARAMETERS] for prior_dict in priors])
+            self._p0 = prior_array[0]
+            self._lower, self._upper = np.fmin(self._lower, prior_array.min(axis=0)), np.fmax(self._upper, prior_array.max(axis=0))
+        width = np.where(self._upper > self._lower, self._upper - self._lower, 1.0)
+        result = minimize(
+            lambda u: self._loss_and_gradient(self._lower + u * width, scale=width),
+            x0=(self._p0 - self._lower) / width, jac=True, method="L-BFGS-B",
+            bounds=[(0, 1) for _ in self._model.PARAMETERS],
+            options={"maxiter": check_dict.get("maxiter", 100)})
+        param_dict = dict(zip(self._model.PARAMETERS, (self._lower + np.clip(result.x, 0, 1) * width).tolist()))
+        model_instance = self._model(self._population, **param_dict)
+        return {
+            self.RT: model_instance.calc_r0(),
+            **param_dict,
+            **model_instance.calc_days_dict(self._tau),
+            self._metric: self._score(**param_dict),
+            self.TRIALS: result.nfev,
+            self.RUNTIME: stopwatch.stop_show(),
+        }
+
+    def _loss_and_gradient(self, params, scale=1.0):
+        """
+        Calculate MSLE and its gradient with respect to the parameters.
+
+        Args:
+            params (numpy.ndarray): values of non-dimensional model parameters, ordered as model.PARAMETERS
+            scale (float or numpy.ndarray): values to multiply the gradient by (chain rule of scaling)
+
+        Returns:
+            tuple(float, numpy.ndarray): MSLE and its gradient, shape (n_params,)
+        """
+        sim_array, sens_array = _ODESolver.run_sensitivity(
+            self._model, params, self._y0, step_n=self._step_n, method=self._method)
+        # The first variable (Susceptible) will be ignored
+        sim, sens = sim_array[self._actual_steps, 1:], sens_array[self._actual_steps, 1:]
+        diff = np.log1p(np.maximum(sim, 0)) - np.log1p(self._actual)
+        loss = np.mean(np.square(diff))
+        # d(loss)/dp = mean(2 * diff / (1 + X) * dX/dp), negative values were regarded as 0
+        weights = np.where(sim > 0, 2 * diff / (1 + np.maximum(sim, 0)), 0) / diff.size
+        gradient = np.einsum("ij,ijk->k", weights, sens)
+        return float(loss), gradient * scale
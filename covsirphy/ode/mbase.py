@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from datetime import timedelta
 import numpy as np
 import pandas as pd
 from covsirphy.util.error import deprecate, NAFoundError
@@ -25,6 +24,8 @@ class ModelBase(Term):
     WEIGHTS = np.array(list())
     # Variables that increases monotonically
     VARS_INCREASE = list()
+    # Transitions between variables (source, destination) for stochastic simulation
+    TRANSITIONS = list()
     # Example set of parameters and initial values
     EXAMPLE = {
         Term.STEP_N: 180,
@@ -59,7 +60,7 @@ class ModelBase(Term):
             raise KeyError(f"key must be in {', '.join(self.PARAMETERS)}")
         return self.non_param_dict[key]
 
-    def __call__(self, t, X):
+    def __call__(self, t, X, out=None):
         """
         Return the list of dS/dt (tau-free) etc.
         This method should be overwritten in subclass.
@@ -69,6 +70,97 @@ class ModelBase(Term):
         """
         raise NotImplementedError
 
+    def jacobian(self, t, X):
+        """
+        Return the Jacobian matrix of the right-hand side, d(dX/dt)/dX.
+
+        Args:
+            t (int): time steps
+            X (numpy.array): values of th model variables
+
+        Returns:
+            numpy.ndarray: shape (n_vars, n_vars)
+
+        Note:
+            This can be used as "jac" argument of implicit solvers (Radau, BDF, LSODA) of scipy.integrate.solve_ivp().
+        """
+        return self._jacobian(X, [self.non_param_dict[param] for param in self.PARAMETERS], self.population)
+
+    @classmethod
+    def _dydt(cls, X, params, population, out=None):
+        """
+        Return the list of dS/dt (tau-free) etc. with arrays of variables and parameter values.
+        This method should be overwritten in subclass.
+
+        Args:
+            X (numpy.ndarray): values of the model variables ordered as cls.VARIABLES, shape (n_vars,) or (n_vars, N)
+            params (numpy.ndarray): parameter values ordered as cls.PARAMETERS, shape (n_params,) or (n_params, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+            out (numpy.ndarray or None): array to save the results in (with the same shape as @X) or None (create new one)
+
+        Returns:
+            numpy.ndarray: shape (n_vars,) or (n_vars, N)
+
+        Note:
+            With the second axis, N systems will be handled at once.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def _jacobian(cls, X, params, population):
+        """
+        Return the Jacobian matrix of the right-hand side with arrays of variables and parameter values.
+        This method should be overwritten in subclass.
+
+        Args:
+            X (numpy.ndarray): values of the model variables ordered as cls.VARIABLES, shape (n_vars,) or (n_vars, N)
+            params (numpy.ndarray): parameter values ordered as cls.PARAMETERS, shape (n_params,) or (n_params, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+
+        Returns:
+            numpy.ndarray: d(dX/dt)/dX, shape (n_vars, n_vars) or (n_vars, n_vars, N)
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def _param_jacobian(cls, X, params, population):
+        """
+        Return the partial derivatives of the right-hand side with respect to the parameters.
+        This method should be overwritten in subclass.
+
+        Args:
+            X (numpy.ndarray): values of the model variables ordered as cls.VARIABLES, shape (n_vars,) or (n_vars, N)
+            params (numpy.ndarray): parameter values ordered as cls.PARAMETERS, shape (n_params,) or (n_params, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+
+        Returns:
+            numpy.ndarray: d(dX/dt)/dp, shape (n_vars, n_params) or (n_vars, n_params, N)
+
+        Note:
+            This is used to solve forward sensitivity equations, dS/dt = J S + d(dX/dt)/dp.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def _transition_rates(cls, X, params, population):
+        """
+        Return per-capita rates of the transitions between variables (cls.TRANSITIONS).
+        This method should be overwritten in subclass.
+
+        Args:
+            X (numpy.ndarray): values of the model variables ordered as cls.VARIABLES, shape (n_vars,) or (n_vars, N)
+            params (numpy.ndarray): parameter values ordered as cls.PARAMETERS, shape (n_params,) or (n_params, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+
+        Returns:
+            numpy.ndarray: shape (n_transitions,) or (n_transitions, N)
+
+        Note:
+            The number of cases which move from the source variable to the destination variable in a time step
+            is the population of the source multiplied by the rate (as hazard), used for stochastic simulation.
+        """
+        raise NotImplementedError
+
     @classmethod
     @deprecate(".param_range()", new=".guess()", version="2.19.1-zeta-fu1")
     def param_range(cls, taufree_df, population, quantiles=(0.3, 0.7)):
@@ -152,26 +244,106 @@ class ModelBase(Term):
     def calc_r0(self):
         """
         Calculate (basic) reproduction number.
-        This method should be overwritten in subclass.
 
         Returns:
-            float
+            float or None: reproduction number or None (un-defined)
         """
-        raise NotImplementedError
+        r0 = self.calc_r0_array({param: [value] for (param, value) in self.non_param_dict.items()})[0]
+        return None if np.isnan(r0) else float(r0)
 
     def calc_days_dict(self, tau):
         """
         Calculate 1/beta [day] etc.
-        This method should be overwritten in subclass.
 
         Args:
             param tau (int): tau value [min]
 
         Returns:
-            dict[str, int]
+            dict[str, int]: values of day parameters, None when un-defined
+        """
+        days_df = self.calc_days_array({param: [value] for (param, value) in self.non_param_dict.items()}, tau=tau)
+        return days_df.astype(object).where(days_df.notna(), None).iloc[0].to_dict()
+
+    @classmethod
+    def calc_r0_array(cls, params):
+        """
+        Calculate (basic) reproduction numbers with arrays of parameter values.
+        This method should be overwritten in subclass.
+
+        Args:
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values, columns (keys) are cls.PARAMETERS
+
+        Returns:
+            numpy.ndarray: reproduction numbers (rounded to 2 decimal places), numpy.nan when un-defined
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def calc_days_array(cls, params, tau):
+        """
+        Calculate 1/beta [day] etc. with arrays of parameter values.
+        This method should be overwritten in subclass.
+
+        Args:
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values, columns (keys) are cls.PARAMETERS
+            tau (int): tau value [min]
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    index of @params (when dataframe) or reset index
+                Columns
+                    cls.DAY_PARAMETERS (int or float): values of day parameters, NA when un-defined
         """
         raise NotImplementedError
 
+    @staticmethod
+    def _param_arrays(params, names):
+        """
+        Return arrays of the parameter values.
+
+        Args:
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values
+            names (list[str]): names of the parameters
+
+        Returns:
+            list[numpy.ndarray]: float values of the parameters
+        """
+        return [np.asarray(params[name], dtype=np.float64) for name in names]
+
+    @staticmethod
+    def _rate_to_days(rate, tau):
+        """
+        Convert rates [-] to days, like int(tau / 24 / 60 / rate).
+
+        Args:
+            rate (numpy.ndarray): rates (non-dimensional parameter values)
+            tau (int): tau value [min]
+
+        Returns:
+            numpy.ndarray: days (truncated to integers), numpy.nan when un-defined (e.g. zero rates)
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days = np.trunc(tau / 24 / 60 / rate)
+        return np.where(np.isfinite(days), days, np.nan)
+
+    @classmethod
+    def _days_dataframe(cls, params, days_dict):
+        """
+        Create a dataframe of day parameters, all values of a row will be NA when some of them are un-defined.
+
+        Args:
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values
+            days_dict (dict[str, numpy.ndarray]): values of day parameters (cls.DAY_PARAMETERS)
+
+        Returns:
+            pandas.DataFrame: refer to cls.calc_days_array()
+        """
+        index = params.index if isinstance(params, pd.DataFrame) else None
+        df = pd.DataFrame(days_dict, index=index).reindex(columns=cls.DAY_PARAMETERS)
+        df.loc[df.isna().any(axis=1)] = np.nan
+        return df.astype({col: "Int64" for col in cls.DAY_PARAMETERS if col.startswith("1/")})
+
     @classmethod
     @deprecate(".taufree()", new=".convert()", version="2.19.1-zeta-fu1")
     def tau_free(cls, subset_df, population, tau=None):
@@ -276,11 +448,9 @@ class ModelBase(Term):
         tau = Validator(tau, "tau").tau(default=None)
         if tau is None:
             raise NAFoundError("tau", None)
-        elapsed = pd.Series(df.index * tau)
-        df[cls.DATE] = start + elapsed.apply(lambda x: timedelta(minutes=x))
+        df[cls.DATE] = (start + pd.to_timedelta(df.index * tau, unit="min")).floor("D")
         # Select the last records for dates
-        df = df.set_index(cls.DATE).resample("D").last().reset_index()
-        return df
+        return df.groupby(cls.DATE).last().reset_index()
 
     @classmethod
     def convert(cls, data, tau):
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from covsirphy.util.error import NAFoundError, UnExpectedValueRangeError
+from covsirphy.util.validator import Validator
+from covsirphy.util.term import Term
+from covsirphy.ode.mbase import ModelBase
+from covsirphy.ode.ode_solver import _ODESolver
+
+
+class Metapopulation(Term):
+    """
+    Multi-region ODE model, coupling SIR-derived models of regions with a sparse mobility matrix.
+
+    Args:
+        model (covsirphy.ModelBase): SIR-derived ODE model which has .TRANSITIONS, e.g. covsirphy.SIRF
+        regions (list[str]): names of the regions (e.g. provinces or cities of a layer of covsirphy.GIS)
+        mobility (scipy.sparse.spmatrix or numpy.ndarray): travel matrix, shape (len(regions), len(regions))
+        first_date (str or pandas.Timestamp): the first date of simulation
+        tau (int): tau value [min]
+        method (str): integration method, "RK45" (default), "RK23", "DOP853" or fixed-step methods ("euler", "heun", "rk4")
+
+    Note:
+        The (i, j) element of @mobility (i != j) is the fraction of time which residents of the i-th region spend in the j-th region.
+        Diagonal elements will be ignored and replaced with 1 - (the sum of the off-diagonal elements of the row).
+
+    Note:
+        Residents of region i are infected in region j with the force of infection of the residents of region i
+        and the prevalence in region j, where people of the regions are mixed with the travel matrix (M),
+        i.e. X_eff = N * (M @ ((M.T @ X) / (M.T @ N))) will be used to calculate the transition rates for X (the variables of region i).
+        Without travel (identity matrix), this is the same as independent simulation of the regions.
+
+    Note:
+        The right-hand side of the ODE is vectorized for all regions and needs two sparse matrix products (O(nnz)) for each evaluation.
+
+    Examples:
+        >>> import covsirphy as cs
+        >>> travel = scipy.sparse.random(3000, 3000, density=0.002) * 0.05
+        >>> meta = cs.Metapopulation(cs.SIRF, regions=regions, mobility=travel, first_date="01Jan2022", tau=1440)
+        >>> sim_df = meta.simulate(end_date="31Mar2022", y0_df=y0_df, param_df=param_df)
+        >>> sim_df.loc[:, (regions[0], cs.Term.CI)].plot()
+    """
+    METHODS = [method for method in _ODESolver.METHODS if method not in _ODESolver.IMPLICIT_METHODS]
+
+    def __init__(self, model, regions, mobility, first_date, tau=1440, method="RK45"):
+        self._model = Validator(model, "model").subclass(ModelBase)
+        if not self._model.TRANSITIONS:
+            raise NotImplementedError(f"Metapopulation model is not supported with {self._model.NAME} model.")
+        self._regions = [str(region) for region in Validator(list(regions), "regions").sequence()]
+        if len(set(self._regions)) != len(self._regions):
+            raise ValueError("@regions must not have duplicated values.")
+        self._first = Validator(first_date, "first_date").date()
+        self._tau = Validator(tau, "tau").tau(default=1440)
+        self._method = Validator([method], "method").sequence(candidates=self.METHODS)[0]
+        self._mobility = self._travel_matrix(mobility, len(self._regions))
+
+    @staticmethod
+    def _travel_matrix(mobility, region_n):
+        """
+        Create a row-stochastic travel matrix.
+
+        Args:
+            mobility (scipy.sparse.spmatrix or numpy.ndarray): fractions of time of travel, shape (region_n, region_n)
+            region_n (int): the number of regions
+
+        Raises:
+            ValueError: the shape of @mobility is un-expected
+            UnExpectedValueRangeError: elements are negative or the sum of off-diagonal elements of a row is over 1
+
+        Returns:
+            scipy.sparse.csr_matrix: travel matrix whose rows sum to 1
+        """
+        matrix = sparse.csr_matrix(mobility, dtype=np.float64)
+        if matrix.shape != (region_n, region_n):
+            raise ValueError(f"@mobility must have shape ({region_n}, {region_n}), but {matrix.shape} was applied.")
+        matrix = (matrix - sparse.diags(matrix.diagonal())).tocsr()
+        matrix.eliminate_zeros()
+        if matrix.nnz and matrix.data.min() < 0:
+            raise UnExpectedValueRangeError("elements of @mobility", matrix.data.min(), (0, None))
+        travel = np.asarray(matrix.sum(axis=1)).ravel()
+        if travel.max(initial=0) > 1:
+            raise UnExpectedValueRangeError("sum of the off-diagonal elements of a row of @mobility", travel.max(), (0, 1))
+        return (matrix + sparse.diags(1 - travel)).tocsr()
+
+    @classmethod
+    def scale_travel(cls, mobility, factors):
+        """
+        Scale the travel of residents of the regions, e.g. with Mobility_* variables of covsirphy.DataDownloader.
+
+        Args:
+            mobility (scipy.sparse.spmatrix or numpy.ndarray): travel matrix (off-diagonal elements will be used)
+            factors (list[float] or numpy.ndarray): factors of the rows (regions), e.g. 1 + Mobility_transit_stations / 100
+
+        Returns:
+            scipy.sparse.csr_matrix: scaled travel matrix, diagonal elements are 0
+
+        Note:
+            Factors will be clipped to [0, 1 / (the sum of the off-diagonal elements of the row)].
+        """
+        matrix = sparse.csr_matrix(mobility, dtype=np.float64)
+        matrix = (matrix - sparse.diags(matrix.diagonal())).tocsr()
+        travel = np.asarray(matrix.sum(axis=1)).ravel()
+        upper = np.divide(1, travel, out=np.full(len(travel), np.inf), where=travel > 0)
+        factors = np.clip(np.asarray(factors, dtype=np.float64), 0, upper)
+        return sparse.diags(factors).dot(matrix).tocsr()
+
+    @property
+    def regions(self):
+        """
+        list[str]: names of the regions
+        """
+        return self._regions[:]
+
+    @property
+    def mobility(self):
+        """
+        scipy.sparse.csr_matrix: row-stochastic travel matrix
+        """
+        return self._mobility.copy()
+
+    def _values(self, data, columns, name):
+        """
+        Return the values of the regions as an array.
+
+        Args:
+            data (pandas.DataFrame or dict[str, float]): values indexed by the regions or values shared by the regions
+            columns (list[str]): names of the columns
+            name (str): name of the argument
+
+        Raises:
+            NAFoundError: the values of some regions or columns were not registered
+
+        Returns:
+            numpy.ndarray: values, shape (len(columns), the number of regions)
+        """
+        if isinstance(data, dict):
+            df = pd.DataFrame([data] * len(self._regions), index=self._regions)
+        else:
+            df = Validator(data, name).dataframe(columns=columns)
+            df.index = df.index.astype(str)
+        df = df.reindex(index=self._regions, columns=columns)
+        if df.isna().any().any():
+            raise NAFoundError(name, df.loc[df.isna().any(axis=1)].head())
+        return df.to_numpy(dtype=np.float64).T
+
+    def simulate(self, end_date, y0_df, param_df):
+        """
+        Perform simulation of all regions in one integration.
+
+        Args:
+            end_date (str or pandas.Timestamp): the last date of simulation
+            y0_df (pandas.DataFrame): initial values of the variables
+                Index
+                    names of the regions
+                Columns
+                    model.VARIABLES (int): initial values
+            param_df (pandas.DataFrame or dict[str, float]): parameter values of the regions or values shared by the regions
+                Index
+                    names of the regions
+                Columns
+                    model.PARAMETERS (float): parameter values
+
+        Raises:
+            NAFoundError: values of some regions were not included
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    Date (pandas.Timestamp): dates
+                Columns
+                    pandas.MultiIndex: regions and variables of the model (model.VARIABLES)
+
+        Note:
+            Total value of the initial values of each region will be regarded as the population of the region.
+        """
+        end = Validator(end_date, "end_date").date(value_range=(self._first, None))
+        step_n = Validator(int((end - self._first).total_seconds()) // 60 // self._tau, "number").int(value_range=(1, None))
+        y0 = self._values(y0_df, self._model.VARIABLES, "y0_df")
+        params = self._values(param_df, self._model.PARAMETERS, "param_df")
+        # Time steps to sample: the last steps of the dates
+        day_n = 1440 // self._tau
+        samples = np.unique(np.minimum(np.arange(day_n - 1, (step_n // day_n + 1) * day_n, day_n), step_n))
+        y = self.run_array(self._model, self._mobility, params, y0, step_n, method=self._method, steps=samples).round()
+        # Convert the simulation results to a dataframe with dates
+        dates = (self._first + pd.to_timedelta(samples * self._tau, unit="min")).floor("D")
+        columns = pd.MultiIndex.from_product([self._regions, self._model.VARIABLES])
+        values = y.transpose(2, 1, 0).reshape(len(samples), -1)
+        return pd.DataFrame(values.astype(np.int64), index=pd.Index(dates, name=self.DATE), columns=columns)
+
+    @classmethod
+    def run_array(cls, model, mobility, params, y0, step_n, method="RK45", steps=None):
+        """
+        Solve an initial value problem of the metapopulation model with arrays.
+
+        Args:
+            model (covsirphy.ModelBase): SIR-derived ODE model which has .TRANSITIONS
+            mobility (scipy.sparse.csr_matrix): row-stochastic travel matrix, shape (R, R)
+            params (numpy.ndarray): values of non-dimensional model parameters, shape (n_params, R)
+            y0 (numpy.ndarray): initial values of dimensional variables, shape (n_vars, R)
+            step_n (int): the number of steps
+            method (str): integration method, refer to covsirphy.Metapopulation.METHODS
+            steps (list[int] or numpy.ndarray or None): sorted time steps to return values at or None (all time steps)
+
+        Returns:
+            numpy.ndarray: numerical solution (float values, not rounded), shape (n_vars, R, step_n + 1) or (n_vars, R, len(steps))
+
+        Note:
+            Arguments will not be validated.
+        """
+        var_n, region_n = y0.shape
+        population = y0.sum(axis=0)
+        mobility_t = mobility.T.tocsr()
+        # Population at the regions when people travel, shape (R,)
+        visiting = mobility_t.dot(population)
+        visiting[visiting == 0] = 1
+        # Index of the source and destination of the transitions
+        sources = [model.VARIABLES.index(source) for (source, _) in model.TRANSITIONS]
+        destinations = [model.VARIABLES.index(destination) for (_, destination) in model.TRANSITIONS]
+        flows = np.empty((len(sources), region_n), dtype=np.float64)
+
+        def dydt(_, y, out=None):
+            X = y.reshape(var_n, region_n)
+            # Effective values of the variables with mixing: N * (M @ ((M.T @ X) / (M.T @ N)))
+            prevalence = mobility_t.dot(X.T) / visiting[:, None]
+            X_eff = (mobility.dot(prevalence) * population[:, None]).T
+            np.multiply(model._transition_rates(X_eff, params, population), X[sources], out=flows)
+            out = np.zeros(y.shape) if out is None else out
+            out[:] = 0
+            dxdt = out.reshape(var_n, region_n)
+            for (k, (source, destination)) in enumerate(zip(sources, destinations)):
+                dxdt[source] -= flows[k]
+                dxdt[destination] += flows[k]
+            return out
+
+        y = _ODESolver._solve(fun=dydt, y0=y0.ravel(), step_n=step_n, method=method, t_eval=steps)
+        return y.reshape(var_n, region_n, -1)
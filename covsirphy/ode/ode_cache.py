@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+import threading
+import numpy as np
+import pandas as pd
+from covsirphy.util.validator import Validator
+
+
+class SimulationCache(object):
+    """
+    LRU cache of simulation results, keyed by model, parameter values, initial values and the number of steps.
+
+    Args:
+        max_bytes (int): byte budget of the cached results, 0 (default) disables caching
+        digits (int): the number of decimal places to round float values of keys to
+
+    Note:
+        Simulation of ODE models (covsirphy.ODEHandler.simulate(), covsirphy.Dynamics.simulate(), parameter estimation)
+        will use the shared cache returned by SimulationCache.shared() when it is enabled with .resize() (disabled as default).
+        The least recently used results will be removed when the total size exceeds @max_bytes.
+
+    Note:
+        Dataframes will be copied when saved and returned, and arrays will be saved as read-only arrays.
+
+    Examples:
+        >>> import covsirphy as cs
+        >>> cache = cs.SimulationCache.shared()
+        >>> cache.resize(max_bytes=256 * 1024 ** 2)
+        >>> dynamics.simulate()
+        >>> cache.info()
+        {"hits": 0, "misses": 1, "size": 1, "bytes": 13420, "max_bytes": 268435456}
+    """
+    _SHARED = None
+
+    def __init__(self, max_bytes=0, digits=12):
+        self._max_bytes = Validator(max_bytes, "max_bytes").int(value_range=(0, None))
+        self._digits = Validator(digits, "digits").int(value_range=(0, None))
+        # {key: (value, the number of bytes)}
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """
+        Return the cache shared by the simulation of ODE models in this process.
+
+        Returns:
+            covsirphy.SimulationCache: the shared cache
+        """
+        if cls._SHARED is None:
+            cls._SHARED = cls()
+        return cls._SHARED
+
+    @property
+    def enabled(self):
+        """
+        bool: whether the byte budget is larger than 0 or not
+        """
+        return self._max_bytes > 0
+
+    @property
+    def hits(self):
+        """
+        int: the number of cache hits
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+        int: the number of cache misses
+        """
+        return self._misses
+
+    def info(self):
+        """
+        Return the statistics of the cache.
+
+        Returns:
+            dict[str, int]:
+                - hits (int): the number of cache hits
+                - misses (int): the number of cache misses
+                - size (int): the number of cached results
+                - bytes (int): the total size of cached results [bytes]
+                - max_bytes (int): byte budget
+        """
+        return {
+            "hits": self._hits, "misses": self._misses, "size": len(self._cache),
+            "bytes": self._bytes, "max_bytes": self._max_bytes}
+
+    def resize(self, max_bytes):
+        """
+        Change the byte budget, removing the least recently used results if necessary.
+
+        Args:
+            max_bytes (int): byte budget of the cached results, 0 disables caching
+        """
+        with self._lock:
+            self._max_bytes = Validator(max_bytes, "max_bytes").int(value_range=(0, None))
+            self._evict()
+
+    def clear(self):
+        """
+        Remove all cached results and reset the counters.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+            self._hits = 0
+            self._misses = 0
+
+    def key(self, model, params, y0, step_n, tau=None, **kwargs):
+        """
+        Create a key of the cache.
+
+        Args:
+            model (covsirphy.ModelBase): ODE model
+            params (list[float] or numpy.ndarray): values of non-dimensional model parameters, ordered as model.PARAMETERS
+            y0 (list[float] or numpy.ndarray): initial values of dimensional variables, ordered as model.VARIABLES
+            step_n (int): the number of steps
+            tau (int or None): tau value [min] or None (tau-free)
+            kwargs: the other settings which change the results (e.g. integration method), lists and arrays will be rounded and the others must be hashable
+
+        Returns:
+            tuple: hashable key
+
+        Note:
+            Float values will be rounded to the number of decimal places specified with @digits.
+        """
+        return (
+            model, self._round(params), self._round(y0), int(step_n), tau,
+            tuple((k, self._round(v) if isinstance(v, (list, np.ndarray)) else v) for (k, v) in sorted(kwargs.items())))
+
+    def _round(self, values):
+        """
+        Round the values and convert them to bytes.
+
+        Args:
+            values (list[float] or numpy.ndarray): values
+
+        Returns:
+            bytes: rounded values
+        """
+        return np.round(np.asarray(values, dtype=np.float64), self._digits).tobytes()
+
+    def get(self, key):
+        """
+        Return the cached result.
+
+        Args:
+            key (tuple): key created with .key()
+
+        Returns:
+            pandas.DataFrame or numpy.ndarray or None: the cached result or None (not cached)
+        """
+        with self._lock:
+            if key not in self._cache:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._cache.move_to_end(key)
+            value = self._cache[key][0]
+        return value.copy() if isinstance(value, pd.DataFrame) else value
+
+    def put(self, key, value):
+        """
+        Save the result.
+
+        Args:
+            key (tuple): key created with .key()
+            value (pandas.DataFrame or numpy.ndarray): the result
+
+        Returns:
+            pandas.DataFrame or numpy.ndarray: @value (read-only array for numpy.ndarray)
+
+        Note:
+            Results larger than the byte budget will not be saved.
+        """
+        if isinstance(value, pd.DataFrame):
+            nbytes = int(value.memory_usage(index=True).sum())
+            saved = value.copy() if nbytes <= self._max_bytes else value
+        else:
+            saved = value = np.array(value)
+            value.flags.writeable = False
+            nbytes = value.nbytes
+        with self._lock:
+            if nbytes > self._max_bytes:
+                return value
+            if key in self._cache:
+                self._bytes -= self._cache.pop(key)[1]
+            self._cache[key] = (saved, nbytes)
+            self._bytes += nbytes
+            self._evict()
+        return value
+
+    def _evict(self):
+        """
+        Remove the least recently used results until the total size is in the byte budget.
+        """
+        while self._cache and self._bytes > self._max_bytes:
+            self._bytes -= self._cache.popitem(last=False)[1][1]
@@ -1,18 +1,24 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from covsirphy.util.stopwatch import StopWatch
+import contextlib
 from datetime import timedelta
 import functools
-from multiprocessing import cpu_count, Pool
+import hashlib
 import itertools
-from covsirphy.util.error import UnExecutedError
+import numpy as np
+import pandas as pd
+from covsirphy.util.error import UnExecutedError, UnExpectedValueError
 from covsirphy.util.evaluator import Evaluator
+from covsirphy.util.executor import ParallelExecutor
+from covsirphy.util.stopwatch import StopWatch
 from covsirphy.util.validator import Validator
 from covsirphy.util.term import Term
 from covsirphy.ode.mbase import ModelBase
+from covsirphy.ode.ode_solver import _ODESolver
 from covsirphy.ode.ode_solver_multi import _MultiPhaseODESolver
 from covsirphy.ode.param_estimator import _ParamEstimator
+from covsirphy.ode.grad_estimator import _GradientEstimator
 
 
 class ODEHandler(Term):
@@ -25,17 +31,40 @@ class ODEHandler(Term):
         tau (int or None): tau value [min] or None (to be estimated)
         metric (str): metric name for estimation
         n_jobs (int): the number of parallel jobs or -1 (CPU count)
+        method (str): integration method, "RK45" (default), the other methods of scipy.integrate.solve_ivp() or fixed-step methods ("euler", "heun", "rk4")
+        executor (covsirphy.ParallelExecutor or None): executor to keep alive across calls or None (start workers in each call with @n_jobs)
+
+    Note:
+        Fixed-step methods step exactly on the time steps (tau-free) without step size control.
+        "rk4" is more accurate than "RK45" with default tolerances, but runtime increases with the number of steps.
     """
+    # Optimization methods of parameter estimation: {name: estimator class}
+    _ESTIMATOR_DICT = {"tpe": _ParamEstimator, "lbfgs": _GradientEstimator}
+    # Default setting of optimization study
+    _STUDY_DICT = {
+        "pruner": "threshold", "upper": 0.5, "percentile": 50, "seed": 0, "constant_liar": False, "margin": None,
+        "storage": None, "study_name": "Selected area"}
 
-    def __init__(self, model, first_date, tau=None, metric="RMSLE", n_jobs=-1):
+    def __init__(self, model, first_date, tau=None, metric="RMSLE", n_jobs=-1, method="RK45", executor=None):
         self._model = Validator(model, "model").subclass(ModelBase)
+        self._method = Validator([method], "method").sequence(candidates=_ODESolver.METHODS)[0]
         self._first = Validator(first_date, "first_date").date()
         self._metric = Validator([metric], "metric").sequence(candidates=Evaluator.metrics())[0]
-        self._n_jobs = cpu_count() if n_jobs == -1 else Validator(n_jobs, "n_jobs").int()
+        self._executor = None if executor is None else Validator(executor, "executor").instance(ParallelExecutor)
+        if self._executor is None:
+            self._n_jobs = ParallelExecutor(n_jobs=n_jobs).n_jobs
+        else:
+            self._n_jobs = self._executor.n_jobs
         # Tau value [min] or None
         self._tau = Validator(tau, "tau").tau(default=None)
         # {"0th": output of self.add()}
         self._info_dict = {}
+        # Scores of tau candidates calculated with .estimate_tau(): {tau: score}
+        self._tau_score_dict = {}
+
+    def __getstate__(self):
+        # Executor (with worker processes) cannot be serialized and will not be used in the workers
+        return {**self.__dict__, "_executor": None}
 
     def add(self, end_date, param_dict=None, y0_dict=None):
         """
@@ -65,10 +94,16 @@ class ODEHandler(Term):
             self.START: start, self.END: end, "y0": y0_dict or {}, "param": param_dict or {}}
         return self._info_dict[phase]
 
-    def simulate(self):
+    def simulate(self, interpolation=None):
         """
         Perform simulation with the multi-phased ODE model.
 
+        Args:
+            interpolation (str or None): how to change parameter values with time
+                - None: the solver will be restarted at the start of each phase
+                - "constant": piecewise-constant values of the phases, integrated at once
+                - "spline": shape-preserving cubic spline (PCHIP) through the values at the middle of the phases, integrated at once
+
         Raises:
             covsirphy.UnExecutedError: either tau value or phase information was not set
 
@@ -82,6 +117,10 @@ class ODEHandler(Term):
                     - Infected (int): the number of currently infected cases
                     - Fatal (int): the number of fatal cases
                     - Recovered (int): the number of recovered cases
+
+        Note:
+            With "constant" and "spline", the phases will be integrated without restarts until a phase with registered initial values.
+            This avoids setup cost of the solver for each phase and smooth changes of parameter values are available with "spline".
         """
         if self._tau is None:
             raise UnExecutedError(
@@ -92,10 +131,137 @@ class ODEHandler(Term):
         for (param, (phase, phase_dict)) in combs:
             if param not in phase_dict["param"]:
                 raise ValueError(f"{param.capitalize()} is not registered for the {phase} phase.")
-        solver = _MultiPhaseODESolver(self._model, self._first, self._tau)
+        solver = _MultiPhaseODESolver(self._model, self._first, self._tau, method=self._method, interpolation=interpolation)
         return solver.simulate(*self._info_dict.values())
 
-    def _score_tau(self, tau, data, quantile):
+    def simulate_ensemble(self, draws, q=(0.025, 0.5, 0.975), chunk_size=1000, bins=1024, filename=None):
+        """
+        Perform simulation with sets of parameter values (e.g. samples of posterior distributions) and return quantiles for each date.
+
+        Args:
+            draws (pandas.DataFrame or dict[str, pandas.DataFrame]): parameter values of all phases or the phases (e.g. "0th")
+                Index
+                    reset index
+                Columns
+                    (float): a part or all of model.PARAMETERS (registered values will be used for the others)
+            q (list[float]): quantiles in [0, 1]
+            chunk_size (int): the number of draws to simulate at once
+            bins (int): the number of bins of histograms to estimate quantiles with, for each date and variable
+            filename (str or pathlib.Path or None): filename to save all trajectories with covsirphy.TrajectoryStore or None (not saved)
+
+        Raises:
+            covsirphy.UnExecutedError: either tau value or phase information was not set
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    Date (pandas.Timestamp): observation dates
+                Columns
+                    pandas.MultiIndex: variables of the model (model.VARIABLES) and @q
+
+        Note:
+            Dataframes of @draws must have the same number of rows. The n-th rows of the phases are used for the n-th simulation.
+
+        Note:
+            Draws will be simulated in chunks with a vectorized solver and only histograms (on log1p scale) of the values will be kept in memory.
+            The relative error of the quantiles is smaller than log1p(total population) / @bins, less than 2% with the default value.
+            With adaptive methods (e.g. RK45), step sizes are shared by the draws of a chunk.
+            Fixed-step methods (e.g. rk4) return the same values as simulation with each draw.
+
+        Note:
+            With @filename, trajectories (model.VARIABLES) will be saved on disk with the index of @draws as scenario IDs.
+            We can read a part of them with covsirphy.TrajectoryStore(filename).read(ids, start_date, end_date) later.
+
+        Examples:
+            >>> import covsirphy as cs
+            >>> rng = np.random.default_rng(0)
+            >>> draws = pd.DataFrame({"rho": rng.normal(0.2, 0.01, 10000), "sigma": rng.normal(0.075, 0.005, 10000)})
+            >>> band_df = handler.simulate_ensemble(draws, q=[0.025, 0.5, 0.975])
+            >>> band_df[cs.Term.CI].plot()
+        """
+        if self._tau is None:
+            raise UnExecutedError(
+                "ODEHandler.estimate_tau()", details="Or specify tau when creating an instance of ODEHandler")
+        if not self._info_dict:
+            raise UnExecutedError("ODEHandler.add()")
+        q = [Validator(value, "q").float(value_range=(0, 1)) for value in Validator(q, "q").sequence()]
+        if isinstance(draws, pd.DataFrame):
+            draws = {phase: draws for phase in self._info_dict.keys()}
+        solver = _MultiPhaseODESolver(self._model, self._first, self._tau, method=self._method)
+        return solver.simulate_ensemble(
+            *self._info_dict.values(), draws=draws, q=q,
+            chunk_size=Validator(chunk_size, "chunk_size").int(value_range=(1, None)),
+            bins=Validator(bins, "bins").int(value_range=(1, None)), filename=filename)
+
+    def simulate_stochastic(self, replicates=1000, q=(0.025, 0.5, 0.975), seed=0, draws=None, chunk_size=1000, bins=1024, filename=None):
+        """
+        Perform stochastic simulation (binomial chains) with replicates and return quantiles of the numbers of cases for each date.
+
+        Args:
+            replicates (int): the number of replicates, ignored when @draws is not None
+            q (list[float]): quantiles in [0, 1]
+            seed (int or None): seed of the random number generator, None means un-reproducible results
+            draws (pandas.DataFrame or dict[str, pandas.DataFrame] or None): parameter values of the replicates or None (registered values)
+                Index
+                    reset index
+                Columns
+                    (float): a part or all of model.PARAMETERS (registered values will be used for the others)
+            chunk_size (int): the number of replicates to simulate at once
+            bins (int): the number of bins of histograms to estimate quantiles with, for each date and variable
+            filename (str or pathlib.Path or None): filename to save all trajectories with covsirphy.TrajectoryStore or None (not saved)
+
+        Raises:
+            covsirphy.UnExecutedError: either tau value or phase information was not set
+            NotImplementedError: the model does not support stochastic simulation (e.g. SIR-FV model)
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    Date (pandas.Timestamp): observation dates
+                Columns
+                    pandas.MultiIndex: variables of the model (model.VARIABLES) and @q
+
+        Note:
+            With each time step (tau minutes), the number of cases which leave a variable follows binomial distribution
+            with probability 1 - exp(-sum of the transition rates) and they are divided to the destinations with the rates.
+            The numbers of cases are always non-negative integers and total population is kept.
+            With large population, the mean values are near to the values of deterministic simulation (ODEHandler.simulate()).
+
+        Note:
+            With @draws, each row will be simulated once and parameter uncertainty can be combined with stochasticity.
+
+        Examples:
+            >>> import covsirphy as cs
+            >>> handler = cs.ODEHandler(cs.SIRF, first_date="01Jan2022", tau=1440)
+            >>> handler.add("31Mar2022", param_dict={"theta": 0.002, "kappa": 0.005, "rho": 0.2, "sigma": 0.075}, y0_dict=y0_dict)
+            >>> band_df = handler.simulate_stochastic(replicates=1000, q=[0.025, 0.5, 0.975], seed=0)
+        """
+        if self._tau is None:
+            raise UnExecutedError(
+                "ODEHandler.estimate_tau()", details="Or specify tau when creating an instance of ODEHandler")
+        if not self._info_dict:
+            raise UnExecutedError("ODEHandler.add()")
+        if not self._model.TRANSITIONS:
+            raise NotImplementedError(f"Stochastic simulation is not supported with {self._model.NAME} model.")
+        q = [Validator(value, "q").float(value_range=(0, 1)) for value in Validator(q, "q").sequence()]
+        if draws is None:
+            replicates = Validator(replicates, "replicates").int(value_range=(1, None))
+            combs = itertools.product(self._model.PARAMETERS, self._info_dict.items())
+            for (param, (phase, phase_dict)) in combs:
+                if param not in phase_dict["param"]:
+                    raise ValueError(f"{param.capitalize()} is not registered for the {phase} phase.")
+            draws = {
+                phase: pd.DataFrame({param: np.full(replicates, phase_dict["param"][param]) for param in self._model.PARAMETERS})
+                for (phase, phase_dict) in self._info_dict.items()}
+        elif isinstance(draws, pd.DataFrame):
+            draws = {phase: draws for phase in self._info_dict.keys()}
+        solver = _MultiPhaseODESolver(self._model, self._first, self._tau, method=self._method)
+        return solver.simulate_ensemble(
+            *self._info_dict.values(), draws=draws, q=q,
+            chunk_size=Validator(chunk_size, "chunk_size").int(value_range=(1, None)),
+            bins=Validator(bins, "bins").int(value_range=(1, None)), filename=filename, rng=np.random.default_rng(seed))
+
+    def _score_tau(self, tau, data, info_dict):
         """
         Calculate score for the tau value.
 
@@ -110,19 +276,17 @@ class ODEHandler(Term):
                     - Infected (int): the number of currently infected cases
                     - Fatal(int): the number of fatal cases
                     - Recovered (int): the number of recovered cases
-            quantile (float): quantile to guess ODE parameter values for the candidates of tau
+            info_dict (dict[str, dict[str, object]]): phase information with guessed ODE parameter values
+
+        Returns:
+            float: score of the metric
         """
-        info_dict = self._info_dict.copy()
-        for (phase, phase_dict) in info_dict.items():
-            start, end = phase_dict[self.START], phase_dict[self.END]
-            df = data.loc[(start <= data[self.DATE]) & (data[self.DATE] <= end)]
-            info_dict[phase]["param"] = self._model.guess(df, tau, q=quantile)
-        solver = _MultiPhaseODESolver(self._model, self._first, tau)
+        solver = _MultiPhaseODESolver(self._model, self._first, tau, method=self._method)
         sim_df = solver.simulate(*info_dict.values())
         evaluator = Evaluator(data.set_index(self.DATE), sim_df.set_index(self.DATE))
         return evaluator.score(metric=self._metric)
 
-    def estimate_tau(self, data, guess_quantile=0.5):
+    def estimate_tau(self, data, guess_quantile=0.5, search="exhaustive", patience=2):
         """
         Select tau value [min] which minimize the score of the metric.
 
@@ -137,6 +301,8 @@ class ODEHandler(Term):
                     - Fatal(int): the number of fatal cases
                     - Recovered (int): the number of recovered cases
             guess_quantile (float): quantile to guess ODE parameter values for the candidates of tau
+            search (str): "exhaustive" (calculate scores of all candidates) or "coarse" (coarse-to-fine search, faster but heuristic)
+            patience (int): the number of coarse candidates with worse scores than the best one to stop coarse search
 
         Returns:
             int: estimated tau value [min]
@@ -145,29 +311,94 @@ class ODEHandler(Term):
             covsirphy.UnExecutedError: phase information was not set
 
         Note:
-            ODE parameter for each tau value will be guessed by .guess() classmethod of the model.
+            ODE parameter values will be guessed by .guess() classmethod of the model only once for each phase,
+            because the results do not depend on tau values with daily records.
             Tau value will be selected from the divisors of 1440 [min] and set to self.
+
+        Note:
+            With coarse-to-fine search, every other candidate will be evaluated from large tau values (short simulation) to small values
+            until @patience candidates in a row have worse scores than the best one. Then, the neighbors of the best candidate will be evaluated
+            until no neighbors have better scores. This assumes that the scores are unimodal for tau values
+            and the result may be different from that of exhaustive search when they are not.
+            Scores are available with ODEHandler.tau_scores().
         """
         Validator(data, "data").dataframe(columns=self.DSIFR_COLUMNS)
         df = data.loc[:, self.DSIFR_COLUMNS]
         if not self._info_dict:
             raise UnExecutedError("ODEHandler.add()")
-        # Calculate scores of tau candidates
         Validator(guess_quantile, "quantile").float(value_range=(0, 1))
-        calc_f = functools.partial(self._score_tau, data=df, quantile=guess_quantile)
-        divisors = [i for i in range(1, 1441) if 1440 % i == 0]
-        if self._n_jobs == 1:
-            scores = [calc_f(candidate) for candidate in divisors]
-        else:
-            with Pool(self._n_jobs) as p:
-                scores = p.map(calc_f, divisors)
-        score_dict = dict(zip(divisors, scores))
+        search = Validator([search], "search").sequence(candidates=["coarse", "exhaustive"])[0]
+        patience = Validator(patience, "patience").int(value_range=(1, None))
+        # Guess ODE parameter values of the phases
+        info_dict = {}
+        for (phase, phase_dict) in self._info_dict.items():
+            start, end = phase_dict[self.START], phase_dict[self.END]
+            phase_df = df.loc[(start <= df[self.DATE]) & (df[self.DATE] <= end)]
+            info_dict[phase] = {**phase_dict, "param": self._model.guess(phase_df, 1440, q=guess_quantile)}
+        # Calculate scores of tau candidates (from large values)
+        calc_f = functools.partial(self._score_tau, data=df, info_dict=info_dict)
+        divisors = [i for i in range(1440, 0, -1) if 1440 % i == 0]
+        sign = 1 if Evaluator.smaller_is_better(metric=self._metric) else -1
+        score_dict = {}
+        with self._executor_context() as executor:
+            if search == "exhaustive":
+                score_dict.update(zip(divisors, executor.map(calc_f, divisors)))
+            else:
+                # Coarse search
+                coarse_candidates, best_score, worse_n = divisors[::2], None, 0
+                for i in range(0, len(coarse_candidates), executor.n_jobs):
+                    candidates = coarse_candidates[i:i + executor.n_jobs]
+                    for (candidate, score) in zip(candidates, executor.map(calc_f, candidates)):
+                        score_dict[candidate] = score
+                        if best_score is None or sign * score < sign * best_score:
+                            best_score, worse_n = score, 0
+                        else:
+                            worse_n += 1
+                    if worse_n >= patience:
+                        break
+                # Fine search with neighbors of the best candidate
+                while True:
+                    best_i = divisors.index(min(score_dict.items(), key=lambda x: sign * x[1])[0])
+                    neighbors = [divisors[j] for j in (best_i - 1, best_i + 1) if 0 <= j < len(divisors) and divisors[j] not in score_dict]
+                    if not neighbors:
+                        break
+                    score_dict.update(zip(neighbors, executor.map(calc_f, neighbors)))
+        self._tau_score_dict = score_dict
         # Return the best tau value
-        comp_f = {True: min, False: max}[Evaluator.smaller_is_better(metric=self._metric)]
-        self._tau = comp_f(score_dict.items(), key=lambda x: x[1])[0]
+        self._tau = min(score_dict.items(), key=lambda x: sign * x[1])[0]
         return self._tau
 
-    def _estimate_params(self, phase, data, quantiles, check_dict, study_dict, show_phase):
+    def tau_scores(self):
+        """
+        Return the scores of tau candidates calculated with the last call of ODEHandler.estimate_tau().
+
+        Returns:
+            pandas.Series:
+                Index
+                    tau (int): divisors of 1440 [min]
+                Values
+                    (float): scores of the metric or NA (not calculated with coarse-to-fine search)
+        """
+        divisors = [i for i in range(1, 1441) if 1440 % i == 0]
+        series = pd.Series({tau: self._tau_score_dict.get(tau, np.nan) for tau in divisors}, dtype=np.float64)
+        series.index.name = self.TAU
+        return series
+
+    def _executor_context(self):
+        """
+        Return the executor as a context manager.
+
+        Returns:
+            covsirphy.ParallelExecutor or contextlib.nullcontext: the executor
+
+        Note:
+            When executor was not set, a new executor will be returned and workers will be stopped at the end of the context.
+        """
+        if self._executor is not None:
+            return contextlib.nullcontext(self._executor)
+        return ParallelExecutor(n_jobs=self._n_jobs)
+
+    def _estimate_params(self, phase, data, quantiles, check_dict, study_dict, show_phase, optimizer="tpe"):
         """
         Perform parameter estimation for one phase.
 
@@ -186,6 +417,7 @@ class ODEHandler(Term):
             check_dict (dict[str, object]): setting of validation
             study_dict (dict[str, object]): setting of optimization study
             show_phase (bool): whether show phase name or not (stdout)
+            optimizer (str): optimization method, "tpe" or "lbfgs"
 
         Returns:
             dict(str, object):
@@ -196,22 +428,191 @@ class ODEHandler(Term):
                 - Trials (int): the number of trials
                 - Runtime (str): runtime of optimization
         """
-        phase_dict = self._info_dict[phase].copy()
-        start, end = phase_dict[self.START], phase_dict[self.END]
-        df = data.loc[(start <= data[self.DATE]) & (data[self.DATE] <= end)]
-        estimator = _ParamEstimator(self._model, df, self._tau, self._metric, quantiles)
-        est_dict = estimator.run(check_dict, study_dict)
-        n_trials, runtime = est_dict[self.TRIALS], est_dict[self.RUNTIME]
-        start_date = start.strftime(self.DATE_FORMAT)
-        end_date = end.strftime(self.DATE_FORMAT)
+        estimator = self._estimator(phase, data=data, quantiles=quantiles, optimizer=optimizer)
+        est_dict = estimator.run(check_dict, self._study_dict(phase, study_dict, data=data), priors=self._priors(phase), center=self._center(phase))
+        self._show_result(phase, est_dict, show_phase=show_phase)
+        return est_dict
+
+    def _show_result(self, phase, est_dict, show_phase):
+        """
+        Show the number of trials and runtime of estimation of the phase (stdout).
+
+        Args:
+            phase (str): phase name
+            est_dict (dict[str, object]): result of estimation, including Trials and Runtime
+            show_phase (bool): whether show phase name or not
+        """
+        start_date = self._info_dict[phase][self.START].strftime(self.DATE_FORMAT)
+        end_date = self._info_dict[phase][self.END].strftime(self.DATE_FORMAT)
         if show_phase:
             ph_statement = f"{phase:>4} phase ({start_date} - {end_date})"
         else:
             ph_statement = f"{start_date} - {end_date}"
-        print(f"\t{ph_statement}: finished {n_trials:>4} trials in {runtime}")
-        return est_dict
+        print(f"\t{ph_statement}: finished {est_dict[self.TRIALS]:>4} trials in {est_dict[self.RUNTIME]}")
+
+    def _estimate_params_hybrid(self, phases, data, quantiles, check_dict, study_dict, show_phase):
+        """
+        Perform parameter estimation of the phases, dividing the parallel jobs to the phases.
+
+        Args:
+            phases (list[str]): names of the phases, fewer than the parallel jobs
+            data (pandas.DataFrame): records, refer to ODEHandler._estimate_params()
+            quantiles (tuple(int, int)): quantiles to cut parameter range, like confidence interval
+            check_dict (dict[str, object]): setting of validation
+            study_dict (dict[str, object]): setting of optimization study, including storage shared by the workers
+            show_phase (bool): whether show phase name or not (stdout)
+
+        Returns:
+            list[dict(str, object)]: results of the phases, refer to ODEHandler._estimate_params()
+
+        Note:
+            Each of the k workers of a phase runs its own loop of asking, simulating and telling trials
+            with the study of the phase shared via the storage and constant liar.
+        """
+        # The number of workers of the phases, e.g. {"0th": 2, "1st": 1} with 3 jobs
+        worker_dict = {phase: self._n_jobs // len(phases) + (i < self._n_jobs % len(phases)) for (i, phase) in enumerate(phases)}
+        # Studies are initialized (including prior values) in the main process and shared by the workers
+        estimator_dict, items = {}, []
+        for phase in phases:
+            phase_study_dict = self._study_dict(phase, {**study_dict, "constant_liar": True}, data=data)
+            estimator_dict[phase] = self._estimator(phase, data=data, quantiles=quantiles, optimizer="tpe")
+            estimator_dict[phase].start(phase_study_dict, priors=self._priors(phase), center=self._center(phase))
+            items.extend(
+                (phase, self._estimator(phase, data=data, quantiles=quantiles, optimizer="tpe"),
+                 phase_study_dict, self._priors(phase), self._center(phase), worker) for worker in range(worker_dict[phase]))
+        worker_f = functools.partial(self._estimate_worker, check_dict=check_dict)
+        with self._executor_context() as executor:
+            runtimes = executor.map(worker_f, items)
+        est_dict_list = []
+        for phase in phases:
+            runtime = max(runtime for ((item_phase, *_), runtime) in zip(items, runtimes) if item_phase == phase)
+            est_dict_list.append({**estimator_dict[phase].result(), self.RUNTIME: StopWatch.show(runtime)})
+            self._show_result(phase, est_dict_list[-1], show_phase=show_phase)
+        return est_dict_list
+
+    @staticmethod
+    def _estimate_worker(item, check_dict):
+        """
+        Run the loop of optimization with a study shared by the workers.
+
+        Args:
+            item (tuple(str, _ParamEstimator, dict[str, object], list[dict[str, float]], dict[str, float] or None, int)):
+                phase name, estimator, setting of the study with storage, prior values, center values and index of the worker
+            check_dict (dict[str, object]): setting of validation, refer to _ParamEstimator.run()
+
+        Returns:
+            float: runtime of the worker [sec]
+        """
+        _, estimator, study_dict, priors, center, worker = item
+        batch_size = Validator(check_dict.get("batch_size", 32), "batch_size").int(value_range=(1, None))
+        estimator.start(study_dict, priors=priors, center=center, worker=worker)
+        while True:
+            size = estimator.next_size(check_dict, batch_size=batch_size)
+            if size:
+                estimator.iterate(size)
+            if not size or estimator.is_finished(check_dict):
+                return estimator.runtime
+
+    def _estimator(self, phase, data, quantiles, optimizer="tpe"):
+        """
+        Create an estimator of ODE parameter values for one phase.
+
+        Args:
+            phase (str): phase name
+            data (pandas.DataFrame): records, refer to ODEHandler._estimate_params()
+            quantiles (tuple(int, int)): quantiles to cut parameter range, like confidence interval
+            optimizer (str): optimization method, "tpe" or "lbfgs"
+
+        Returns:
+            _ParamEstimator or _GradientEstimator: estimator with the records of the phase
+        """
+        estimator_class = self._ESTIMATOR_DICT[optimizer]
+        return estimator_class(self._model, self._phase_records(phase, data), self._tau, self._metric, quantiles, method=self._method)
+
+    def _phase_records(self, phase, data):
+        """
+        Return the records of the phase.
+
+        Args:
+            phase (str): phase name
+            data (pandas.DataFrame): records, refer to ODEHandler._estimate_params()
+
+        Returns:
+            pandas.DataFrame: records from the start date to the end date of the phase
+        """
+        start, end = self._info_dict[phase][self.START], self._info_dict[phase][self.END]
+        return data.loc[(start <= data[self.DATE]) & (data[self.DATE] <= end)]
+
+    def _study_dict(self, phase, study_dict, data):
+        """
+        Return the setting of optimization study for the phase, including the name of the study.
+
+        Args:
+            phase (str): phase name
+            study_dict (dict[str, object]): setting of optimization study, including "study_name" (prefix of the study names)
+            data (pandas.DataFrame): records, refer to ODEHandler._estimate_params()
+
+        Returns:
+            dict[str, object]: setting of optimization study with study name
+                "{study_name}/{model name}/{phase name}/{start date}-{end date}/{tau}/{metric}/{integration method}/{hash of the records}"
+        """
+        start_date = self._info_dict[phase][self.START].strftime(self.DATE_FORMAT)
+        end_date = self._info_dict[phase][self.END].strftime(self.DATE_FORMAT)
+        df = self._phase_records(phase, data)
+        digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()[:16]
+        names = [study_dict.get("study_name"), self._model.NAME, phase, f"{start_date}-{end_date}", self._tau, self._metric, self._method, digest]
+        return {**study_dict, "study_name": "/".join(str(name) for name in names)}
+
+    def _register_params(self, phase, est_dict):
+        """
+        Register the estimated parameter values of the phase and return the setting of the phase.
+
+        Args:
+            phase (str): phase name
+            est_dict (dict[str, object]): result of estimation, including parameter values
+
+        Returns:
+            dict[str, object]: start date, end date and the result of estimation
+        """
+        self._info_dict[phase]["param"] = {param: est_dict[param] for param in self._model.PARAMETERS}
+        return {self.START: self._info_dict[phase][self.START], self.END: self._info_dict[phase][self.END], **est_dict}
 
-    def estimate_params(self, data, quantiles=(0.1, 0.9), check_dict=None, study_dict=None, **kwargs):
+    def _priors(self, phase):
+        """
+        Return the registered parameter values of the phase and the neighbouring phases for warm start.
+
+        Args:
+            phase (str): phase name
+
+        Returns:
+            list[dict[str, float]]: parameter values of the phase, the previous phase and the next phase (when all parameters were registered)
+        """
+        phases = list(self._info_dict.keys())
+        i = phases.index(phase)
+        priors = []
+        for neighbour in [phase, *phases[max(i - 1, 0):i], *phases[i + 1:i + 2]]:
+            param_dict = self._info_dict[neighbour]["param"]
+            if set(self._model.PARAMETERS).issubset(param_dict):
+                prior_dict = {param: param_dict[param] for param in self._model.PARAMETERS}
+                priors.extend([prior_dict] if prior_dict not in priors else [])
+        return priors
+
+    def _center(self, phase):
+        """
+        Return the registered parameter values of the phase to narrow the parameter range around.
+
+        Args:
+            phase (str): phase name
+
+        Returns:
+            dict[str, float] or None: parameter values of the phase or None (some parameters were not registered)
+        """
+        param_dict = self._info_dict[phase]["param"]
+        if not set(self._model.PARAMETERS).issubset(param_dict):
+            return None
+        return {param: param_dict[param] for param in self._model.PARAMETERS}
+
+    def estimate_params(self, data, quantiles=(0.1, 0.9), check_dict=None, study_dict=None, optimizer="tpe", phases=None, hybrid=False, **kwargs):
         """
         Estimate ODE parameter values of the all phases to minimize the score of the metric.
 
@@ -227,21 +628,32 @@ class ODEHandler(Term):
                     - Recovered (int): the number of recovered cases
             quantiles (tuple(int, int)): quantiles to cut parameter range, like confidence interval
             check_dict (dict[str, object] or None): setting of validation
-                - None means {"timeout": 180, "timeout_interaction": 1, "tail_n": 4, "allowance": (0.99, 1.01)}
+                - None means {"timeout": 180, "timeout_iteration": 1, "batch_size": 32, "n_trials": None, "tail_n": 4, "tolerance": 0, "allowance": (0.99, 1.01)}
                 - timeout (int): timeout of optimization
-                - timeout_iteration (int): timeout of one iteration
+                - timeout_iteration (int): not used, kept for compatibility
+                - batch_size (int): the number of trials in one iteration (simulated at once), 32 when not included
+                - n_trials (int or None): trial budget (timeout will be ignored) or None (use timeout)
                 - tail_n (int): the number of iterations to decide whether score did not change for the last iterations
+                - tolerance (float): relative improvement of the score to regard as converged over the last @tail_n iterations
                 - allowance (tuple(float, float)): the allowance of the max predicted values
             study_dict (dict[str, object] or None): setting of optimization study
-                - None means {"pruner": "threshold", "upper": 0.5, "percentile": 50, "seed": 0, "constant_liar": False}
+                - None means {"pruner": "threshold", "upper": 0.5, "percentile": 50, "seed": 0, "constant_liar": False, "margin": None, "storage": None, "study_name": "Selected area"}
                 - pruner (str): kind of pruner (hyperband, median, threshold or percentile)
                 - upper (float): works for "threshold" pruner, intermediate score is larger than this value, it prunes
                 - percentile (float): works for "Percentile" pruner, the best intermediate value is in the bottom percentile among trials, it prunes
                 - constant_liar (bool): whether use constant liar to reduce search effort or not
+                - margin (float or None): relative margin of the parameter range around the registered values of the phase or None (not narrowed, refer to the note)
+                - storage (str or None): database URL of Optuna storage (e.g. "sqlite:///estimation.db") to resume studies or None (in-memory)
+                - study_name (str): prefix of the names of the studies (e.g. area name)
+            optimizer (str): optimization method, "tpe" (Optuna, TPE sampler) or "lbfgs" (L-BFGS-B with forward sensitivities)
+            phases (list[str] or None): names of the phases to estimate (e.g. ["3rd"]) or None (all phases)
+            hybrid (bool): whether divide the parallel jobs to the phases when the phases are fewer than the parallel jobs (refer to the note)
             kwargs: we can set arguments directly. E.g. timeout=180 for check_dict={"timeout": 180,...}
 
         Raises:
             covsirphy.UnExecutedError: either tau value or phase information was not set
+            covsirphy.UnExpectedValueError: optimizer="lbfgs" was selected with a metric other than MSLE and RMSLE
+            covsirphy.UnExpectedValueError: hybrid=True and optimizer="tpe" were selected without storage
 
         Returns:
             dict(str, object): setting of the phase (key: phase name)
@@ -253,7 +665,44 @@ class ODEHandler(Term):
                 - {metric}: score with the estimated parameter values
                 - Trials (int): the number of trials
                 - Runtime (str): runtime of optimization
+
+        Note:
+            With optimizer="lbfgs", parameter values will be optimized with L-BFGS-B method inside the ranges cut with @quantiles,
+            starting with the median values. MSLE will be minimized (metric must be MSLE or RMSLE) and @study_dict will be ignored.
+            "maxiter" (the maximum number of iterations, 100 as default) can be set with @check_dict.
+
+        Note:
+            Only the phases specified with @phases will be estimated and included in the returned dictionary.
+
+        Note:
+            Registered parameter values (ODEHandler.add(param_dict) or the last estimation) of the phase and the neighbouring phases
+            will be used as prior values (warm start): they will be tried at first and the range cut with @quantiles will be extended to include them.
+            With margin (e.g. 0.5), the range will be narrowed around the registered values of the phase itself, not the neighbouring phases,
+            because parameter values change at the boundaries of phases.
+            Values of the neighbouring phases are used only when they were registered before this call: in the first estimation,
+            the phases are estimated at the same time without them. To start from the values of the previous phase in the first estimation,
+            please estimate the phases one by one with @phases (e.g. phases=["0th"] and then phases=["1st"]).
+
+        Note:
+            With storage, the study of a phase will be saved as
+            "{study_name}/{model name}/{phase name}/{start date}-{end date}/{tau}/{metric}/{integration method}/{hash of the records}"
+            and trials saved in the storage will be loaded with the same name (e.g. resume after interruption).
+            When the records of the phase, tau, metric or integration method changed, a new study will be created.
+            The number of trials includes loaded trials, but trials which were running when the last process stopped will be marked as failed
+            and not be included. Please do not run processes with the same study at the same time (except for the workers of hybrid=True).
+            This works with optimizer="tpe" only.
+
+        Note:
+            With hybrid=True, optimizer="tpe" and the phases fewer than the parallel jobs, the parallel jobs will be divided to the phases.
+            Each of the k workers of a phase asks, simulates and tells trials of the study of the phase shared via storage
+            with constant liar, and so storage must be specified. Results are not reproducible.
+            Supported backends of ParallelExecutor are "process" and "thread" (e.g. storage="sqlite:///estimation.db")
+            and "cluster" with a database server accessible from the worker nodes (e.g. storage="postgresql://...").
+            With "serial" backend, the workers run one by one.
         """
+        optimizer = Validator([optimizer], "optimizer").sequence(candidates=list(self._ESTIMATOR_DICT.keys()))[0]
+        if optimizer == "lbfgs" and self._metric not in _GradientEstimator.METRICS:
+            raise UnExpectedValueError("metric", self._metric, candidates=_GradientEstimator.METRICS, details="with optimizer=\"lbfgs\"")
         print(f"\n<{self._model.NAME} model: parameter estimation>")
         print(f"Running optimization with {self._n_jobs} CPUs...")
         stopwatch = StopWatch()
@@ -267,30 +716,30 @@ class ODEHandler(Term):
                 "ODEHandler.estimate_tau()",
                 details="Or specify tau when creating an instance of ODEHandler")
         # Arguments of _ParamEstimator
-        check_kwargs = {"timeout": 180, "timeout_iteration": 1, "tail_n": 4, "allowance": (0.99, 1.01)}
+        check_kwargs = {"timeout": 180, "timeout_iteration": 1, "batch_size": 32, "n_trials": None, "tail_n": 4, "tolerance": 0, "allowance": (0.99, 1.01)}
         check_kwargs.update(check_dict or {})
         check_kwargs.update(kwargs)
-        study_kwargs = {
-            "pruner": "threshold", "upper": 0.5, "percentile": 50, "seed": 0, "constant_liar": False}
+        study_kwargs = self._STUDY_DICT.copy()
         study_kwargs.update(study_dict or {})
         study_kwargs.update(kwargs)
+        if hybrid and optimizer == "tpe" and study_kwargs.get("storage") is None:
+            raise UnExpectedValueError(
+                "storage", None, candidates=["database URL shared by the workers"], details="with hybrid=True (e.g. storage=\"sqlite:///estimation.db\")")
         # ODE parameter estimation
-        phases = list(self._info_dict.keys())
-        est_f = functools.partial(
-            self._estimate_params, data=df, quantiles=quantiles,
-            check_dict=check_kwargs, study_dict=study_kwargs, show_phase=(len(phases) > 1))
-        if self._n_jobs == 1:
-            est_dict_list = [est_f(ph) for ph in phases]
+        phases = Validator(phases, "phases").sequence(default=list(self._info_dict.keys()), candidates=list(self._info_dict.keys()))
+        show_phase = len(self._info_dict) > 1
+        if hybrid and optimizer == "tpe" and self._n_jobs > len(phases):
+            est_dict_list = self._estimate_params_hybrid(
+                phases, data=df, quantiles=quantiles, check_dict=check_kwargs, study_dict=study_kwargs, show_phase=show_phase)
         else:
-            with Pool(self._n_jobs) as p:
-                est_dict_list = p.map(est_f, phases)
-        for (phase, est_dict) in zip(phases, est_dict_list):
-            self._info_dict[phase]["param"] = {
-                param: est_dict[param] for param in self._model.PARAMETERS}
+            est_f = functools.partial(
+                self._estimate_params, data=df, quantiles=quantiles,
+                check_dict=check_kwargs, study_dict=study_kwargs, show_phase=show_phase, optimizer=optimizer)
+            with self._executor_context() as executor:
+                est_dict_list = executor.map(est_f, phases)
+        result_dict = {phase: self._register_params(phase, est_dict) for (phase, est_dict) in zip(phases, est_dict_list)}
         print(f"Completed optimization. Total: {stopwatch.stop_show()}")
-        return {
-            k: {self.START: self._info_dict[k][self.START], self.END: self._info_dict[k][self.END], **v}
-            for (k, v) in zip(phases, est_dict_list)}
+        return result_dict
 
     def estimate(self, data, **kwargs):
         """
@@ -3,10 +3,12 @@
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from scipy.integrate import solve_ivp
 from covsirphy.util.validator import Validator
 from covsirphy.util.term import Term
 from covsirphy.ode.mbase import ModelBase
+from covsirphy.ode.ode_cache import SimulationCache
 
 
 class _ODESolver(Term):
@@ -15,30 +17,43 @@ class _ODESolver(Term):
 
     Args:
         model (covsirphy.ModelBase): SIR-derived ODE model
+        method (str): integration method, "RK45" (default), the other methods of scipy.integrate.solve_ivp() or fixed-step methods ("euler", "heun", "rk4")
         kwargs: values of non-dimensional model parameters, including rho and sigma
 
     Note:
         We can check non-dimensional model parameters with model.PARAMETERS class variable.
         All non-dimensional parameters must be specified with keyword arguments.
+
+    Note:
+        Fixed-step methods step exactly on the time steps (tau-free), i.e. 0, 1, 2,..., step_n,
+        without step size control and interpolation.
+
+    Note:
+        With implicit methods (Radau, BDF, LSODA) for stiff problems, the analytic Jacobian matrix of the model will be used.
     """
+    FIXED_STEP_METHODS = ["euler", "heun", "rk4"]
+    IMPLICIT_METHODS = ["Radau", "BDF", "LSODA"]
+    METHODS = ["RK45", "RK23", "DOP853", *IMPLICIT_METHODS, *FIXED_STEP_METHODS]
 
-    def __init__(self, model, **kwargs):
+    def __init__(self, model, method="RK45", **kwargs):
         self._model = Validator(model, "model").subclass(ModelBase)
+        self._method = Validator([method], "method").sequence(candidates=self.METHODS)[0]
         param_dict = {k: float(v) for (k, v) in kwargs.items() if isinstance(v, (float, int))}
         self._param_dict = Validator(param_dict, "kwargs").dict(required_keys=model.PARAMETERS, errors="raise")
 
-    def run(self, step_n, **kwargs):
+    def run(self, step_n, steps=None, **kwargs):
         """
         Solve an initial value problem.
 
         Args:
             step_n (int): the number of steps
+            steps (list[int] or None): time steps to return values at (from 0 to @step_n) or None (all time steps)
             kwargs: initial values of dimensional variables, including Susceptible
 
         Returns:
             pandas.DataFrame: numerical solution
                 Index
-                    reset index: time steps
+                    reset index: time steps (or @steps)
                 Columns
                     (int): dimensional variables of the model
 
@@ -46,41 +61,279 @@ class _ODESolver(Term):
             We can check dimensional variables with model.VARIABLES class variable.
             All dimensional variables must be specified with keyword arguments.
             Total value of initial values will be regarded as total population.
+
+        Note:
+            With @steps, values will be evaluated only at the time steps. They are the same as the values with all time steps.
+
+        Note:
+            Results will be saved in covsirphy.SimulationCache.shared() when it is enabled.
         """
         # Check arguments
         step_n = Validator(step_n, "number").int(value_range=(1, None))
+        if steps is not None:
+            steps = sorted(set(Validator(steps, "steps").sequence()))
+            Validator(steps[0], "the first value of steps").int(value_range=(0, step_n))
+            Validator(steps[-1], "the last value of steps").int(value_range=(0, step_n))
         kwargs = {param: int(value) for (param, value) in kwargs.items()}
         y0_dict = Validator(kwargs, "kwargs").dict(required_keys=self._model.VARIABLES, errors="raise")
-        # Calculate population
-        population = sum(y0_dict.values())
         # Solve problem
-        return self._run(step_n=step_n, y0_dict=y0_dict, population=population)
+        return self._run(step_n=step_n, y0_dict=y0_dict, steps=steps)
 
-    def _run(self, step_n, y0_dict, population):
+    def _run(self, step_n, y0_dict, steps=None):
         """
         Solve an initial value problem for a SIR-derived ODE model.
 
         Args:
             step_n (int): the number of steps
             y0_dict (dict[str, int]): initial values of dimensional variables, including Susceptible
-            population (int): total population
+            steps (list[int] or None): sorted time steps to return values at or None (all time steps)
 
         Returns:
             pandas.DataFrame: numerical solution
                 Index
-                    reset index: time steps
+                    reset index: time steps (or @steps)
                 Columns
                     (int): dimensional variables of the model
         """
-        tstart, dt, tend = 0, 1, step_n
         variables = self._model.VARIABLES[:]
-        initials = [y0_dict[var] for var in variables]
+        initials = np.array([y0_dict[var] for var in variables], dtype=np.float64)
+        params = [self._param_dict[param] for param in self._model.PARAMETERS]
+        cache = SimulationCache.shared()
+        if cache.enabled:
+            key = cache.key(self._model, params, initials, step_n, method=self._method, steps=steps)
+            cached_df = cache.get(key)
+            if cached_df is not None:
+                return cached_df
+        y = self.run_array(self._model, params, initials, step_n=step_n, method=self._method, steps=steps)
+        y_df = pd.DataFrame(data=y, columns=variables, index=steps).round().astype(np.int64)
+        return cache.put(key, y_df) if cache.enabled else y_df
+
+    @classmethod
+    def run_array(cls, model, params, y0, step_n, method="RK45", steps=None):
+        """
+        Solve an initial value problem with arrays, without validation of arguments and conversion to a dataframe.
+
+        Args:
+            model (covsirphy.ModelBase): SIR-derived ODE model
+            params (list[float] or numpy.ndarray or callable): values of non-dimensional model parameters, ordered as model.PARAMETERS,
+                or a function which returns the values with time step t (float), i.e. params(t) -> numpy.ndarray
+            y0 (numpy.ndarray): initial values of dimensional variables (float values), ordered as model.VARIABLES
+            step_n (int): the number of steps
+            method (str): integration method, refer to _ODESolver.METHODS
+            steps (list[int] or numpy.ndarray or None): sorted time steps to return values at or None (all time steps)
+
+        Returns:
+            numpy.ndarray: numerical solution (float values, not rounded), shape (step_n + 1, n_vars) or (len(steps), n_vars)
+
+        Note:
+            Total value of initial values will be regarded as total population.
+
+        Note:
+            This is a fast path for repeated simulation (e.g. objective functions of optimization),
+            and the arguments will not be validated.
+
+        Note:
+            With time-dependent parameter values (callable @params), the whole time steps will be integrated at once.
+        """
+        population = y0.sum()
+        param_func = params if callable(params) else (lambda _: params)
+
+        def dydt(t, X, out=None):
+            return model._dydt(X, param_func(t), population, out=out)
+
+        def jacobian(t, X):
+            return model._jacobian(X, param_func(t), population)
+
+        return cls._solve(fun=dydt, y0=y0, step_n=step_n, method=method, jac=jacobian, t_eval=steps).T
+
+    @classmethod
+    def _solve(cls, fun, y0, step_n, method, jac=None, t_eval=None):
+        """
+        Integrate the ODE on the time steps 0, 1, 2,..., step_n.
+
+        Args:
+            fun (callable): right-hand side of the system, fun(t, y, out=None) -> numpy.ndarray
+            y0 (numpy.ndarray): initial values, shape (n,)
+            step_n (int): the number of steps
+            method (str): integration method, refer to _ODESolver.METHODS
+            jac (callable or None): Jacobian matrix of the right-hand side, jac(t, y), used with implicit methods
+            t_eval (list[int] or numpy.ndarray or None): sorted time steps to return values at or None (all time steps)
+
+        Returns:
+            numpy.ndarray: values at the time steps, shape (n, step_n + 1) or (n, len(t_eval))
+
+        Note:
+            Step sizes of the integration do not depend on @t_eval, and only the values at @t_eval will be saved.
+        """
+        t_eval = np.arange(0, step_n + 1, 1) if t_eval is None else np.asarray(t_eval)
+        if method in cls.FIXED_STEP_METHODS:
+            return cls._solve_fixed_step(fun=fun, y0=y0, step_n=step_n, method=method, t_eval=t_eval)
+        jac_dict = {"jac": jac} if method in cls.IMPLICIT_METHODS and jac is not None else {}
         sol = solve_ivp(
-            fun=self._model(population=population, **self._param_dict),
-            t_span=[tstart, tend],
-            y0=np.array(initials, dtype=np.int64),
-            t_eval=np.arange(tstart, tend + dt, dt),
-            dense_output=False
+            fun=fun,
+            t_span=[0, step_n],
+            y0=y0,
+            method=method,
+            t_eval=t_eval,
+            dense_output=False,
+            **jac_dict
         )
-        y_df = pd.DataFrame(data=sol["y"].T.copy(), columns=variables)
-        return y_df.round().astype(np.int64)
+        return sol["y"]
+
+    @staticmethod
+    def _solve_fixed_step(fun, y0, step_n, method, t_eval):
+        """
+        Integrate the ODE with a fixed-step method, using 1 as the step size.
+
+        Args:
+            fun (callable): right-hand side of the system, fun(t, y, out=None) -> numpy.ndarray
+            y0 (numpy.ndarray): initial values, shape (n,)
+            step_n (int): the number of steps
+            method (str): "euler" (1st order), "heun" (2nd order) or "rk4" (classical 4th order Runge-Kutta)
+            t_eval (numpy.ndarray): sorted time steps to return values at
+
+        Returns:
+            numpy.ndarray: values at the time steps, shape (n, len(t_eval))
+
+        Note:
+            Intermediate values are saved in pre-allocated buffers with "out" argument of @fun.
+            Only the values at @t_eval will be copied to the returned array.
+        """
+        y = np.empty((len(t_eval), len(y0)), dtype=np.float64)
+        yt, yn = np.array(y0, dtype=np.float64), np.empty(len(y0), dtype=np.float64)
+        # Index of the next time step to save
+        i = 0
+        if t_eval[0] == 0:
+            y[0], i = yt, 1
+        k1, k2, k3, k4, yk = (np.empty(len(y0), dtype=np.float64) for _ in range(5))
+        for t in range(t_eval[-1]):
+            fun(t, yt, out=k1)
+            if method == "euler":
+                np.add(yt, k1, out=yn)
+            elif method == "heun":
+                np.add(yt, k1, out=yk)
+                fun(t + 1, yk, out=k2)
+                # yn = yt + (k1 + k2) / 2
+                np.add(k1, k2, out=yn)
+                yn *= 0.5
+                yn += yt
+            else:
+                np.multiply(k1, 0.5, out=yk)
+                yk += yt
+                fun(t + 0.5, yk, out=k2)
+                np.multiply(k2, 0.5, out=yk)
+                yk += yt
+                fun(t + 0.5, yk, out=k3)
+                np.add(yt, k3, out=yk)
+                fun(t + 1, yk, out=k4)
+                # yn = yt + (k1 + 2 * k2 + 2 * k3 + k4) / 6
+                np.add(k2, k3, out=yn)
+                yn *= 2
+                yn += k1
+                yn += k4
+                yn /= 6
+                yn += yt
+            if t_eval[i] == t + 1:
+                y[i], i = yn, i + 1
+            yt, yn = yn, yt
+        return y.T
+
+    @classmethod
+    def run_batch(cls, model, params, y0, step_n, method="RK45", steps=None):
+        """
+        Solve initial value problems of a SIR-derived ODE model with sets of parameter values at once.
+
+        Args:
+            model (covsirphy.ModelBase): SIR-derived ODE model
+            params (numpy.ndarray): values of non-dimensional model parameters, shape (N, n_params)
+            y0 (numpy.ndarray): initial values of dimensional variables, shape (N, n_vars)
+            step_n (int): the number of steps
+            method (str): integration method, refer to _ODESolver.METHODS
+            steps (list[int] or numpy.ndarray or None): sorted time steps to return values at or None (all time steps)
+
+        Raises:
+            ValueError: the shapes of @params and @y0 do not match the model
+
+        Returns:
+            numpy.ndarray: numerical solutions (float values), shape (N, step_n + 1, n_vars) or (N, len(steps), n_vars)
+
+        Note:
+            Parameters and variables must be ordered as model.PARAMETERS and model.VARIABLES.
+            Total value of initial values of each system will be regarded as its total population.
+            All N systems will be integrated in one vectorized pass.
+
+        Note:
+            With Radau and BDF, the block-diagonal analytic Jacobian matrix will be used as a sparse matrix.
+        """
+        model = Validator(model, "model").subclass(ModelBase)
+        step_n = Validator(step_n, "number").int(value_range=(1, None))
+        method = Validator([method], "method").sequence(candidates=cls.METHODS)[0]
+        param_array = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        y0_array = np.atleast_2d(np.asarray(y0, dtype=np.float64))
+        if param_array.shape[1] != len(model.PARAMETERS):
+            raise ValueError(
+                f"@params must have {len(model.PARAMETERS)} columns ({', '.join(model.PARAMETERS)}), "
+                f"but an array with shape {param_array.shape} was applied.")
+        if y0_array.shape != (param_array.shape[0], len(model.VARIABLES)):
+            raise ValueError(
+                f"@y0 must have shape ({param_array.shape[0]}, {len(model.VARIABLES)}), "
+                f"but an array with shape {y0_array.shape} was applied.")
+        sys_n, var_n = y0_array.shape
+        population = y0_array.sum(axis=1)
+        param_t = param_array.T
+
+        def dydt(_, y, out=None):
+            out_reshaped = None if out is None else out.reshape(var_n, sys_n)
+            return model._dydt(y.reshape(var_n, sys_n), param_t, population, out=out_reshaped).ravel()
+
+        # Indices of the block-diagonal Jacobian matrix: d(dX_vk/dt)/dX_uk is at (v * N + k, u * N + k)
+        var_idx, sys_idx = np.arange(var_n), np.arange(sys_n)
+        rows = np.broadcast_to(var_idx[:, None, None] * sys_n + sys_idx, (var_n, var_n, sys_n)).ravel()
+        cols = np.broadcast_to(var_idx[None, :, None] * sys_n + sys_idx, (var_n, var_n, sys_n)).ravel()
+
+        def jacobian(_, y):
+            values = model._jacobian(y.reshape(var_n, sys_n), param_t, population).ravel()
+            return sparse.csc_matrix((values, (rows, cols)), shape=(y.size, y.size))
+
+        y = cls._solve(
+            fun=dydt, y0=y0_array.T.ravel(), step_n=step_n, method=method,
+            jac=jacobian if method in ["Radau", "BDF"] else None, t_eval=steps)
+        return y.reshape(var_n, sys_n, -1).transpose(1, 2, 0)
+
+    @classmethod
+    def run_sensitivity(cls, model, params, y0, step_n, method="RK45"):
+        """
+        Solve an initial value problem with forward sensitivity equations of the parameters.
+
+        Args:
+            model (covsirphy.ModelBase): SIR-derived ODE model
+            params (list[float] or numpy.ndarray): values of non-dimensional model parameters, ordered as model.PARAMETERS
+            y0 (numpy.ndarray): initial values of dimensional variables (float values), ordered as model.VARIABLES
+            step_n (int): the number of steps
+            method (str): integration method, refer to _ODESolver.METHODS
+
+        Returns:
+            tuple(numpy.ndarray, numpy.ndarray):
+                - numerical solution (float values), shape (step_n + 1, n_vars)
+                - sensitivities dX/dp, shape (step_n + 1, n_vars, n_params)
+
+        Note:
+            Sensitivities S = dX/dp are integrated with the variables as dS/dt = J S + d(dX/dt)/dp,
+            where J is the Jacobian matrix d(dX/dt)/dX. Initial values of S are 0.
+        """
+        param_array = np.asarray(params, dtype=np.float64)
+        var_n, param_n = len(y0), len(param_array)
+        population = y0.sum()
+
+        def dydt(_, z, out=None):
+            out = np.empty(z.shape) if out is None else out
+            x, sens = z[:var_n], z[var_n:].reshape(var_n, param_n)
+            model._dydt(x, param_array, population, out=out[:var_n])
+            d_sens = model._param_jacobian(x, param_array, population)
+            d_sens += model._jacobian(x, param_array, population) @ sens
+            out[var_n:] = d_sens.ravel()
+            return out
+
+        z0 = np.concatenate([y0, np.zeros(var_n * param_n)])
+        z = cls._solve(fun=dydt, y0=z0, step_n=step_n, method=method).T
+        return z[:, :var_n], z[:, var_n:].reshape(-1, var_n, param_n)
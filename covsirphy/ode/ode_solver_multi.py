@@ -1,12 +1,20 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import bisect
+import contextlib
+import numpy as np
 import pandas as pd
+from scipy.interpolate import PchipInterpolator
 from covsirphy.util.error import NAFoundError
 from covsirphy.util.validator import Validator
 from covsirphy.util.term import Term
 from covsirphy.ode.mbase import ModelBase
+from covsirphy.ode.ode_cache import SimulationCache
 from covsirphy.ode.ode_solver import _ODESolver
+from covsirphy.ode.quantile_sketch import _QuantileSketch
+from covsirphy.ode.stochastic_solver import _StochasticSolver
+from covsirphy.ode.trajectory_store import TrajectoryStore
 
 
 class _MultiPhaseODESolver(Term):
@@ -17,10 +25,26 @@ class _MultiPhaseODESolver(Term):
         model (covsirphy.ModelBase): ODE model
         first (pandas.Timestamp): first date of simulation, like 14Apr2021
         tau (int): tau value [min]
+        method (str): integration method, refer to _ODESolver.METHODS
+        interpolation (str or None): how to change parameter values with time, refer to _MultiPhaseODESolver.INTERPOLATIONS
+            - None: the solver will be restarted at the start of each phase
+            - "constant": piecewise-constant values of the phases, integrated at once
+            - "spline": shape-preserving cubic spline (PCHIP) through the values at the middle of the phases, integrated at once
+
+    Note:
+        With "constant" and "spline", the phases will be integrated at once (without restarts) until a phase with registered initial values.
+        Values may be slightly different from those with restarts because the values of the previous phases are not rounded.
+        Adaptive methods (e.g. RK45) step over the changes of piecewise-constant values within their tolerance,
+        and fixed-step methods (e.g. rk4) are closer to simulation with restarts.
     """
+    INTERPOLATIONS = ["constant", "spline"]
 
-    def __init__(self, model, first, tau):
+    def __init__(self, model, first, tau, method="RK45", interpolation=None):
         self._model = Validator(model, "model").subclass(ModelBase)
+        self._method = Validator([method], "method").sequence(candidates=_ODESolver.METHODS)[0]
+        if interpolation is not None:
+            Validator([interpolation], "interpolation").sequence(candidates=self.INTERPOLATIONS)
+        self._interpolation = interpolation
         self._first = Validator(first, "first").instance(pd.Timestamp)
         self._tau = Validator(tau, "tau").tau(default=None)
         if self._tau is None:
@@ -74,28 +98,235 @@ class _MultiPhaseODESolver(Term):
                     - Infected (int): the number of currently infected cases
                     - Fatal (int): the number of fatal cases
                     - Recovered (int): the number of recovered cases
+
+        Note:
+            Only the values at the last time steps of the dates will be kept in memory, even when tau is small.
+
+        Note:
+            Results will be saved in covsirphy.SimulationCache.shared() when it is enabled.
         """
         # Settings
         for phase_dict in args:
             self._add(phase_dict[self.END], phase_dict["param"], phase_dict["y0"])
+        # Time steps to sample: the last time steps of the dates (the last records will be used for dates)
+        samples = self._samples()
+        total_n = samples[-1]
+        # Phases: list of (step numbers, registered initial values, parameter values)
+        phases = self._phases()
+        cache = SimulationCache.shared()
+        if cache.enabled:
+            key = cache.key(
+                self._model, np.concatenate([params for (_, _, params) in phases]),
+                [phases[0][1].get(var, np.nan) for var in self._model.VARIABLES], total_n, tau=self._tau,
+                method=self._method, interpolation=self._interpolation, first=self._first,
+                phases=tuple((step_n, tuple(sorted(y0_dict.items()))) for (step_n, y0_dict, _) in phases))
+            cached_df = cache.get(key)
+            if cached_df is not None:
+                return cached_df
+        # Segments to integrate at once: list of (step numbers, initial values, parameter values or functions)
+        segments = self._segments(phases)
+        # Pre-allocated array of the samples of all phases
+        variables = self._model.VARIABLES[:]
+        sim_array = np.empty((len(samples), len(variables)), dtype=np.float64)
         # Multi-phased simulation
-        dataframes = []
-        for (_, phase_dict) in self._info_dict.items():
-            # Step numbers
-            step_n = phase_dict["step_n"]
+        y0, start_step, filled_n = None, 0, 0
+        for (step_n, registered_dict, params) in segments:
             # Initial values: registered information (with priority) or the last values
-            y0_dict = dataframes[-1].iloc[-1].to_dict() if dataframes else {}
-            y0_dict.update(phase_dict["y0"])
-            if set(self._model.VARIABLES) - y0_dict.keys():
-                un_vars = list(set(self._model.VARIABLES) - y0_dict.keys())
+            y0_dict = {} if y0 is None else dict(zip(variables, y0))
+            y0_dict.update({k: int(v) for (k, v) in registered_dict.items()})
+            if set(variables) - y0_dict.keys():
+                un_vars = list(set(variables) - y0_dict.keys())
                 s, be = ("s", "were") if len(un_vars) > 1 else ("", "was")
                 raise KeyError(f"Initial value{s} of <{'>, <'.join(un_vars)}> {be} not specified.")
-            # parameter values
-            param_dict = phase_dict["param"].copy()
+            y0 = np.array([y0_dict[var] for var in variables], dtype=np.float64)
+            # Time steps: the samples in the segment and the last step (initial values of the next segment)
+            phase_n = np.searchsorted(samples, start_step + step_n, side="right") - filled_n
+            steps = np.unique([*(samples[filled_n:filled_n + phase_n] - start_step), step_n])
             # Solve the initial value problem with the ODE model
-            solver = _ODESolver(self._model, **param_dict)
-            solved_df = solver.run(step_n=step_n, **y0_dict)
-            dataframes += [solved_df.iloc[1:]] if dataframes else [solved_df]
-        # Combine the simulation results
-        df = pd.concat(dataframes, ignore_index=True, sort=True)
-        return self._model.convert_reverse(df, start=self._first, tau=self._tau)
+            y = _ODESolver.run_array(self._model, params, y0, step_n=step_n, method=self._method, steps=steps).round()
+            sim_array[filled_n:filled_n + phase_n] = y[:phase_n]
+            y0, start_step, filled_n = y[-1], start_step + step_n, filled_n + phase_n
+        # Convert the simulation results to a dataframe with dates
+        df = pd.DataFrame(sim_array.astype(np.int64), index=samples, columns=variables)
+        sim_df = self._model.convert_reverse(df, start=self._first, tau=self._tau)
+        return cache.put(key, sim_df) if cache.enabled else sim_df
+
+    def simulate_ensemble(self, *args, draws, q, chunk_size=1000, bins=1024, filename=None, rng=None):
+        """
+        Perform simulation with sets of parameter values and return quantiles of the variables for each date.
+
+        Args:
+            args (dict(str, object)): list of phase settings, refer to _MultiPhaseODESolver.simulate()
+            draws (dict[str, pandas.DataFrame]): parameter values of the phases (e.g. "0th") with the same number of rows (draws)
+                Index
+                    reset index
+                Columns
+                    (float): a part or all of model.PARAMETERS (registered values will be used for the others)
+            q (list[float]): quantiles in [0, 1]
+            chunk_size (int): the number of draws to simulate at once
+            bins (int): the number of bins of histograms to estimate quantiles with
+            filename (str or pathlib.Path or None): filename to save the trajectories with covsirphy.TrajectoryStore or None (not saved)
+            rng (numpy.random.Generator or None): random number generator for stochastic simulation or None (deterministic simulation)
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    Date (pandas.Timestamp): observation dates
+                Columns
+                    pandas.MultiIndex: variables of the model (model.VARIABLES) and @q
+
+        Note:
+            Draws will be simulated in chunks with _ODESolver.run_batch() (or _StochasticSolver.run_batch() with @rng)
+            and only histograms of the values will be kept, refer to covsirphy.ode.quantile_sketch._QuantileSketch.
+
+        Note:
+            With @filename, the trajectories will be saved with the index of the dataframes of @draws as scenario IDs.
+        """
+        for phase_dict in args:
+            self._add(phase_dict[self.END], phase_dict["param"], phase_dict["y0"])
+        samples = self._samples()
+        variables, parameters = self._model.VARIABLES[:], self._model.PARAMETERS[:]
+        # Parameter values of the draws: numpy.ndarray, shape (the number of draws, the number of parameters) for each phase
+        draws = {
+            phase: Validator(df, f"draws of {phase} phase").dataframe(empty_ok=False)
+            for (phase, df) in Validator(draws, "draws").dict().items()}
+        Validator(list(draws.keys()), "phases of @draws").sequence(candidates=list(self._info_dict.keys()))
+        draw_ns = {len(df) for df in draws.values()}
+        if len(draw_ns) != 1:
+            raise ValueError(f"Dataframes of @draws must have the same number of rows, but {sorted(draw_ns)} were applied.")
+        draw_n = draw_ns.pop()
+        param_arrays = []
+        for (phase, phase_dict) in self._info_dict.items():
+            draw_df = draws.get(phase, pd.DataFrame(index=range(draw_n)))
+            if set(parameters) - set(draw_df.columns) - set(phase_dict["param"]):
+                un_params = list(set(parameters) - set(draw_df.columns) - set(phase_dict["param"]))
+                raise ValueError(f"Values of <{'>, <'.join(un_params)}> were not registered or drawn for the {phase} phase.")
+            param_arrays.append(np.column_stack([
+                draw_df[param].to_numpy(dtype=np.float64) if param in draw_df else np.full(draw_n, phase_dict["param"][param])
+                for param in parameters]))
+        # Simulation with chunks
+        dates = (self._first + pd.to_timedelta(samples * self._tau, unit="min")).floor("D")
+        ids = next(iter(draws.values())).index.tolist()
+        store = None if filename is None else TrajectoryStore(filename, mode="w", dates=dates, variables=variables)
+        population = max(sum(phase_dict["y0"].values()) for phase_dict in self._info_dict.values())
+        sketch = _QuantileSketch(shape=(len(samples), len(variables)), upper=population, bins=bins)
+        with store or contextlib.nullcontext():
+            for start in range(0, draw_n, chunk_size):
+                sim_array = self._simulate_batch(samples, [params[start:start + chunk_size] for params in param_arrays], rng=rng)
+                sketch.update(sim_array)
+                if store is not None:
+                    store.write(ids=ids[start:start + chunk_size], values=sim_array)
+        # Convert the quantiles to a dataframe with dates
+        values = sketch.quantiles(q).transpose(1, 2, 0).reshape(len(samples), -1)
+        columns = pd.MultiIndex.from_product([variables, q])
+        return pd.DataFrame(values, index=pd.Index(dates, name=self.DATE), columns=columns)
+
+    def _simulate_batch(self, samples, param_arrays, rng=None):
+        """
+        Perform simulation with sets of parameter values at once, restarting the solver for each phase.
+
+        Args:
+            samples (numpy.ndarray): time steps to return values at
+            param_arrays (list[numpy.ndarray]): parameter values of the phases, shape (N, the number of parameters)
+            rng (numpy.random.Generator or None): random number generator for stochastic simulation or None (deterministic simulation)
+
+        Returns:
+            numpy.ndarray: simulated values (rounded) at the time steps, shape (N, len(samples), the number of variables)
+        """
+        variables = self._model.VARIABLES[:]
+        draw_n = len(param_arrays[0])
+        sim_array = np.empty((draw_n, len(samples), len(variables)), dtype=np.float64)
+        y0, start_step, filled_n = None, 0, 0
+        for (phase_dict, params) in zip(self._info_dict.values(), param_arrays):
+            # Initial values: registered information (with priority) or the last values
+            y0 = np.zeros((draw_n, len(variables))) if y0 is None else y0
+            for (i, var) in enumerate(variables):
+                if var in phase_dict["y0"]:
+                    y0[:, i] = int(phase_dict["y0"][var])
+            # Time steps: the samples in the phase and the last step (initial values of the next phase)
+            step_n = Validator(phase_dict["step_n"], "number").int(value_range=(1, None))
+            phase_n = np.searchsorted(samples, start_step + step_n, side="right") - filled_n
+            steps = np.unique([*(samples[filled_n:filled_n + phase_n] - start_step), step_n])
+            if rng is None:
+                y = _ODESolver.run_batch(self._model, params, y0, step_n=step_n, method=self._method, steps=steps).round()
+            else:
+                y = _StochasticSolver.run_batch(self._model, params, y0, step_n=step_n, rng=rng, steps=steps)
+            sim_array[:, filled_n:filled_n + phase_n] = y[:, :phase_n]
+            y0, start_step, filled_n = y[:, -1].copy(), start_step + step_n, filled_n + phase_n
+        return sim_array
+
+    def _samples(self):
+        """
+        Return time steps to sample, the last time steps of the dates.
+
+        Returns:
+            numpy.ndarray: time steps
+        """
+        total_n = sum(phase_dict["step_n"] for phase_dict in self._info_dict.values())
+        day_n = 1440 // self._tau
+        return np.unique(np.minimum(np.arange(day_n - 1, (total_n // day_n + 1) * day_n, day_n), total_n))
+
+    def _phases(self):
+        """
+        Return the settings of the phases with validated parameter values.
+
+        Returns:
+            list[tuple(int, dict[str, int], numpy.ndarray)]:
+                - int: the number of steps
+                - dict[str, int]: registered initial values or empty dict
+                - numpy.ndarray: parameter values, ordered as model.PARAMETERS
+        """
+        phases = []
+        for phase_dict in self._info_dict.values():
+            step_n = Validator(phase_dict["step_n"], "number").int(value_range=(1, None))
+            param_dict = Validator(phase_dict["param"], "param_dict").dict(required_keys=self._model.PARAMETERS, errors="raise")
+            phases.append((step_n, phase_dict["y0"], np.array([param_dict[param] for param in self._model.PARAMETERS])))
+        return phases
+
+    def _segments(self, phases):
+        """
+        Create segments of the phases to integrate at once.
+
+        Args:
+            phases (list[tuple(int, dict[str, int], numpy.ndarray)]): the returned value of ._phases()
+
+        Returns:
+            list[tuple(int, dict[str, int], numpy.ndarray or callable)]:
+                - int: the number of steps
+                - dict[str, int]: registered initial values or empty dict
+                - numpy.ndarray or callable: parameter values or function of time step t, refer to _ODESolver.run_array()
+
+        Note:
+            Without interpolation, each phase will be a segment. With interpolation, a new segment starts at a phase with registered initial values.
+        """
+        segments = []
+        for (step_n, registered_dict, params) in phases:
+            if self._interpolation is None or not segments or registered_dict:
+                segments.append((step_n, registered_dict, [(step_n, params)]))
+                continue
+            seg_step_n, y0_dict, seg_phases = segments[-1]
+            segments[-1] = (seg_step_n + step_n, y0_dict, [*seg_phases, (step_n, params)])
+        return [(step_n, y0_dict, self._param_function(seg_phases)) for (step_n, y0_dict, seg_phases) in segments]
+
+    def _param_function(self, phases):
+        """
+        Return parameter values or function of time step for the phases of a segment.
+
+        Args:
+            phases (list[tuple(int, numpy.ndarray)]): the number of steps and parameter values of the phases
+
+        Returns:
+            numpy.ndarray or callable: parameter values (single phase) or function of time step t, params(t) -> numpy.ndarray
+        """
+        if len(phases) == 1:
+            return phases[0][1]
+        step_array = np.array([step_n for (step_n, _) in phases])
+        values = np.array([params for (_, params) in phases])
+        ends = np.cumsum(step_array)
+        if self._interpolation == "constant":
+            # Lists with bisect are faster than numpy.searchsorted() for scalars
+            end_list, value_list, last = ends.tolist(), list(values), len(phases) - 1
+            return lambda t: value_list[min(bisect.bisect_right(end_list, t), last)]
+        mids = ends - step_array / 2
+        spline = PchipInterpolator(mids, values, axis=0)
+        return lambda t: spline(min(max(t, mids[0]), mids[-1]))
@@ -1,15 +1,19 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import math
+import warnings
+import numpy as np
 import optuna
+from optuna.exceptions import ExperimentalWarning
 from optuna.samplers import TPESampler
+from optuna.trial import TrialState
 from covsirphy.util.error import NAFoundError
 from covsirphy.util.evaluator import Evaluator
 from covsirphy.util.stopwatch import StopWatch
 from covsirphy.util.validator import Validator
 from covsirphy.util.term import Term
 from covsirphy.ode.mbase import ModelBase
+from covsirphy.ode.ode_cache import SimulationCache
 from covsirphy.ode.ode_solver import _ODESolver
 
 
@@ -31,6 +35,7 @@ class _ParamEstimator(Term):
         tau (int): tau value [min]
         metric (str): metric to minimize
         quantiles (tuple(int, int)): quantiles to cut parameter range, like confidence interval
+        method (str): integration method, refer to _ODESolver.METHODS
     """
     PRUNER_DICT = {
         "hyperband": optuna.pruners.HyperbandPruner,
@@ -38,9 +43,14 @@ class _ParamEstimator(Term):
         "threshold": optuna.pruners.ThresholdPruner,
         "percentile": optuna.pruners.PercentilePruner,
     }
+    # Name of the user attribute of trials which were running when the last process stopped
+    _STALE = "stale"
+    # Name of the user attribute of trials to record the worker which asked them
+    _WORKER = "worker"
 
-    def __init__(self, model, data, tau, metric, quantiles):
+    def __init__(self, model, data, tau, metric, quantiles, method="RK45"):
         self._model = Validator(model, "model").subclass(ModelBase)
+        self._method = Validator([method], "method").sequence(candidates=_ODESolver.METHODS)[0]
         Validator(data, "data").dataframe(columns=self.DSIFR_COLUMNS)
         self._tau = Validator(tau, "tau").tau(default=None)
         if self._tau is None:
@@ -59,22 +69,35 @@ class _ParamEstimator(Term):
         self._range_dict = model.guess(data, tau, q=quantiles)
         # Max values of the variables
         self._max_dict = {v: df[v].max() for v in model.VARIABLES}
+        # Arrays for the objective function: initial values, time steps of records and records
+        self._y0 = df.iloc[0].to_numpy(dtype=np.float64)
+        self._actual_steps = df.index.to_numpy(dtype=np.int64)
+        # The first variable (Susceptible) will be ignored in score calculation
+        self._actual = df.iloc[:, 1:].to_numpy(dtype=np.float64)
 
-    def run(self, check_dict, study_dict):
+    def run(self, check_dict, study_dict, priors=None, center=None):
         """
         Perform parameter estimation of the ODE model, not including tau.
 
         Args:
             check_dict (dict[str, object]): setting of validation
                 - timeout (int): timeout of optimization
-                - timeout_iteration (int): timeout of one iteration
+                - timeout_iteration (int): not used, kept for compatibility
+                - batch_size (int): the number of trials in one iteration (simulated at once), 32 when not included
+                - n_trials (int or None): trial budget (timeout will be ignored) or None (use timeout, default)
                 - tail_n (int): the number of iterations to decide whether score did not change for the last iterations
+                - tolerance (float): relative improvement of the score to regard as converged over the last @tail_n iterations, 0 when not included
                 - allowance (tuple(float, float)): the allowance of the max predicted values
             study_dict (dict[str, object]): setting of optimization study
                 - pruner (str): kind of pruner (hyperband, median, threshold or percentile)
                 - upper (float): works for "threshold" pruner, intermediate score is larger than this value, it prunes
                 - percentile (float): works for "Percentile" pruner, the best intermediate value is in the bottom percentile among trials, it prunes
                 - constant_liar (bool): whether use constant liar to reduce search effort or not
+                - margin (float or None): relative margin of the parameter range around @center or None (not narrowed, default)
+                - storage (str or None): database URL of Optuna storage (e.g. "sqlite:///estimation.db") or None (in-memory, default)
+                - study_name (str or None): name of the study in the storage
+            priors (list[dict[str, float]] or None): parameter values to try at first (e.g. the last estimation) or None (un-specified)
+            center (dict[str, float] or None): parameter values to narrow the range around with the margin (e.g. the last estimation) or None
 
         Returns:
             dict(str, object):
@@ -87,46 +110,275 @@ class _ParamEstimator(Term):
 
         Note:
             Please refer to covsirphy.Evaluator.score() for metric names.
+
+        Note:
+            With ask-and-tell interface of Optuna, one iteration asks @batch_size trials,
+            simulates them at once with _ODESolver.run_batch() and tells the scores.
+            Optimization will be stopped when the runtime exceeds @timeout after an iteration.
+
+        Note:
+            When @n_trials is an integer, optimization does not depend on runtime (i.e. CPU load) and will be reproducible with the seed.
+            It will be stopped when the number of trials reaches @n_trials, the score converged or the max values are in the allowance.
+
+        Note:
+            With @priors, the values will be enqueued as the first trials (warm start) and the range cut with quantiles
+            will be extended to include them. With @center and margin, the range will be narrowed to the overlap of the range
+            and [(values of @center) * (1 - margin), (values of @center) * (1 + margin)] instead (the latter when they do not overlap),
+            and prior values will be clipped to the range.
+
+        Note:
+            With @storage, the trials of the study with the same name in the storage will be loaded (resume)
+            and they will be included in the number of trials. Trials which were running when the last process stopped
+            will be marked as failed and not be included in the number of trials.
+            Prior values will be enqueued only when the study has no trials.
         """
-        timeout = check_dict["timeout"]
-        timeout_iteration = check_dict["timeout_iteration"]
-        tail_n = check_dict["tail_n"]
-        allowance = check_dict["allowance"]
+        batch_size = Validator(check_dict.get("batch_size", 32), "batch_size").int(value_range=(1, None))
         # Initialize optimization
-        study = self.init_study(**study_dict)
-        # The number of iterations
-        iteration_n = math.ceil(timeout / timeout_iteration)
-        stopwatch = StopWatch()
+        self.start(study_dict, priors=priors, center=center)
         # Optimization
-        scores = []
-        param_dict = {}
-        for _ in range(iteration_n):
+        while True:
             # Run iteration
-            study.optimize(self.objective, n_jobs=1, timeout=timeout_iteration)
-            param_dict = study.best_params.copy()
-            # If score did not change in the last iterations, stop running
-            scores.append(self._score(**param_dict))
-            if len(scores) >= tail_n and len(set(scores[-tail_n:])) == 1:
-                break
-            # Check max values are in the allowance
-            if self.is_in_allowance(allowance, **param_dict):
+            self.iterate(self.next_size(check_dict, batch_size=batch_size))
+            # Check convergence, trial budget or runtime
+            if self.is_finished(check_dict):
                 break
+        return self.result()
+
+    def start(self, study_dict, priors=None, center=None, worker=None):
+        """
+        Initialize optimization study for .iterate(), refer to ._ParamEstimator.run() for the arguments.
+
+        Args:
+            study_dict (dict[str, object]): setting of optimization study
+            priors (list[dict[str, float]] or None): parameter values to try at first or None (un-specified)
+            center (dict[str, float] or None): parameter values to narrow the range around with the margin or None (not narrowed)
+            worker (int or None): index of the worker when the study (with storage) is shared by workers or None (not shared)
+
+        Note:
+            With @worker, the study must be initialized by the other estimator without @worker in advance.
+            Prior values will not be enqueued and the index will be recorded as the user attribute "worker" of the asked trials.
+        """
+        self._worker = worker
+        self._study = self.init_study(**study_dict, shared=worker is not None)
+        margin = study_dict.get("margin")
+        if center is not None and margin is not None:
+            self._narrow(center, margin=margin)
+        elif priors:
+            self._extend(priors)
+        if priors:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=ExperimentalWarning)
+                for prior_dict in (priors if worker is None and not self._study.trials else []):
+                    self._study.enqueue_trial({param: float(np.clip(prior_dict[param], *v)) for (param, v) in self._range_dict.items()})
+        self._scores = []
+        self._runtime = 0
+
+    def iterate(self, size):
+        """
+        Run one iteration of optimization, asking trials, simulating them at once and telling the scores.
+
+        Args:
+            size (int): the number of trials to ask
+
+        Returns:
+            float: the best score after the iteration
+        """
+        trials, params = self.ask(size)
+        return self.tell(trials, self._score_params(params, **self.score_kwargs) if trials else [])
+
+    def ask(self, size):
+        """
+        Ask trials of an iteration (results should be told with .tell()).
+
+        Args:
+            size (int): the number of trials to ask
+
+        Returns:
+            tuple(list[optuna.trial.Trial], numpy.ndarray):
+                - list[optuna.trial.Trial]: the trials
+                - numpy.ndarray: suggested values of non-dimensional model parameters, shape (size, n_params)
+        """
+        self._stopwatch = StopWatch()
+        trials = [self._study.ask() for _ in range(size)]
+        for trial in (trials if self._worker is not None else []):
+            trial.set_user_attr(self._WORKER, self._worker)
+        params = [[self._suggest(trial)[param] for param in self._model.PARAMETERS] for trial in trials]
+        return (trials, np.array(params, dtype=np.float64).reshape(size, len(self._model.PARAMETERS)))
+
+    def tell(self, trials, scores):
+        """
+        Tell the scores of the trials asked with .ask().
+
+        Args:
+            trials (list[optuna.trial.Trial]): the trials
+            scores (list[float] or numpy.ndarray): the scores of the trials
+
+        Returns:
+            float: the best score after the iteration
+        """
+        for (trial, score) in zip(trials, scores):
+            self._study.tell(trial, float(score))
+        self._scores.append(self._study.best_value)
+        self._runtime += self._stopwatch.stop()
+        return self._scores[-1]
+
+    @property
+    def score_kwargs(self):
+        """
+        dict[str, object]: keyword arguments of ._ParamEstimator._score_params() to calculate scores with the records
+        """
+        return {
+            "model": self._model, "y0": self._y0, "step_n": self._step_n, "method": self._method,
+            "actual": self._actual, "actual_steps": self._actual_steps, "metric": self._metric}
+
+    @staticmethod
+    def _score_params(params, model, y0, step_n, method, actual, actual_steps, metric):
+        """
+        Calculate scores of sets of parameter values with one vectorized simulation.
+
+        Args:
+            params (numpy.ndarray): sets of values of non-dimensional model parameters, shape (N, n_params)
+            model (covsirphy.ModelBase): ODE model
+            y0 (numpy.ndarray): initial values of the variables of the model, shape (n_vars,)
+            step_n (int): the number of steps
+            method (str): integration method, refer to _ODESolver.METHODS
+            actual (numpy.ndarray): records of the variables except for the first variable, shape (n_records, n_vars - 1)
+            actual_steps (numpy.ndarray): time steps of the records
+            metric (str): metric name
+
+        Returns:
+            numpy.ndarray: scores of the sets, shape (N,)
+        """
+        sim_array = _ODESolver.run_batch(model, params, np.tile(y0, (len(params), 1)), step_n=step_n, method=method)
+        return Evaluator.score_array(actual, sim_array[:, actual_steps, 1:], metric=metric)
+
+    def next_size(self, check_dict, batch_size):
+        """
+        Return the number of trials of the next iteration.
+
+        Args:
+            check_dict (dict[str, object]): setting of validation, refer to ._ParamEstimator.run()
+            batch_size (int): the number of trials in one iteration
+
+        Returns:
+            int: @batch_size or the remaining number of trials when smaller
+        """
+        n_trials = Validator(check_dict.get("n_trials"), "n_trials").int(value_range=(1, None), default=None)
+        return batch_size if n_trials is None else max(min(batch_size, n_trials - self.trial_n), 0)
+
+    def is_finished(self, check_dict):
+        """
+        Return whether optimization should be stopped with the convergence, the trial budget or runtime.
+
+        Args:
+            check_dict (dict[str, object]): setting of validation, refer to ._ParamEstimator.run()
+
+        Returns:
+            bool: True when the score converged, the number of trials reached n_trials or runtime exceeded timeout (n_trials is None)
+        """
+        tolerance = Validator(check_dict.get("tolerance", 0), "tolerance").float(value_range=(0, None))
+        if self.is_converged(check_dict["tail_n"], tolerance, check_dict["allowance"]):
+            return True
+        n_trials = Validator(check_dict.get("n_trials"), "n_trials").int(value_range=(1, None), default=None)
+        if n_trials is None:
+            return self._runtime >= check_dict["timeout"]
+        return self.trial_n >= n_trials
+
+    def is_converged(self, tail_n, tolerance, allowance):
+        """
+        Return whether the score converged or not with the results of iterations.
+
+        Args:
+            tail_n (int): the number of iterations to decide whether score did not change for the last iterations
+            tolerance (float): relative improvement of the score to regard as converged over the last @tail_n iterations
+            allowance (tuple(float, float)): the allowance of the max predicted values
+
+        Returns:
+            bool: True when score did not improve more than the tolerance in the last iterations or the max values are in the allowance
+        """
+        scores = self._scores
+        if len(scores) >= tail_n and abs(scores[-tail_n] - scores[-1]) <= tolerance * abs(scores[-tail_n]):
+            return True
+        return self.is_in_allowance(allowance, **self._study.best_params)
+
+    @property
+    def scores(self):
+        """
+        list[float]: the best scores after the iterations
+        """
+        return self._scores[:]
+
+    @property
+    def trial_n(self):
+        """
+        int: the number of trials of the study, not including trials which were running when the last process stopped
+        """
+        return len([trial for trial in self._study.get_trials(deepcopy=False) if not trial.user_attrs.get(self._STALE)])
+
+    @property
+    def runtime(self):
+        """
+        float: total runtime of the iterations [sec]
+        """
+        return self._runtime
+
+    def result(self):
+        """
+        Return the result of optimization.
+
+        Returns:
+            dict(str, object): refer to ._ParamEstimator.run()
+        """
+        param_dict = self._study.best_params.copy()
         model_instance = self._model(self._population, **param_dict)
         return {
             self.RT: model_instance.calc_r0(),
             **param_dict.copy(),
             **model_instance.calc_days_dict(self._tau),
-            self._metric: self._score(**param_dict),
-            self.TRIALS: len(study.trials),
-            self.RUNTIME: stopwatch.stop_show(),
+            self._metric: self._study.best_value,
+            self.TRIALS: self.trial_n,
+            self.RUNTIME: StopWatch.show(self._runtime),
         }
 
-    def init_study(self, pruner, **kwargs):
+    def _extend(self, priors):
+        """
+        Extend the parameter range to include the prior values.
+
+        Args:
+            priors (list[dict[str, float]]): values of non-dimensional model parameters
+        """
+        for (param, (low, high)) in self._range_dict.items():
+            values = np.array([prior_dict[param] for prior_dict in priors], dtype=np.float64)
+            self._range_dict[param] = (float(np.fmin(low, values.min())), float(np.fmax(high, values.max())))
+
+    def _narrow(self, center, margin):
+        """
+        Narrow the parameter range around the values (refer to ._ParamEstimator.run()).
+
+        Args:
+            center (dict[str, float]): values of non-dimensional model parameters
+            margin (float): relative margin of the range around the values
+        """
+        margin = Validator(margin, "margin").float(value_range=(0, 1))
+        for (param, (low, high)) in self._range_dict.items():
+            value = float(center[param])
+            if value <= 0:
+                continue
+            center_low, center_high = max(value * (1 - margin), 0), min(value * (1 + margin), max(value, 1))
+            # Use the overlap with the range cut with quantiles, or the range around the values when they do not overlap
+            overlapped = max(low, center_low) <= min(high, center_high)
+            self._range_dict[param] = (
+                float(max(low, center_low) if overlapped else center_low), float(min(high, center_high) if overlapped else center_high))
+
+    def init_study(self, pruner, storage=None, study_name=None, shared=False, **kwargs):
         """
         Initialize Optuna study.
 
         Args:
             pruner (str): Hyperband, Median, Threshold or Percentile
+            storage (str or None): database URL of Optuna storage (e.g. "sqlite:///estimation.db") or None (in-memory)
+            study_name (str or None): name of the study, the existing study with the name in the storage will be loaded
+            shared (bool): whether the study is used by the other workers at the same time (running trials are not stale) or not
             kwargs: keyword arguments of pruners and TPESampler
 
         Returns:
@@ -135,8 +387,18 @@ class _ParamEstimator(Term):
         v = Validator(kwargs, "keyword arguments")
         pruner_class = self.PRUNER_DICT.get(pruner.lower(), optuna.pruners.ThresholdPruner)
         pruner = pruner_class(**v.kwargs(functions=pruner_class, default=None))
-        sampler = TPESampler(**v.kwargs(functions=TPESampler, default=None))
-        return optuna.create_study(direction="minimize", sampler=sampler, pruner=pruner)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=ExperimentalWarning)
+            sampler = TPESampler(**v.kwargs(functions=TPESampler, default=None))
+        if storage is None:
+            return optuna.create_study(direction="minimize", sampler=sampler, pruner=pruner)
+        study = optuna.create_study(
+            storage=str(storage), study_name=study_name, direction="minimize", sampler=sampler, pruner=pruner, load_if_exists=True)
+        # Trials left running by stopped processes
+        for trial in (study.get_trials(deepcopy=False, states=(TrialState.RUNNING,)) if not shared else []):
+            study._storage.set_trial_user_attr(trial._trial_id, self._STALE, True)
+            study._storage.set_trial_state(trial._trial_id, TrialState.FAIL)
+        return study
 
     def objective(self, trial):
         """
@@ -149,13 +411,25 @@ class _ParamEstimator(Term):
         Returns:
             float: score
         """
+        return self._score(**self._suggest(trial))
+
+    def _suggest(self, trial):
+        """
+        Suggest parameter values with a trial.
+
+        Args:
+            trial (optuna.trial): a trial of the study
+
+        Returns:
+            dict[str, float]: values of non-dimensional model parameters
+        """
         param_dict = {}
         for (k, v) in self._range_dict.items():
             try:
                 param_dict[k] = trial.suggest_uniform(k, *v)
             except OverflowError:
                 param_dict[k] = trial.suggest_uniform(k, 0, 1)
-        return self._score(**param_dict)
+        return param_dict
 
     def _score(self, **kwargs):
         """
@@ -169,14 +443,33 @@ class _ParamEstimator(Term):
             float: score
         """
         # Simulate with applied parameter values
-        solver = _ODESolver(model=self._model, **kwargs)
-        sim_df = solver.run(step_n=self._step_n, **self._y0_dict)
+        sim_array = self._simulate(**kwargs)
         # The first variable (Susceptible) will be ignored in score calculation
-        taufree_df = self._taufree_df.loc[:, self._taufree_df.columns[1:]]
-        sim_df = sim_df.loc[:, sim_df.columns[1:]]
-        # Calculate score
-        evaluator = Evaluator(taufree_df, sim_df, how="inner", on=None)
-        return evaluator.score(metric=self._metric)
+        return Evaluator.score_array(self._actual, sim_array[self._actual_steps, 1:], metric=self._metric)
+
+    def _simulate(self, **kwargs):
+        """
+        Perform simulation with the initial values of the records, without conversion to a dataframe.
+
+        Args:
+            kwargs: values of non-dimensional model parameters, including rho and sigma
+
+        Returns:
+            numpy.ndarray: simulated values (float) of the variables of the model, shape (step_n + 1, n_vars), read-only when cached
+
+        Note:
+            Results will be saved in covsirphy.SimulationCache.shared() when it is enabled.
+        """
+        params = [kwargs[param] for param in self._model.PARAMETERS]
+        cache = SimulationCache.shared()
+        if not cache.enabled:
+            return _ODESolver.run_array(self._model, params, self._y0, step_n=self._step_n, method=self._method)
+        key = cache.key(self._model, params, self._y0, self._step_n, method=self._method)
+        sim_array = cache.get(key)
+        if sim_array is None:
+            sim_array = cache.put(key, _ODESolver.run_array(
+                self._model, params, self._y0, step_n=self._step_n, method=self._method))
+        return sim_array
 
     def is_in_allowance(self, allowance, **kwargs):
         """
@@ -190,9 +483,7 @@ class _ParamEstimator(Term):
             (bool): True when all max values of predicted values are in allowance
         """
         # Get max values with estimated parameter values
-        solver = _ODESolver(model=self._model, **kwargs)
-        sim_df = solver.run(step_n=self._step_n, **self._y0_dict)
-        sim_max_dict = {v: sim_df[v].max() for v in self._model.VARIABLES}
+        sim_max_dict = dict(zip(self._model.VARIABLES, self._simulate(**kwargs).round().max(axis=0)))
         # Check all max values are in allowance
         allowance0, allowance1 = allowance
         ok_list = [
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class _QuantileSketch(object):
+    """
+    Streaming quantile estimation of non-negative values with fixed-width histograms on log1p scale.
+
+    Args:
+        shape (tuple(int)): shape of one observation, e.g. (the number of dates, the number of variables)
+        upper (float): the max value of observations (e.g. total population), larger values will be counted in the last bin
+        bins (int): the number of bins for each element
+
+    Note:
+        Memory usage does not depend on the number of observations, prod(@shape) * @bins integers.
+        Quantiles will be linearly interpolated within bins on log1p scale,
+        and the relative error is smaller than the bin width, log1p(@upper) / @bins.
+    """
+
+    def __init__(self, shape, upper, bins=1024):
+        self._shape = tuple(shape)
+        self._cell_n = int(np.prod(self._shape))
+        self._bins = bins
+        self._width = np.log1p(max(upper, 1)) / bins
+        self._counts = np.zeros(self._cell_n * bins, dtype=np.int64)
+        self._n = 0
+
+    @property
+    def n(self):
+        """
+        int: the number of observations
+        """
+        return self._n
+
+    def update(self, values):
+        """
+        Add observations.
+
+        Args:
+            values (numpy.ndarray): observations, shape (N, *shape)
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, self._cell_n)
+        bin_idx = np.minimum(np.log1p(np.maximum(values, 0)) / self._width, self._bins - 1).astype(np.int64)
+        bin_idx += np.arange(self._cell_n) * self._bins
+        self._counts += np.bincount(bin_idx.ravel(), minlength=self._counts.size)
+        self._n += len(values)
+
+    def quantiles(self, q):
+        """
+        Return the quantiles of the observations.
+
+        Args:
+            q (list[float]): quantiles in [0, 1]
+
+        Returns:
+            numpy.ndarray: shape (len(q), *shape)
+        """
+        counts = self._counts.reshape(self._cell_n, self._bins)
+        cum = np.cumsum(counts, axis=1)
+        results = []
+        for value in q:
+            target = value * self._n
+            # Index of the bin which includes the quantile and the number of observations in the previous bins
+            idx = np.minimum((cum < target).sum(axis=1), self._bins - 1)
+            rows = np.arange(self._cell_n)
+            before = np.where(idx > 0, cum[rows, idx - 1], 0)
+            inside = counts[rows, idx]
+            ratio = np.divide(target - before, inside, out=np.zeros(self._cell_n), where=inside > 0)
+            results.append(np.expm1((idx + np.clip(ratio, 0, 1)) * self._width))
+        return np.array(results).reshape(len(q), *self._shape)
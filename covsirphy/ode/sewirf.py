@@ -33,6 +33,10 @@ class SEWIRF(ModelBase):
     WEIGHTS = np.array([0, 10, 10, 2, 0, 0])
     # Variables that increases monotonically
     VARS_INCREASE = [ModelBase.R, ModelBase.F]
+    # Transitions between variables (source, destination) for stochastic simulation
+    TRANSITIONS = [
+        (ModelBase.S, ModelBase.E), (ModelBase.E, ModelBase.W), (ModelBase.W, ModelBase.CI), (ModelBase.W, ModelBase.F),
+        (ModelBase.CI, ModelBase.R), (ModelBase.CI, ModelBase.F)]
     # Example set of parameters and initial values
     EXAMPLE = {
         ModelBase.STEP_N: 180,
@@ -75,63 +79,180 @@ class SEWIRF(ModelBase):
             "sigma": sigma
         }
 
-    def __call__(self, t, X):
+    def __call__(self, t, X, out=None):
         """
         Return the list of dS/dt (tau-free) etc.
 
         Args:
             t (int): time steps
             X (numpy.array): values of th model variables
+            out (numpy.ndarray or None): array to save the results in or None (create new one)
 
         Returns:
             (np.array)
         """
-        n = self.population
-        s, i, *_, e, w = X
-        beta_swi = self.rho1 * s * (w + i) / n
-        dsdt = 0 - beta_swi
-        dedt = beta_swi - self.rho2 * e
-        dwdt = self.rho2 * e - self.rho3 * w
-        drdt = self.sigma * i
-        dfdt = self.kappa * i + self.theta * self.rho3 * w
-        didt = 0 - dsdt - drdt - dfdt - dedt - dwdt
-        return np.array([dsdt, didt, drdt, dfdt, dedt, dwdt])
+        params = [self.theta, self.kappa, self.rho1, self.rho2, self.rho3, self.sigma]
+        return self._dydt(X, params, self.population, out=out)
 
-    def calc_r0(self):
+    @classmethod
+    def _dydt(cls, X, params, population, out=None):
+        """
+        Return the list of dS/dt (tau-free) etc. with arrays of variables and parameter values.
+
+        Args:
+            X (numpy.ndarray): values of the model variables ordered as cls.VARIABLES, shape (6,) or (6, N)
+            params (numpy.ndarray): values of theta, kappa, rho1, rho2, rho3 and sigma, shape (6,) or (6, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+            out (numpy.ndarray or None): array to save the results in (with the same shape as @X) or None (create new one)
+
+        Returns:
+            numpy.ndarray: shape (6,) or (6, N)
+        """
+        s, e, w, i, *_ = X
+        theta, kappa, rho1, rho2, rho3, sigma = params
+        out = np.empty(np.shape(X)) if out is None else out
+        out[0] = 0 - rho1 * s * (w + i) / population
+        out[1] = 0 - out[0] - rho2 * e
+        out[2] = rho2 * e - rho3 * w
+        out[4] = sigma * i
+        out[5] = kappa * i + theta * rho3 * w
+        out[3] = 0 - out[0] - out[4] - out[5] - out[1] - out[2]
+        return out
+
+    @classmethod
+    def _jacobian(cls, X, params, population):
+        """
+        Return the Jacobian matrix of the right-hand side with arrays of variables and parameter values.
+
+        Args:
+            X (numpy.ndarray): values of the model variables ordered as cls.VARIABLES, shape (6,) or (6, N)
+            params (numpy.ndarray): values of theta, kappa, rho1, rho2, rho3 and sigma, shape (6,) or (6, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+
+        Returns:
+            numpy.ndarray: d(dX/dt)/dX, shape (6, 6) or (6, 6, N)
+        """
+        s, e, w, i, *_ = X
+        theta, kappa, rho1, rho2, rho3, sigma = params
+        jac = np.zeros((6, *np.shape(X)))
+        # Susceptible
+        jac[0, 0] = 0 - rho1 * (w + i) / population
+        jac[0, 2] = 0 - rho1 * s / population
+        jac[0, 3] = jac[0, 2]
+        # Exposed
+        jac[1, 0], jac[1, 2], jac[1, 3] = 0 - jac[0, 0], 0 - jac[0, 2], 0 - jac[0, 3]
+        jac[1, 1] = 0 - rho2
+        # Waiting
+        jac[2, 1] = rho2
+        jac[2, 2] = 0 - rho3
+        # Infected
+        jac[3, 2] = (1 - theta) * rho3
+        jac[3, 3] = 0 - sigma - kappa
+        # Recovered
+        jac[4, 3] = sigma
+        # Fatal
+        jac[5, 2] = theta * rho3
+        jac[5, 3] = kappa
+        return jac
+
+    @classmethod
+    def _param_jacobian(cls, X, params, population):
+        """
+        Return the partial derivatives of the right-hand side with respect to the parameters.
+
+        Args:
+            X (numpy.ndarray): values of the model variables ordered as cls.VARIABLES, shape (6,) or (6, N)
+            params (numpy.ndarray): values of theta, kappa, rho1, rho2, rho3 and sigma, shape (6,) or (6, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+
+        Returns:
+            numpy.ndarray: d(dX/dt)/dp, shape (6, 6) or (6, 6, N)
+        """
+        s, e, w, i, *_ = X
+        theta, _, _, _, rho3, _ = params
+        pjac = np.zeros((6, 6, *np.shape(X)[1:]))
+        # theta
+        pjac[5, 0] = rho3 * w
+        # kappa
+        pjac[5, 1] = i
+        # rho1
+        pjac[0, 2] = 0 - s * (w + i) / population
+        pjac[1, 2] = 0 - pjac[0, 2]
+        # rho2
+        pjac[1, 3] = 0 - e
+        pjac[2, 3] = e
+        # rho3
+        pjac[2, 4] = 0 - w
+        pjac[5, 4] = theta * w
+        # sigma
+        pjac[4, 5] = i
+        # Infected
+        pjac[3] = 0 - pjac[0] - pjac[1] - pjac[2] - pjac[4] - pjac[5]
+        return pjac
+
+    @classmethod
+    def _transition_rates(cls, X, params, population):
         """
-        Calculate (basic) reproduction number.
+        Return per-capita rates of the transitions between variables (cls.TRANSITIONS).
+
+        Args:
+            X (numpy.ndarray): values of the model variables, shape (6,) or (6, N)
+            params (numpy.ndarray): values of theta, kappa, rho1, rho2, rho3 and sigma, shape (6,) or (6, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
 
         Returns:
-            float
+            numpy.ndarray: shape (6,) or (6, N)
+
+        Note:
+            Waiting cases which will die immediately (ratio: theta) move from Waiting to Fatal directly.
         """
-        try:
-            rho = self.rho1 / self.rho2 * self.rho3
-            rt = rho * (1 - self.theta) / (self.sigma + self.kappa)
-        except ZeroDivisionError:
-            return None
-        return round(rt, 2)
+        _, _, w, i, *_ = X
+        theta, kappa, rho1, rho2, rho3, sigma = params
+        ones = np.ones(np.shape(i))
+        return np.array([
+            rho1 * (w + i) / population, rho2 * ones, (1 - theta) * rho3 * ones, theta * rho3 * ones, sigma * ones, kappa * ones])
 
-    def calc_days_dict(self, tau):
+    @classmethod
+    def calc_r0_array(cls, params):
         """
-        Calculate 1/beta [day] etc.
+        Calculate (basic) reproduction numbers with arrays of parameter values.
 
         Args:
-            param tau (int): tau value [min]
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values, columns (keys) are theta, kappa, rho1, rho2, rho3, sigma
 
         Returns:
-            dict[str, int]
-        """
-        try:
-            return {
-                "alpha1 [-]": round(self.theta, 3),
-                "1/alpha2 [day]": int(tau / 24 / 60 / self.kappa),
-                "1/beta1 [day]": int(tau / 24 / 60 / self.rho1),
-                "1/beta2 [day]": int(tau / 24 / 60 / self.rho2),
-                "1/beta3 [day]": int(tau / 24 / 60 / self.rho3),
-                "1/gamma [day]": int(tau / 24 / 60 / self.sigma)
-            }
-        except (ZeroDivisionError, ValueError):
-            return {p: None for p in self.DAY_PARAMETERS}
+            numpy.ndarray: reproduction numbers (rounded to 2 decimal places), numpy.nan when un-defined
+        """
+        theta, kappa, rho1, rho2, rho3, sigma = cls._param_arrays(params, cls.PARAMETERS)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rt = rho1 / rho2 * rho3 * (1 - theta) / (sigma + kappa)
+        return np.round(np.where(np.isfinite(rt), rt, np.nan), 2)
+
+    @classmethod
+    def calc_days_array(cls, params, tau):
+        """
+        Calculate 1/beta [day] etc. with arrays of parameter values.
+
+        Args:
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values, columns (keys) are theta, kappa, rho1, rho2, rho3, sigma
+            tau (int): tau value [min]
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    index of @params (when dataframe) or reset index
+                Columns
+                    alpha1 [-], 1/alpha2 [day], 1/beta1 [day], 1/beta2 [day], 1/beta3 [day], 1/gamma [day] (int or float), NA when un-defined
+        """
+        theta, kappa, rho1, rho2, rho3, sigma = cls._param_arrays(params, cls.PARAMETERS)
+        return cls._days_dataframe(params, {
+            "alpha1 [-]": np.round(theta, 3),
+            "1/alpha2 [day]": cls._rate_to_days(kappa, tau),
+            "1/beta1 [day]": cls._rate_to_days(rho1, tau),
+            "1/beta2 [day]": cls._rate_to_days(rho2, tau),
+            "1/beta3 [day]": cls._rate_to_days(rho3, tau),
+            "1/gamma [day]": cls._rate_to_days(sigma, tau),
+        })
 
     @classmethod
     def convert(cls, data, tau):
@@ -31,6 +31,8 @@ class SIR(ModelBase):
     WEIGHTS = np.array([1, 1, 1])
     # Variables that increases monotonically
     VARS_INCREASE = [ModelBase.FR]
+    # Transitions between variables (source, destination) for stochastic simulation
+    TRANSITIONS = [(ModelBase.S, ModelBase.CI), (ModelBase.CI, ModelBase.FR)]
     # Example set of parameters and initial values
     EXAMPLE = {
         ModelBase.STEP_N: 180,
@@ -51,54 +53,142 @@ class SIR(ModelBase):
         self.sigma = sigma
         self.non_param_dict = {"rho": rho, "sigma": sigma}
 
-    def __call__(self, t, X):
+    def __call__(self, t, X, out=None):
         """
         Return the list of dS/dt (tau-free) etc.
 
         Args:
             t (int): time steps
             X (numpy.array): values of th model variables
+            out (numpy.ndarray or None): array to save the results in or None (create new one)
 
         Returns:
             (np.array)
         """
-        n = self.population
+        return self._dydt(X, [self.rho, self.sigma], self.population, out=out)
+
+    @classmethod
+    def _dydt(cls, X, params, population, out=None):
+        """
+        Return the list of dS/dt (tau-free) etc. with arrays of variables and parameter values.
+
+        Args:
+            X (numpy.ndarray): values of the model variables, shape (3,) or (3, N)
+            params (numpy.ndarray): values of rho and sigma, shape (2,) or (2, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+            out (numpy.ndarray or None): array to save the results in (with the same shape as @X) or None (create new one)
+
+        Returns:
+            numpy.ndarray: shape (3,) or (3, N)
+        """
+        s, i, *_ = X
+        rho, sigma = params
+        out = np.empty(np.shape(X)) if out is None else out
+        out[0] = 0 - rho * s * i / population
+        out[2] = sigma * i
+        out[1] = 0 - out[0] - out[2]
+        return out
+
+    @classmethod
+    def _jacobian(cls, X, params, population):
+        """
+        Return the Jacobian matrix of the right-hand side with arrays of variables and parameter values.
+
+        Args:
+            X (numpy.ndarray): values of the model variables, shape (3,) or (3, N)
+            params (numpy.ndarray): values of rho and sigma, shape (2,) or (2, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+
+        Returns:
+            numpy.ndarray: d(dX/dt)/dX, shape (3, 3) or (3, 3, N)
+        """
         s, i, *_ = X
-        dsdt = 0 - self.rho * s * i / n
-        drdt = self.sigma * i
-        didt = 0 - dsdt - drdt
-        return np.array([dsdt, didt, drdt])
+        rho, sigma = params
+        jac = np.zeros((3, *np.shape(X)))
+        jac[0, 0] = 0 - rho * i / population
+        jac[0, 1] = 0 - rho * s / population
+        jac[1, 0] = 0 - jac[0, 0]
+        jac[1, 1] = 0 - jac[0, 1] - sigma
+        jac[2, 1] = sigma
+        return jac
 
-    def calc_r0(self):
+    @classmethod
+    def _param_jacobian(cls, X, params, population):
         """
-        Calculate (basic) reproduction number.
+        Return the partial derivatives of the right-hand side with respect to the parameters.
+
+        Args:
+            X (numpy.ndarray): values of the model variables, shape (3,) or (3, N)
+            params (numpy.ndarray): values of rho and sigma, shape (2,) or (2, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
 
         Returns:
-            float
+            numpy.ndarray: d(dX/dt)/dp, shape (3, 2) or (3, 2, N)
         """
-        try:
-            rt = self.rho / self.sigma
-        except ZeroDivisionError:
-            return None
-        return round(rt, 2)
+        s, i, *_ = X
+        pjac = np.zeros((3, 2, *np.shape(X)[1:]))
+        # rho
+        pjac[0, 0] = 0 - s * i / population
+        pjac[1, 0] = 0 - pjac[0, 0]
+        # sigma
+        pjac[2, 1] = i
+        pjac[1, 1] = 0 - i
+        return pjac
 
-    def calc_days_dict(self, tau):
+    @classmethod
+    def _transition_rates(cls, X, params, population):
         """
-        Calculate 1/beta [day] etc.
+        Return per-capita rates of the transitions between variables (cls.TRANSITIONS).
 
         Args:
-            param tau (int): tau value [min]
+            X (numpy.ndarray): values of the model variables, shape (3,) or (3, N)
+            params (numpy.ndarray): values of rho and sigma, shape (2,) or (2, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
 
         Returns:
-            dict[str, int]
-        """
-        try:
-            return {
-                "1/beta [day]": int(tau / 24 / 60 / self.rho),
-                "1/gamma [day]": int(tau / 24 / 60 / self.sigma)
-            }
-        except (ZeroDivisionError, ValueError):
-            return {p: None for p in self.DAY_PARAMETERS}
+            numpy.ndarray: shape (2,) or (2, N)
+        """
+        _, i, *_ = X
+        rho, sigma = params
+        return np.array([rho * i / population, sigma * np.ones(np.shape(i))])
+
+    @classmethod
+    def calc_r0_array(cls, params):
+        """
+        Calculate (basic) reproduction numbers with arrays of parameter values.
+
+        Args:
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values, columns (keys) are rho, sigma
+
+        Returns:
+            numpy.ndarray: reproduction numbers (rounded to 2 decimal places), numpy.nan when un-defined
+        """
+        rho, sigma = cls._param_arrays(params, cls.PARAMETERS)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rt = rho / sigma
+        return np.round(np.where(np.isfinite(rt), rt, np.nan), 2)
+
+    @classmethod
+    def calc_days_array(cls, params, tau):
+        """
+        Calculate 1/beta [day] etc. with arrays of parameter values.
+
+        Args:
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values, columns (keys) are rho, sigma
+            tau (int): tau value [min]
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    index of @params (when dataframe) or reset index
+                Columns
+                    1/beta [day], 1/gamma [day] (int or float), NA when un-defined
+        """
+        rho, sigma = cls._param_arrays(params, cls.PARAMETERS)
+        return cls._days_dataframe(params, {
+            "1/beta [day]": cls._rate_to_days(rho, tau),
+            "1/gamma [day]": cls._rate_to_days(sigma, tau),
+        })
 
     @classmethod
     def convert(cls, data, tau):
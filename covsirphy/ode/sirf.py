@@ -37,6 +37,9 @@ class SIRF(ModelBase):
     WEIGHTS = np.array([0, 1, 1, 1])
     # Variables that increases monotonically
     VARS_INCREASE = [ModelBase.R, ModelBase.F]
+    # Transitions between variables (source, destination) for stochastic simulation
+    TRANSITIONS = [
+        (ModelBase.S, ModelBase.CI), (ModelBase.S, ModelBase.F), (ModelBase.CI, ModelBase.R), (ModelBase.CI, ModelBase.F)]
     # Example set of parameters and initial values
     EXAMPLE = {
         ModelBase.STEP_N: 180,
@@ -60,57 +63,158 @@ class SIRF(ModelBase):
         self.non_param_dict = {
             "theta": theta, "kappa": kappa, "rho": rho, "sigma": sigma}
 
-    def __call__(self, t, X):
+    def __call__(self, t, X, out=None):
         """
         Return the list of dS/dt (tau-free) etc.
 
         Args:
             t (int): time steps
             X (numpy.array): values of th model variables
+            out (numpy.ndarray or None): array to save the results in or None (create new one)
 
         Returns:
             (np.array)
         """
-        n = self.population
+        return self._dydt(X, [self.theta, self.kappa, self.rho, self.sigma], self.population, out=out)
+
+    @classmethod
+    def _dydt(cls, X, params, population, out=None):
+        """
+        Return the list of dS/dt (tau-free) etc. with arrays of variables and parameter values.
+
+        Args:
+            X (numpy.ndarray): values of the model variables, shape (4,) or (4, N)
+            params (numpy.ndarray): values of theta, kappa, rho and sigma, shape (4,) or (4, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+            out (numpy.ndarray or None): array to save the results in (with the same shape as @X) or None (create new one)
+
+        Returns:
+            numpy.ndarray: shape (4,) or (4, N)
+        """
         s, i, *_ = X
-        dsdt = 0 - self.rho * s * i / n
-        drdt = self.sigma * i
-        dfdt = self.kappa * i + (0 - dsdt) * self.theta
-        didt = 0 - dsdt - drdt - dfdt
-        return np.array([dsdt, didt, drdt, dfdt])
+        theta, kappa, rho, sigma = params
+        out = np.empty(np.shape(X)) if out is None else out
+        out[0] = 0 - rho * s * i / population
+        out[2] = sigma * i
+        out[3] = kappa * i + (0 - out[0]) * theta
+        out[1] = 0 - out[0] - out[2] - out[3]
+        return out
 
-    def calc_r0(self):
+    @classmethod
+    def _jacobian(cls, X, params, population):
         """
-        Calculate (basic) reproduction number.
+        Return the Jacobian matrix of the right-hand side with arrays of variables and parameter values.
+
+        Args:
+            X (numpy.ndarray): values of the model variables, shape (4,) or (4, N)
+            params (numpy.ndarray): values of theta, kappa, rho and sigma, shape (4,) or (4, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
 
         Returns:
-            float
+            numpy.ndarray: d(dX/dt)/dX, shape (4, 4) or (4, 4, N)
         """
-        try:
-            rt = self.rho * (1 - self.theta) / (self.sigma + self.kappa)
-        except ZeroDivisionError:
-            return None
-        return round(rt, 2)
+        s, i, *_ = X
+        theta, kappa, rho, sigma = params
+        jac = np.zeros((4, *np.shape(X)))
+        jac[0, 0] = 0 - rho * i / population
+        jac[0, 1] = 0 - rho * s / population
+        jac[3, 0] = 0 - jac[0, 0] * theta
+        jac[3, 1] = kappa - jac[0, 1] * theta
+        jac[2, 1] = sigma
+        jac[1, 0] = 0 - jac[0, 0] - jac[3, 0]
+        jac[1, 1] = 0 - jac[0, 1] - sigma - jac[3, 1]
+        return jac
 
-    def calc_days_dict(self, tau):
+    @classmethod
+    def _param_jacobian(cls, X, params, population):
         """
-        Calculate 1/beta [day] etc.
+        Return the partial derivatives of the right-hand side with respect to the parameters.
 
         Args:
-            param tau (int): tau value [min]
+            X (numpy.ndarray): values of the model variables, shape (4,) or (4, N)
+            params (numpy.ndarray): values of theta, kappa, rho and sigma, shape (4,) or (4, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
 
         Returns:
-            dict[str, int]
-        """
-        try:
-            return {
-                "alpha1 [-]": round(self.theta, 3),
-                "1/alpha2 [day]": int(tau / 24 / 60 / self.kappa),
-                "1/beta [day]": int(tau / 24 / 60 / self.rho),
-                "1/gamma [day]": int(tau / 24 / 60 / self.sigma)
-            }
-        except (ZeroDivisionError, ValueError):
-            return {p: None for p in self.DAY_PARAMETERS}
+            numpy.ndarray: d(dX/dt)/dp, shape (4, 4) or (4, 4, N)
+        """
+        s, i, *_ = X
+        theta, _, rho, _ = params
+        pjac = np.zeros((4, 4, *np.shape(X)[1:]))
+        # theta
+        pjac[3, 0] = rho * s * i / population
+        # kappa
+        pjac[3, 1] = i
+        # rho
+        pjac[0, 2] = 0 - s * i / population
+        pjac[3, 2] = 0 - pjac[0, 2] * theta
+        # sigma
+        pjac[2, 3] = i
+        # Infected
+        pjac[1] = 0 - pjac[0] - pjac[2] - pjac[3]
+        return pjac
+
+    @classmethod
+    def _transition_rates(cls, X, params, population):
+        """
+        Return per-capita rates of the transitions between variables (cls.TRANSITIONS).
+
+        Args:
+            X (numpy.ndarray): values of the model variables, shape (4,) or (4, N)
+            params (numpy.ndarray): values of theta, kappa, rho and sigma, shape (4,) or (4, N)
+            population (float or numpy.ndarray): total population, scalar or shape (N,)
+
+        Returns:
+            numpy.ndarray: shape (4,) or (4, N)
+
+        Note:
+            Infected cases which will die immediately (ratio: theta) move from Susceptible to Fatal directly.
+        """
+        _, i, *_ = X
+        theta, kappa, rho, sigma = params
+        ones = np.ones(np.shape(i))
+        infection = rho * i / population
+        return np.array([(1 - theta) * infection, theta * infection, sigma * ones, kappa * ones])
+
+    @classmethod
+    def calc_r0_array(cls, params):
+        """
+        Calculate (basic) reproduction numbers with arrays of parameter values.
+
+        Args:
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values, columns (keys) are theta, kappa, rho, sigma
+
+        Returns:
+            numpy.ndarray: reproduction numbers (rounded to 2 decimal places), numpy.nan when un-defined
+        """
+        theta, kappa, rho, sigma = cls._param_arrays(params, cls.PARAMETERS)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rt = rho * (1 - theta) / (sigma + kappa)
+        return np.round(np.where(np.isfinite(rt), rt, np.nan), 2)
+
+    @classmethod
+    def calc_days_array(cls, params, tau):
+        """
+        Calculate 1/beta [day] etc. with arrays of parameter values.
+
+        Args:
+            params (pandas.DataFrame or dict[str, numpy.ndarray]): parameter values, columns (keys) are theta, kappa, rho, sigma
+            tau (int): tau value [min]
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    index of @params (when dataframe) or reset index
+                Columns
+                    alpha1 [-], 1/alpha2 [day], 1/beta [day], 1/gamma [day] (int or float), NA when un-defined
+        """
+        theta, kappa, rho, sigma = cls._param_arrays(params, cls.PARAMETERS)
+        return cls._days_dataframe(params, {
+            "alpha1 [-]": np.round(theta, 3),
+            "1/alpha2 [day]": cls._rate_to_days(kappa, tau),
+            "1/beta [day]": cls._rate_to_days(rho, tau),
+            "1/gamma [day]": cls._rate_to_days(sigma, tau),
+        })
 
     @classmethod
     def convert(cls, data, tau):
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from covsirphy.util.validator import Validator
+from covsirphy.util.term import Term
+from covsirphy.ode.mbase import ModelBase
+
+
+class _StochasticSolver(Term):
+    """
+    Stochastic counterpart of _ODESolver, simulating SIR-derived models with binomial chains.
+    """
+
+    @classmethod
+    def run_batch(cls, model, params, y0, step_n, rng, steps=None):
+        """
+        Simulate replicates of a SIR-derived model with binomial chains at once.
+
+        Args:
+            model (covsirphy.ModelBase): SIR-derived model which has .TRANSITIONS and ._transition_rates()
+            params (numpy.ndarray): values of non-dimensional model parameters, shape (n_params,) or (N, n_params)
+            y0 (numpy.ndarray): initial values of dimensional variables (integers), shape (n_vars,) or (N, n_vars)
+            step_n (int): the number of steps
+            rng (numpy.random.Generator): random number generator
+            steps (list[int] or numpy.ndarray or None): sorted time steps to return values at or None (all time steps)
+
+        Raises:
+            ValueError: the shapes of @params and @y0 do not match the model or each other
+
+        Returns:
+            numpy.ndarray: numbers of cases (int64), shape (N, step_n + 1, n_vars) or (N, len(steps), n_vars)
+
+        Note:
+            Parameters and variables must be ordered as model.PARAMETERS and model.VARIABLES.
+            Total value of initial values of each replicate will be regarded as its total population.
+
+        Note:
+            For each time step and source variable, the number of leaving cases follows binomial distribution
+            with probability 1 - exp(-sum of the rates), and they are divided to the destinations with the rates (multinomial distribution).
+            All transitions are calculated with the values at the start of the time step, and the values never be negative.
+        """
+        model = Validator(model, "model").subclass(ModelBase)
+        step_n = Validator(step_n, "number").int(value_range=(1, None))
+        param_array = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        y0_array = np.atleast_2d(np.asarray(y0, dtype=np.int64))
+        if param_array.shape[1] != len(model.PARAMETERS) or y0_array.shape[1] != len(model.VARIABLES):
+            raise ValueError(
+                f"@params and @y0 must have {len(model.PARAMETERS)} and {len(model.VARIABLES)} columns, "
+                f"but arrays with shape {param_array.shape} and {y0_array.shape} were applied.")
+        rep_n = max(len(param_array), len(y0_array))
+        if {len(param_array), len(y0_array)} - {1, rep_n}:
+            raise ValueError(
+                f"@params and @y0 must have the same number of rows, but {len(param_array)} and {len(y0_array)} were applied.")
+        param_t = np.broadcast_to(param_array, (rep_n, param_array.shape[1])).T
+        X = np.broadcast_to(y0_array, (rep_n, y0_array.shape[1])).T.copy()
+        population = X.sum(axis=0).astype(np.float64)
+        # Transitions grouped by the source: {source index: [(transition index, destination index)]}
+        group_dict = {}
+        for (k, (source, destination)) in enumerate(model.TRANSITIONS):
+            group_dict.setdefault(model.VARIABLES.index(source), []).append((k, model.VARIABLES.index(destination)))
+        # Time steps to save
+        steps = np.arange(step_n + 1) if steps is None else np.asarray(steps)
+        y = np.empty((len(steps), *X.shape), dtype=np.int64)
+        i = 0
+        if steps[0] == 0:
+            y[0], i = X, 1
+        flows = np.empty(X.shape, dtype=np.int64)
+        for t in range(steps[-1]):
+            rates = model._transition_rates(X, param_t, population)
+            flows[:] = 0
+            for (source, transitions) in group_dict.items():
+                total_rate = np.maximum(sum(rates[k] for (k, _) in transitions), 0)
+                leaving = rng.binomial(X[source], -np.expm1(-total_rate))
+                flows[source] -= leaving
+                # Divide the leaving cases to the destinations with conditional binomial distributions
+                remaining, remaining_rate = leaving, total_rate
+                for (k, destination) in transitions[:-1]:
+                    rate = np.maximum(rates[k], 0)
+                    prob = np.divide(rate, remaining_rate, out=np.zeros(rep_n), where=remaining_rate > 0)
+                    moved = rng.binomial(remaining, np.clip(prob, 0, 1))
+                    flows[destination] += moved
+                    remaining, remaining_rate = remaining - moved, remaining_rate - rate
+                flows[transitions[-1][1]] += remaining
+            X += flows
+            if steps[i] == t + 1:
+                y[i], i = X, i + 1
+        return y.transpose(2, 0, 1)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from covsirphy.util.error import UnExpectedValueError
+from covsirphy.util.validator import Validator
+from covsirphy.util.term import Term
+
+
+class TrajectoryStore(Term):
+    """
+    Storage of simulated trajectories (int64) on disk as a memory-mapped array, indexed by scenario ID.
+
+    Args:
+        filename (str or pathlib.Path): filename of the array, metadata will be saved as "{filename}.json"
+        mode (str): "r" (read-only), "w" (create or overwrite) or "a" (append to the existing file)
+        dates (list[pandas.Timestamp] or None): dates of the trajectories, required with mode "w"
+        variables (list[str] or None): variables of the trajectories, required with mode "w"
+
+    Note:
+        Trajectories are saved as an array with shape (the number of scenarios, the number of dates, the number of variables).
+        Readers use numpy.memmap and only the selected scenarios will be loaded from disk.
+
+    Note:
+        Metadata will be saved (replaced atomically) after each .write(). When the process was stopped during .write(),
+        the array may include trajectories without IDs at the end. They will be removed with mode "a",
+        and ValueError will be raised with mode "r".
+
+    Examples:
+        >>> import covsirphy as cs
+        >>> with cs.TrajectoryStore("sweep.bin", mode="w", dates=dates, variables=["Infected"]) as store:
+        >>>     store.write(ids=["Japan/0", "Japan/1"], values=values)
+        >>> store = cs.TrajectoryStore("sweep.bin")
+        >>> store.read(ids=["Japan/1"], start_date="01Feb2021", end_date="28Feb2021")
+    """
+    MODES = ["r", "w", "a"]
+
+    def __init__(self, filename, mode="r", dates=None, variables=None):
+        self._filename = Path(filename)
+        self._meta_filename = Path(f"{filename}.json")
+        self._mode = Validator([mode], "mode").sequence(candidates=self.MODES)[0]
+        if self._mode == "w":
+            if dates is None or variables is None:
+                raise ValueError("@dates and @variables must be specified with mode 'w'.")
+            self._dates = pd.DatetimeIndex(pd.to_datetime(list(dates)), name=self.DATE)
+            self._variables = [str(var) for var in variables]
+            self._ids = []
+            self._filename.write_bytes(b"")
+            self._save_metadata()
+        else:
+            with self._meta_filename.open("r") as fh:
+                meta_dict = json.load(fh)
+            self._dates = pd.DatetimeIndex(pd.to_datetime(meta_dict["dates"]), name=self.DATE)
+            self._variables = meta_dict["variables"]
+            self._ids = meta_dict["ids"]
+            self._check_size()
+        self._id_dict = {id_: i for (i, id_) in enumerate(self._ids)}
+        self._array = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def ids(self):
+        """
+        list[str]: scenario IDs
+        """
+        return self._ids[:]
+
+    @property
+    def dates(self):
+        """
+        pandas.DatetimeIndex: dates of the trajectories
+        """
+        return self._dates.copy()
+
+    @property
+    def variables(self):
+        """
+        list[str]: variables of the trajectories
+        """
+        return self._variables[:]
+
+    @property
+    def array(self):
+        """
+        numpy.memmap: read-only array, shape (the number of scenarios, the number of dates, the number of variables)
+        """
+        if self._array is None or len(self._array) != len(self._ids):
+            if not self._ids:
+                return np.empty((0, len(self._dates), len(self._variables)), dtype=np.int64)
+            self._array = np.memmap(
+                self._filename, dtype=np.int64, mode="r", shape=(len(self._ids), len(self._dates), len(self._variables)))
+        return self._array
+
+    def write(self, ids, values):
+        """
+        Append trajectories.
+
+        Args:
+            ids (list[str]): scenario IDs, which must be unique in the storage
+            values (numpy.ndarray): trajectories, shape (len(ids), the number of dates, the number of variables)
+
+        Raises:
+            ValueError: the shape of @values is un-expected or some IDs were already registered
+        """
+        if self._mode == "r":
+            raise ValueError("Trajectories cannot be written with read-only mode (mode='r').")
+        ids = [str(id_) for id_ in ids]
+        values = np.ascontiguousarray(np.round(values), dtype=np.int64)
+        expected_shape = (len(ids), len(self._dates), len(self._variables))
+        if values.shape != expected_shape:
+            raise ValueError(f"@values must have shape {expected_shape}, but an array with shape {values.shape} was applied.")
+        duplicated = set(ids) & self._id_dict.keys() if len(set(ids)) == len(ids) else set(ids)
+        if duplicated:
+            raise ValueError(f"Scenario IDs must be unique, but {sorted(duplicated)[:5]} were applied.")
+        with self._filename.open("ab") as fh:
+            fh.write(values.tobytes())
+        self._id_dict.update({id_: len(self._ids) + i for (i, id_) in enumerate(ids)})
+        self._ids.extend(ids)
+        self._save_metadata()
+
+    def close(self):
+        """
+        Save metadata (with mode "w" and "a") and release the memory-mapped array.
+        """
+        if self._mode != "r":
+            self._save_metadata()
+        self._array = None
+
+    def _save_metadata(self):
+        """
+        Save scenario IDs, dates and variables as a JSON file, replacing the file atomically.
+        """
+        meta_dict = {
+            "ids": self._ids, "dates": self._dates.strftime("%Y-%m-%d").tolist(), "variables": self._variables, "dtype": "int64"}
+        temp_filename = Path(f"{self._meta_filename}.tmp")
+        with temp_filename.open("w") as fh:
+            json.dump(meta_dict, fh)
+        os.replace(temp_filename, self._meta_filename)
+
+    def _check_size(self):
+        """
+        Check the size of the array file is the same as the size of the registered trajectories.
+
+        Raises:
+            ValueError: the file is smaller than expected, or larger than expected with mode "r"
+
+        Note:
+            With mode "a", trajectories without IDs at the end of the file (i.e. stopped during .write()) will be removed.
+        """
+        expected = len(self._ids) * len(self._dates) * len(self._variables) * np.dtype(np.int64).itemsize
+        actual = self._filename.stat().st_size
+        if actual == expected:
+            return
+        if actual > expected and self._mode == "a":
+            os.truncate(self._filename, expected)
+            return
+        raise ValueError(
+            f"The size of {self._filename} ({actual} bytes) does not match the metadata of {len(self._ids)} trajectories ({expected} bytes).")
+
+    def read(self, ids=None, start_date=None, end_date=None, variables=None):
+        """
+        Read a part of the trajectories.
+
+        Args:
+            ids (list[str] or None): scenario IDs or None (all scenarios)
+            start_date (str or pandas.Timestamp or None): the first date or None (the first date of the trajectories)
+            end_date (str or pandas.Timestamp or None): the last date or None (the last date of the trajectories)
+            variables (list[str] or None): variables or None (all variables)
+
+        Raises:
+            UnExpectedValueError: un-registered scenario IDs or variables were applied
+
+        Returns:
+            pandas.DataFrame:
+                Index
+                    reset index
+                Columns
+                    - ID (str): scenario IDs
+                    - Date (pandas.Timestamp): observation dates
+                    - columns specified with @variables (int)
+        """
+        ids = self._ids if ids is None else [str(id_) for id_ in ids]
+        for id_ in ids:
+            if id_ not in self._id_dict:
+                raise UnExpectedValueError("ids", id_, candidates=self._ids[:5] + ["..."])
+        variables = Validator(variables, "variables").sequence(default=self._variables, candidates=self._variables)
+        values = self.select(ids=ids, start_date=start_date, end_date=end_date, variables=variables)
+        dates = self._dates[self._date_slice(start_date, end_date)]
+        df = pd.DataFrame(values.reshape(-1, len(variables)), columns=variables)
+        df.insert(0, self.DATE, np.tile(dates, len(ids)))
+        df.insert(0, self.ID, np.repeat(ids, len(dates)))
+        return df
+
+    def select(self, ids=None, start_date=None, end_date=None, variables=None):
+        """
+        Read a part of the trajectories as an array.
+
+        Args:
+            ids (list[str] or None): scenario IDs or None (all scenarios)
+            start_date (str or pandas.Timestamp or None): the first date or None (the first date of the trajectories)
+            end_date (str or pandas.Timestamp or None): the last date or None (the last date of the trajectories)
+            variables (list[str] or None): variables or None (all variables)
+
+        Returns:
+            numpy.ndarray: shape (len(ids), the number of dates, len(variables))
+        """
+        rows = slice(None) if ids is None else [self._id_dict[str(id_)] for id_ in ids]
+        cols = slice(None) if variables is None else [self._variables.index(var) for var in variables]
+        subset = self.array[rows, self._date_slice(start_date, end_date)]
+        return np.array(subset[:, :, cols])
+
+    def _date_slice(self, start_date, end_date):
+        """
+        Return the slice of dates.
+
+        Args:
+            start_date (str or pandas.Timestamp or None): the first date or None (the first date of the trajectories)
+            end_date (str or pandas.Timestamp or None): the last date or None (the last date of the trajectories)
+
+        Returns:
+            slice: slice of the dates
+        """
+        start = 0 if start_date is None else self._dates.searchsorted(Validator(start_date, "start_date").date(), side="left")
+        end = len(self._dates) if end_date is None else self._dates.searchsorted(Validator(end_date, "end_date").date(), side="right")
+        return slice(start, end)
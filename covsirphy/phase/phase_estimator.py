@@ -2,9 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import functools
-from multiprocessing import cpu_count, Pool
 import pandas as pd
 from covsirphy.util.error import deprecate
+from covsirphy.util.executor import ParallelExecutor
 from covsirphy.util.stopwatch import StopWatch
 from covsirphy.util.validator import Validator
 from covsirphy.util.term import Term
@@ -177,21 +177,25 @@ class MPEstimator(Term):
         print(f"\t{unit}: finished {trials:>4} trials in {runtime}")
         return unit
 
-    def run(self, n_jobs=-1, **kwargs):
+    def run(self, n_jobs=-1, executor=None, **kwargs):
         """
         Run estimation.
 
         Args:
             n_jobs (int): the number of parallel jobs or -1 (CPU count)
+            executor (covsirphy.ParallelExecutor or None): executor to keep alive across calls or None (use @n_jobs)
             kwargs: keyword arguments of model parameters and covsirphy.Estimator.run()
 
         Returns:
             list[covsirphy.PhaseUnit]
         """
+        # Executor of parallel jobs
+        if executor is None:
+            with ParallelExecutor(n_jobs=n_jobs) as temp_executor:
+                return self.run(executor=temp_executor, **kwargs)
+        n_jobs = Validator(executor, "executor").instance(ParallelExecutor).n_jobs
         units = self._units[:]
         results = []
-        # The number of parallel jobs
-        n_jobs = cpu_count() if n_jobs == -1 else n_jobs
         # Start optimization
         print(f"\n<{self.model.NAME} model: parameter estimation>")
         print(f"Running optimization with {n_jobs} CPUs...")
@@ -204,12 +208,7 @@ class MPEstimator(Term):
             results = [unit_est]
         # Estimation of each phase
         est_f = functools.partial(self._run, tau=self._tau, **kwargs)
-        if n_jobs == 1:
-            results = [est_f(unit) for unit in units]
-        else:
-            with Pool(n_jobs) as p:
-                units_est = p.map(est_f, units)
-            results.extend(units_est)
+        results.extend(executor.map(est_f, units))
         # Completion
         stopwatch.stop()
         print(f"Completed optimization. Total: {stopwatch.stop_show()}")
@@ -151,9 +151,8 @@ class _SRChange(Term):
         phases = [self.num2str(num) for num in range(len(change_points) + 1)]
         scores = []
         for phase in phases:
-            df = fit_df[[self.ACTUAL, phase]].dropna()
-            evaluator = Evaluator(df[self.ACTUAL], df[phase], how="all")
-            scores.append(evaluator.score(metric=metric))
+            values = fit_df[[self.ACTUAL, phase]].dropna().to_numpy(dtype=np.float64)
+            scores.append(Evaluator.score_array(values[:, 0], values[:, 1], metric=metric))
         return scores
 
     def show(self, change_points, area, **kwargs):
@@ -98,6 +98,84 @@ class Evaluator(object):
             raise ValueError(
                 f"When the targets have multiple columns, we cannot select {metric}.") from None
 
+    @classmethod
+    def score_array(cls, y_true, y_pred, metric="RMSLE"):
+        """
+        Calculate scores with specified metric directly on aligned arrays, optionally for a batch of predictions.
+
+        Args:
+            y_true (numpy.ndarray): correct target values, shape (n_samples,) or (n_samples, n_targets)
+            y_pred (numpy.ndarray): estimated target values, shape the same as @y_true or (N, *y_true.shape) for N candidates
+            metric (str): ME, MAE, MSE, MSLE, MAPE, RMSE, RMSLE or R2
+
+        Raises:
+            UnExpectedValueError: un-expected metric was applied
+            ValueError: the shapes of @y_true and @y_pred do not match
+            ValueError: ME was selected as metric when the targets have multiple columns
+
+        Returns:
+            float or numpy.ndarray: score with the metric or scores of the N candidates, shape (N,)
+
+        Note:
+            Scores are the same as those of Evaluator.score(how="all") (i.e. sklearn.metrics with multioutput="uniform_average"),
+            but the arrays will not be validated and negative estimated values will be regarded as 0 with MSLE and RMSLE.
+        """
+        metric = metric.upper()
+        if metric not in cls._METRICS_DICT:
+            raise UnExpectedValueError("metric", metric, candidates=list(cls._METRICS_DICT.keys()))
+        true_array = np.asarray(y_true, dtype=np.float64)
+        pred_array = np.asarray(y_pred, dtype=np.float64)
+        is_batch = pred_array.ndim == true_array.ndim + 1
+        if pred_array.shape[is_batch:] != true_array.shape:
+            raise ValueError(
+                f"@y_pred must have shape {true_array.shape} or (N, {', '.join(map(str, true_array.shape))}), "
+                f"but an array with shape {pred_array.shape} was applied.")
+        # Shape of actual values: (n_samples, n_targets), shape of predicted values: (N, n_samples, n_targets)
+        true_array = true_array.reshape(true_array.shape[0], -1)
+        pred_array = pred_array.reshape(-1, *true_array.shape)
+        if metric == "ME" and true_array.shape[1] > 1:
+            raise ValueError(f"When the targets have multiple columns, we cannot select {metric}.")
+        # Kernels: function(actual (n_samples, n_targets), predicted (N, n_samples, n_targets)) -> scores (N,)
+        scores = getattr(cls, f"_{metric.lower()}")(true_array, pred_array)
+        return scores if is_batch else float(scores[0])
+
+    @staticmethod
+    def _me(y_true, y_pred):
+        return np.abs(y_pred - y_true).max(axis=(1, 2))
+
+    @staticmethod
+    def _mae(y_true, y_pred):
+        return np.abs(y_pred - y_true).mean(axis=(1, 2))
+
+    @staticmethod
+    def _mse(y_true, y_pred):
+        return np.square(y_pred - y_true).mean(axis=(1, 2))
+
+    @staticmethod
+    def _msle(y_true, y_pred):
+        return np.square(np.log1p(np.maximum(y_pred, 0)) - np.log1p(y_true)).mean(axis=(1, 2))
+
+    @staticmethod
+    def _mape(y_true, y_pred):
+        return (np.abs(y_pred - y_true) / np.maximum(np.abs(y_true), np.finfo(np.float64).eps)).mean(axis=(1, 2))
+
+    @staticmethod
+    def _rmse(y_true, y_pred):
+        return np.sqrt(np.square(y_pred - y_true).mean(axis=1)).mean(axis=1)
+
+    @classmethod
+    def _rmsle(cls, y_true, y_pred):
+        return np.sqrt(cls._msle(y_true, y_pred))
+
+    @staticmethod
+    def _r2(y_true, y_pred):
+        ss_res = np.square(y_pred - y_true).sum(axis=1)
+        ss_tot = np.square(y_true - y_true.mean(axis=0)).sum(axis=0)
+        # Like sklearn.metrics.r2_score(), 1.0 (perfect prediction) or 0.0 with constant actual values
+        scores = np.where(ss_res == 0, 1.0, 0.0)
+        np.subtract(1, ss_res / np.where(ss_tot == 0, 1, ss_tot), out=scores, where=ss_tot != 0)
+        return scores.mean(axis=1)
+
     @classmethod
     def metrics(cls):
         """
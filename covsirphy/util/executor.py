@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import functools
+import importlib
+import itertools
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+import pickle
+import queue
+import threading
+import traceback
+from covsirphy.util.validator import Validator
+
+# Function (with data) de-serialized in the worker process: {token: function}
+_WORKER_CACHE = {}
+# Barrier shared by the workers of a pool to broadcast a function to all of them
+_WORKER_BARRIER = None
+
+
+def _init_worker(modules, barrier):
+    """
+    Pre-warm a worker process, importing modules.
+
+    Args:
+        modules (list[str]): names of modules to import
+        barrier (multiprocessing.synchronize.Barrier): barrier shared by the workers of the pool
+    """
+    global _WORKER_BARRIER
+    _WORKER_BARRIER = barrier
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _load_task(token, blob):
+    """
+    De-serialize a function in a worker process and wait for the other workers of the pool.
+    Because all workers wait for each other, each worker receives one of the loading tasks (broadcast).
+
+    Args:
+        token (tuple(int, int)): ID of the function
+        blob (bytes): serialized function
+    """
+    if token not in _WORKER_CACHE:
+        _WORKER_CACHE.clear()
+        _WORKER_CACHE[token] = pickle.loads(blob)
+    _WORKER_BARRIER.wait()
+
+
+def _run_task(token, item):
+    """
+    Run a task in a worker process with the function loaded with _load_task().
+
+    Args:
+        token (tuple(int, int)): ID of the function
+        item (object): argument of the function
+
+    Returns:
+        object: returned value of the function
+    """
+    return _WORKER_CACHE[token](item)
+
+
+class _SerialBackend(object):
+    """
+    Backend to call functions in the main process.
+    """
+
+    def __init__(self):
+        self.n_jobs = 1
+
+    def map(self, func, items, token=None):
+        return [func(item) for item in items]
+
+    def close(self):
+        pass
+
+
+class _ThreadBackend(object):
+    """
+    Backend to call functions with a thread pool, useful when the function releases GIL.
+
+    Args:
+        n_jobs (int): the number of threads
+    """
+
+    def __init__(self, n_jobs):
+        self.n_jobs = n_jobs
+        self._pool = None
+
+    def map(self, func, items, token=None):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.n_jobs)
+        return list(self._pool.map(func, items))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+class _ProcessBackend(object):
+    """
+    Backend to call functions with a pool of worker processes.
+
+    Args:
+        n_jobs (int): the number of processes
+        modules (list[str]): names of modules to import when workers start
+        start_method (str or None): "fork", "spawn", "forkserver" or None (default of the platform)
+
+    Note:
+        With each call of .map(), the function is serialized once and sent to each worker once (broadcast),
+        and then the tasks include only the items.
+    """
+
+    def __init__(self, n_jobs, modules, start_method):
+        self.n_jobs = n_jobs
+        self._modules = modules
+        self._context = multiprocessing.get_context(start_method)
+        self._pool = None
+        self._token = None
+
+    def map(self, func, items, token):
+        if self._pool is None:
+            barrier = self._context.Barrier(self.n_jobs)
+            self._pool = self._context.Pool(self.n_jobs, initializer=_init_worker, initargs=(self._modules, barrier))
+        # Send the serialized function to each worker once, and then only the items
+        if token != self._token:
+            self._pool.map(functools.partial(_load_task, token), [pickle.dumps(func)] * self.n_jobs, chunksize=1)
+            self._token = token
+        return self._pool.map(functools.partial(_run_task, token), items)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._token = None
+
+
+class _ClusterBackend(object):
+    """
+    Backend to call functions with worker nodes started by ParallelExecutor.serve().
+
+    Args:
+        addresses (list[tuple(str, int)]): addresses (host name, port number) of the nodes
+        authkey (bytes): authentication key shared with the nodes
+
+    Note:
+        Items will be sent to the nodes in chunks whose size is the number of processes of the node.
+        Nodes which finished their chunks will receive the next chunks (dynamic scheduling).
+    """
+
+    def __init__(self, addresses, authkey):
+        self._addresses = addresses
+        self._authkey = authkey
+        self._connections = None
+        self.n_jobs = None
+
+    def _connect(self):
+        if self._connections is not None:
+            return
+        self._connections = [Client(tuple(address), authkey=self._authkey) for address in self._addresses]
+        self._node_jobs = [conn.recv()[1] for conn in self._connections]
+        self.n_jobs = sum(self._node_jobs)
+
+    def map(self, func, items, token):
+        self._connect()
+        blob = pickle.dumps(func)
+        task_queue = queue.Queue()
+        for (i, item) in enumerate(items):
+            task_queue.put((i, item))
+        results, done, errors, lost = [None] * len(items), [False] * len(items), [], []
+
+        def send_chunks(conn, chunk_size):
+            chunk = []
+            try:
+                conn.send(("func", token, blob))
+                while not errors:
+                    chunk = []
+                    with contextlib.suppress(queue.Empty):
+                        while len(chunk) < chunk_size:
+                            chunk.append(task_queue.get_nowait())
+                    if not chunk:
+                        return
+                    conn.send(("tasks", [item for (_, item) in chunk]))
+                    status, values = conn.recv()
+                    if status == "error":
+                        errors.append(self._remote_error(*values))
+                        return
+                    for ((i, _), value) in zip(chunk, values):
+                        results[i], done[i] = value, True
+            except (EOFError, OSError) as e:
+                # The node was disconnected: the chunk will be sent to the other nodes
+                lost.append((conn, e))
+                for task in chunk:
+                    task_queue.put(task)
+            except BaseException as e:
+                errors.append(e)
+
+        while not errors and not task_queue.empty():
+            if not self._connections:
+                raise ConnectionError(f"All worker nodes were disconnected: {lost[-1][1]!r}")
+            threads = [
+                threading.Thread(target=send_chunks, args=(conn, chunk_size))
+                for (conn, chunk_size) in zip(self._connections, self._node_jobs)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # Remove disconnected nodes
+            lost_conns = [conn for (conn, _) in lost]
+            for conn in lost_conns:
+                with contextlib.suppress(OSError):
+                    conn.close()
+            self._node_jobs = [n for (conn, n) in zip(self._connections, self._node_jobs) if conn not in lost_conns]
+            self._connections = [conn for conn in self._connections if conn not in lost_conns]
+            self.n_jobs = sum(self._node_jobs)
+        if errors:
+            raise errors[0]
+        if not all(done):
+            raise ConnectionError(f"Results of {done.count(False)} items were not received from the worker nodes.")
+        return results
+
+    @staticmethod
+    def _remote_error(blob, text):
+        """
+        Return the exception raised in a worker node.
+
+        Args:
+            blob (bytes or None): serialized exception or None (it could not be serialized)
+            text (str): traceback of the exception
+
+        Returns:
+            BaseException: the exception when it can be de-serialized or RuntimeError with the traceback
+        """
+        with contextlib.suppress(Exception):
+            return pickle.loads(blob)
+        return RuntimeError(f"Error was raised in a worker node.\n{text}")
+
+    def close(self):
+        if self._connections is None:
+            return
+        for conn in self._connections:
+            with contextlib.suppress(OSError):
+                conn.send(("close", None))
+            conn.close()
+        self._connections = None
+
+
+class ParallelExecutor(object):
+    """
+    Executor of parallel jobs, which keeps workers alive across calls.
+
+    Args:
+        n_jobs (int): the number of parallel jobs or -1 (CPU count), ignored with "cluster" backend
+        modules (list[str] or None): names of modules to import when worker processes start or None (["covsirphy"])
+        backend (str): "process" (process pool), "thread" (thread pool), "serial" (main process) or "cluster" (worker nodes)
+        start_method (str or None): start method of worker processes with "process" backend, "fork", "spawn", "forkserver" or None (default of the platform)
+        addresses (list[tuple(str, int)] or None): addresses (host name, port number) of worker nodes with "cluster" backend
+        authkey (str or None): authentication key shared with worker nodes, required with "cluster" backend
+
+    Note:
+        Workers will be started (or connected) with the first call of .map() and kept alive until .close() is called.
+        We can use this as a context manager (with statement) to close the workers automatically.
+
+    Note:
+        When @n_jobs is 1 with "process" and "thread" backend, functions will be called in the main process.
+        "spawn" and "forkserver" start methods are safe when the main process has threads (e.g. Optuna), but starting workers takes longer.
+
+    Note:
+        With "cluster" backend, start a worker node on each host with ParallelExecutor.serve() or
+        "python -m covsirphy.util.executor --host 0.0.0.0 --port 50000 --authkey <key>" in advance.
+        Objects are sent to the nodes with pickle, and please use the executor only in trusted networks.
+
+    Examples:
+        >>> import covsirphy as cs
+        >>> with cs.ParallelExecutor(n_jobs=4, start_method="spawn") as executor:
+        >>>     for dynamics in dynamics_list:
+        >>>         dynamics.estimate(executor=executor)
+        >>> with cs.ParallelExecutor(backend="cluster", addresses=[("host1", 50000), ("host2", 50000)], authkey="key") as executor:
+        >>>     for dynamics in dynamics_list:
+        >>>         dynamics.estimate(executor=executor)
+    """
+    BACKENDS = ["process", "thread", "serial", "cluster"]
+    START_METHODS = ["fork", "spawn", "forkserver"]
+    _TOKENS = itertools.count()
+
+    def __init__(self, n_jobs=-1, modules=None, backend="process", start_method=None, addresses=None, authkey=None):
+        n_jobs = multiprocessing.cpu_count() if n_jobs == -1 else Validator(n_jobs, "n_jobs").int(value_range=(1, None))
+        modules = Validator(modules, "modules").sequence(default=["covsirphy"])
+        backend = Validator([backend], "backend").sequence(candidates=self.BACKENDS)[0]
+        if start_method is not None:
+            Validator([start_method], "start_method").sequence(candidates=self.START_METHODS)
+        if backend == "cluster":
+            addresses = Validator(addresses, "addresses").sequence()
+            if authkey is None:
+                raise ValueError("@authkey must be specified with cluster backend.")
+            self._backend = _ClusterBackend(addresses=addresses, authkey=str(authkey).encode())
+        elif backend == "serial" or n_jobs == 1:
+            self._backend = _SerialBackend()
+        elif backend == "thread":
+            self._backend = _ThreadBackend(n_jobs=n_jobs)
+        else:
+            self._backend = _ProcessBackend(n_jobs=n_jobs, modules=modules, start_method=start_method)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def n_jobs(self):
+        """
+        int: the number of parallel jobs
+
+        Note:
+            With "cluster" backend, the total number of processes of the nodes will be returned (nodes will be connected).
+        """
+        if isinstance(self._backend, _ClusterBackend):
+            self._backend._connect()
+        return self._backend.n_jobs
+
+    def map(self, func, iterable):
+        """
+        Apply the function to the items in parallel.
+
+        Args:
+            func (callable): function with one argument, which can be serialized with pickle (except for "thread" and "serial" backend)
+            iterable (iterable): items to apply the function to
+
+        Returns:
+            list[object]: returned values of the function in the order of the items
+
+        Note:
+            The function, including arguments bound with functools.partial (e.g. dataframes), will be serialized once for each call
+            and sent to (and de-serialized in) each worker once before the items, not with each item.
+        """
+        items = list(iterable)
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        return self._backend.map(func, items, token=(id(self), next(self._TOKENS)))
+
+    def close(self):
+        """
+        Stop the workers (or disconnect from the nodes). They will be started again with the next call of .map().
+        """
+        self._backend.close()
+
+    @staticmethod
+    def serve(host="localhost", port=50000, authkey=None, n_jobs=-1, start_method=None):
+        """
+        Start a worker node for "cluster" backend and wait for executors forever.
+
+        Args:
+            host (str): host name to listen on, like "0.0.0.0" (all interfaces)
+            port (int): port number to listen on
+            authkey (str): authentication key shared with executors
+            n_jobs (int): the number of processes of the node or -1 (CPU count)
+            start_method (str or None): start method of worker processes, "fork", "spawn", "forkserver" or None (default of the platform)
+
+        Note:
+            Executors will be served one by one.
+        """
+        if authkey is None:
+            raise ValueError("@authkey must be specified to start a worker node.")
+        port = Validator(port, "port").int(value_range=(0, 65535))
+        with ParallelExecutor(n_jobs=n_jobs, backend="process", start_method=start_method) as executor:
+            with Listener((host, port), authkey=str(authkey).encode()) as listener:
+                while True:
+                    with listener.accept() as conn:
+                        executor._serve_connection(conn)
+
+    def _serve_connection(self, conn):
+        """
+        Run tasks sent from an executor with "cluster" backend until the executor closes the connection.
+
+        Args:
+            conn (multiprocessing.connection.Connection): connection with the executor
+        """
+        conn.send(("ready", self._backend.n_jobs))
+        func = token = None
+        with contextlib.suppress(EOFError, ConnectionError):
+            while True:
+                kind, *contents = conn.recv()
+                if kind == "close":
+                    return
+                if kind == "func":
+                    # Tokens of executors in the other hosts may be the same, and the node uses its own token
+                    token, func = (id(self), next(self._TOKENS)), pickle.loads(contents[1])
+                    continue
+                try:
+                    conn.send(("results", self._backend.map(func, contents[0], token=token)))
+                except (EOFError, ConnectionError):
+                    raise
+                except Exception as e:
+                    # Exceptions which cannot be serialized will be sent as traceback
+                    blob = None
+                    with contextlib.suppress(Exception):
+                        blob = pickle.dumps(e)
+                    conn.send(("error", (blob, traceback.format_exc())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start a worker node of covsirphy.ParallelExecutor (cluster backend).")
+    parser.add_argument("--host", default="localhost", help="host name to listen on")
+    parser.add_argument("--port", type=int, default=50000, help="port number to listen on")
+    parser.add_argument("--authkey", required=True, help="authentication key shared with executors")
+    parser.add_argument("--n_jobs", type=int, default=-1, help="the number of processes or -1 (CPU count)")
+    parser.add_argument("--start_method", default=None, help="fork, spawn or forkserver")
+    args = parser.parse_args()
+    ParallelExecutor.serve(
+        host=args.host, port=args.port, authkey=args.authkey, n_jobs=args.n_jobs, start_method=args.start_method)
@@ -190,13 +190,14 @@ class PolicyMeasures(Term):
             for (length, records) in groupby(sorted_nest, key=itemgetter(1))
         }
 
-    def estimate(self, model, n_jobs=-1, **kwargs):
+    def estimate(self, model, n_jobs=-1, executor=None, **kwargs):
         """
         Estimate the parameter values of phases in the registered countries.
 
         Args:
             model (covsirphy.ModelBase): ODE model
             n_jobs (int): the number of parallel jobs or -1 (CPU count)
+            executor (covsirphy.ParallelExecutor or None): executor to keep alive across calls or None (use @n_jobs)
             kwargs: keyword arguments of model parameters and covsirphy.Estimator.run()
         """
         model = Validator(model, "model").subclass(ModelBase)
@@ -215,7 +216,7 @@ class PolicyMeasures(Term):
             model=model, tau=self.tau, **kwargs)
         mp_estimator.add(units)
         results = mp_estimator.run(
-            n_jobs=n_jobs, auto_complement=True, **kwargs)
+            n_jobs=n_jobs, executor=executor, auto_complement=True, **kwargs)
         # Register the results
         for country in self._countries:
             new_units = [
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare accuracy and speed of the integration methods of ODE solver.
+When you use this file from the top directory of the repository with poetry, please run
+cd example; poetry run ./benchmark_ode_solver.py; cd ../
+"""
+
+import os
+import sys
+try:
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+except Exception:
+    pass
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.integrate import solve_ivp
+import covsirphy as cs
+from covsirphy.ode.ode_solver import _ODESolver
+
+
+def main(tau=1440, days=180, repeat=10, batch_n=100, methods=("RK45", "LSODA", "rk4", "heun", "euler")):
+    """
+    Compare the integration methods with the built-in models.
+
+    Args:
+        tau (int): tau value [min]
+        days (int): the number of days to simulate
+        repeat (int): the number of repetitions to measure runtime
+        batch_n (int): the number of systems solved at once with _ODESolver.run_batch()
+        methods (tuple(str)): integration methods to compare, refer to _ODESolver.METHODS
+
+    Note:
+        Accuracy is the max absolute error of the rounded values [persons],
+        compared with the reference solution calculated with DOP853 (rtol=1e-10, atol=1e-6).
+    """
+    print(cs.get_version())
+    code_path = Path(__file__)
+    output_dir = code_path.with_name("output").joinpath(code_path.stem)
+    output_dir.mkdir(exist_ok=True, parents=True)
+    step_n = days * 1440 // tau
+    records = []
+    for model in [cs.SIR, cs.SIRD, cs.SIRF, cs.SEWIRF]:
+        param_dict = model.EXAMPLE[cs.Term.PARAM_DICT]
+        y0_dict = model.EXAMPLE[cs.Term.Y0_DICT]
+        y0 = np.array([y0_dict[v] for v in model.VARIABLES], dtype=np.float64)
+        params = [param_dict[p] for p in model.PARAMETERS]
+        reference = solve_ivp(
+            fun=lambda t, X: model._dydt(X, params, y0.sum()), t_span=[0, step_n], y0=y0, method="DOP853",
+            t_eval=np.arange(0, step_n + 1, 1), rtol=1e-10, atol=1e-6)["y"].T.round()
+        for method in methods:
+            solver = _ODESolver(model, method=method, **param_dict)
+            stopwatch = cs.StopWatch()
+            for _ in range(repeat):
+                sim_df = solver.run(step_n=step_n, **y0_dict)
+            runtime = stopwatch.stop() / repeat
+            stopwatch = cs.StopWatch()
+            _ODESolver.run_batch(model, [params] * batch_n, [y0] * batch_n, step_n=step_n, method=method)
+            batch_runtime = stopwatch.stop()
+            records.append(
+                {
+                    cs.Term.ODE: model.NAME, "method": method, "runtime [msec]": runtime * 1000,
+                    f"runtime of {batch_n} systems [msec]": batch_runtime * 1000,
+                    "max error [persons]": np.abs(sim_df.to_numpy() - reference).max(),
+                }
+            )
+    df = pd.DataFrame(records)
+    df.to_csv(output_dir.joinpath(f"benchmark_tau{tau}.csv"), index=False)
+    print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import numpy as np
+import pandas as pd
 import pytest
-from covsirphy import Dynamics, SIR, SIRD, SIRF, UnExecutedError
+from covsirphy import Term, Dynamics, ODEHandler, SIR, SIRD, SIRF, UnExecutedError
 
 
 class TestDynamics(object):
@@ -23,9 +25,61 @@ class TestDynamics(object):
         assert dynamics.get(date="01May2020", variable="rho") == rho_eg * 3
         # Check simulation, tracking, summary
         assert set(model.VARIABLES).issubset(dynamics.simulate(ffill=True, model_specific=True))
+        sim_df = dynamics.simulate(ffill=True)
+        assert dynamics.simulate(ffill=True, interpolation="spline")[Term.DATE].equals(sim_df[Term.DATE])
+        band_df = dynamics.simulate_ensemble(pd.DataFrame({"rho": [rho_eg * 0.9, rho_eg, rho_eg * 1.1]}), q=[0.5])
+        assert band_df.index.tolist() == sim_df[Term.DATE].tolist()
+        assert band_df.columns.tolist() == [(var, 0.5) for var in model.VARIABLES]
+        assert dynamics.simulate_stochastic(replicates=20, q=[0.5], seed=0).index.tolist() == sim_df[Term.DATE].tolist()
         assert dynamics.track(ffill=False).isna().any().any()
         summary_df = dynamics.summary(ffill=True)
         assert not summary_df.isna().any().any()
         assert len(summary_df) == 3
         # S-R trend analysis after simulation
         dynamics.sr(simulated=True, filename=imgfile)
+
+    @pytest.mark.parametrize("model", [SIRF])
+    def test_extend(self, model):
+        handler = ODEHandler(model, "01Jan2021", 1440)
+        handler.add("28Feb2021", y0_dict=model.EXAMPLE[Term.Y0_DICT], param_dict=model.EXAMPLE[Term.PARAM_DICT])
+        handler.add("30Apr2021", param_dict={**model.EXAMPLE[Term.PARAM_DICT], "rho": 0.15})
+        record_df = handler.simulate()
+        old_df = record_df.loc[record_df[Term.DATE] <= "15Apr2021"].assign(**{param: np.nan for param in model.PARAMETERS})
+        dynamics = Dynamics(model, old_df, tau=1440)
+        dynamics.segment(points=["01Mar2021"])
+        with pytest.raises(UnExecutedError):
+            Dynamics(model, old_df).extend(record_df)
+        dynamics.estimate(n_jobs=1, n_trials=64)
+        before_df = dynamics.summary()
+        dynamics.extend(record_df.loc[record_df[Term.DATE] > "10Apr2021"], n_jobs=1, n_trials=32)
+        after_df = dynamics.summary()
+        assert after_df.index.tolist() == ["0th", "1st"]
+        assert after_df.loc["1st", Term.END] == pd.Timestamp("30Apr2021")
+        assert after_df.loc["0th"].equals(before_df.loc["0th"])
+        assert after_df.loc["1st", Term.TRIALS] <= 32
+        assert dynamics.simulate()[Term.DATE].max() == pd.Timestamp("30Apr2021")
+        # No changes
+        dynamics.extend(record_df.loc[record_df[Term.DATE] > "10Apr2021"], n_jobs=1, n_trials=32)
+        assert dynamics.summary().equals(after_df)
+
+    @pytest.mark.parametrize("model", [SIRF])
+    def test_extend_future(self, model):
+        handler = ODEHandler(model, "01Jan2021", 1440)
+        handler.add("28Feb2021", y0_dict=model.EXAMPLE[Term.Y0_DICT], param_dict=model.EXAMPLE[Term.PARAM_DICT])
+        handler.add("30Apr2021", param_dict={**model.EXAMPLE[Term.PARAM_DICT], "rho": 0.15})
+        record_df = handler.simulate()
+        old_df = record_df.loc[record_df[Term.DATE] <= "10Apr2021"].assign(**{param: np.nan for param in model.PARAMETERS})
+        # Today is earlier than the last date (future phases)
+        dynamics = Dynamics(model, old_df, tau=1440, today="10Apr2021", last_date="31May2021")
+        dynamics.segment(points=["01Mar2021"])
+        dynamics.estimate(n_jobs=1, n_trials=64)
+        before_df = dynamics.summary()
+        dynamics.extend(record_df.loc[record_df[Term.DATE] > "10Apr2021"], n_jobs=1, n_trials=32)
+        after_df = dynamics.summary()
+        assert dynamics._today == pd.Timestamp("30Apr2021")
+        assert dynamics._last == pd.Timestamp("31May2021")
+        assert after_df.loc[["0th", "1st"]].equals(before_df.loc[["0th", "1st"]])
+        # The future phase was estimated with the new records
+        assert pd.isna(before_df.loc["2nd", "RMSLE"])
+        assert pd.notna(after_df.loc["2nd", "RMSLE"])
+        assert after_df.loc["2nd", Term.TRIALS] <= 32
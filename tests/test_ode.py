@@ -1,21 +1,48 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import functools
 import warnings
+import numpy as np
+import optuna
 import pandas as pd
 import pytest
-from covsirphy import Term, UnExecutedError, Validator
-from covsirphy import ModelBase, SIR, SIRD, SIRF, SIRFV, SEWIRF, ODEHandler
+from scipy import sparse
+from covsirphy import Term, UnExecutedError, UnExpectedValueError, UnExpectedValueRangeError, Validator, Evaluator, NAFoundError
+from covsirphy import ModelBase, SIR, SIRD, SIRF, SIRFV, SEWIRF, ODEHandler, SimulationCache, TrajectoryStore, Metapopulation
+from covsirphy import BudgetScheduler, ParallelExecutor, StopWatch
+from covsirphy.ode.ode_solver import _ODESolver
+from covsirphy.ode.ode_solver_multi import _MultiPhaseODESolver
+from covsirphy.ode.stochastic_solver import _StochasticSolver
+from covsirphy.ode.param_estimator import _ParamEstimator
+
+
+def _simulate(model, end_dates, rates=None):
+    # Records simulated with the example values, rho of the phases will be multiplied by the rates
+    y0_dict, param_dict = model.EXAMPLE[Term.Y0_DICT], model.EXAMPLE[Term.PARAM_DICT]
+    handler = ODEHandler(model, "01Jan2021", 1440)
+    for (i, (end_date, rate)) in enumerate(zip(end_dates, rates or [1] * len(end_dates))):
+        handler.add(end_date=end_date, y0_dict=y0_dict if i == 0 else None, param_dict={**param_dict, "rho": param_dict["rho"] * rate})
+    return handler.simulate()
+
+
+def _estimation_handler(model, end_dates, param_dict=None, **kwargs):
+    # Handler with the phases to estimate, parameter values of the first phase will be registered with @param_dict
+    handler = ODEHandler(model, "01Jan2021", 1440, **kwargs)
+    for (i, end_date) in enumerate(end_dates):
+        handler.add(end_date=end_date, y0_dict=model.EXAMPLE[Term.Y0_DICT] if i == 0 else None, param_dict=param_dict if i == 0 else None)
+    return handler
 
 
 class TestODEHandler(object):
     @pytest.mark.parametrize("model", [SIR, SIRD, SIRF, SEWIRF])
     @pytest.mark.parametrize("first_date", ["01Jan2021"])
     @pytest.mark.parametrize("tau", [720])
-    def test_simulate(self, model, first_date, tau):
+    @pytest.mark.parametrize("method", ["RK45", "rk4"])
+    def test_simulate(self, model, first_date, tau, method):
         y0_dict = model.EXAMPLE["y0_dict"]
         param_dict = model.EXAMPLE["param_dict"]
-        handler = ODEHandler(model, first_date, tau)
+        handler = ODEHandler(model, first_date, tau, method=method)
         handler.add(end_date="31Jan2021", y0_dict=y0_dict, param_dict=param_dict)
         handler.add(end_date="28Feb2021", y0_dict=None, param_dict=param_dict)
         sim_df = handler.simulate().set_index(Term.DATE)
@@ -23,6 +50,116 @@ class TestODEHandler(object):
         assert sim_df.index.max() == pd.to_datetime("28Feb2021")
         assert set(sim_df.reset_index().columns) == set(Term.DSIFR_COLUMNS)
 
+    @pytest.mark.parametrize("model", [SIR, SEWIRF])
+    @pytest.mark.parametrize("tau", [1440, 360])
+    def test_simulate_many_phases(self, model, tau):
+        y0_dict, param_dict = model.EXAMPLE[Term.Y0_DICT], model.EXAMPLE[Term.PARAM_DICT]
+        end_dates = pd.date_range("07Jan2021", periods=20, freq="7D").strftime(Term.DATE_FORMAT)
+        single_handler = ODEHandler(model, "01Jan2021", tau, method="rk4")
+        single_handler.add(end_date=end_dates[-1], y0_dict=y0_dict, param_dict=param_dict)
+        single_df = single_handler.simulate()
+        handler = ODEHandler(model, "01Jan2021", tau, method="rk4")
+        handler.add(end_date=end_dates[0], y0_dict=y0_dict, param_dict=param_dict)
+        for end_date in end_dates[1:]:
+            handler.add(end_date=end_date, param_dict=param_dict)
+        sim_df = handler.simulate()
+        assert sim_df[Term.DATE].tolist() == single_df[Term.DATE].tolist()
+        assert np.allclose(sim_df[Term.DSIFR_COLUMNS[1:]], single_df[Term.DSIFR_COLUMNS[1:]], atol=sum(y0_dict.values()) * 0.001)
+
+    @pytest.mark.parametrize("model", [SIR, SEWIRF])
+    @pytest.mark.parametrize("method", ["RK45", "rk4"])
+    def test_simulate_interpolation(self, model, method):
+        y0_dict, param_dict = model.EXAMPLE[Term.Y0_DICT], model.EXAMPLE[Term.PARAM_DICT]
+        handler = ODEHandler(model, "01Jan2021", 720, method=method)
+        handler.add(end_date="31Jan2021", y0_dict=y0_dict, param_dict=param_dict)
+        restart_df = handler.simulate()
+        assert handler.simulate(interpolation="constant").equals(restart_df)
+        assert handler.simulate(interpolation="spline").equals(restart_df)
+        for (i, end_date) in enumerate(["28Feb2021", "31Mar2021", "30Apr2021"], start=1):
+            handler.add(end_date=end_date, param_dict={k: v * (1 - 0.1 * i) for (k, v) in param_dict.items()})
+        restart_df = handler.simulate()
+        constant_df = handler.simulate(interpolation="constant")
+        spline_df = handler.simulate(interpolation="spline")
+        assert constant_df[Term.DATE].equals(restart_df[Term.DATE])
+        assert spline_df[Term.DATE].equals(restart_df[Term.DATE])
+        atol = sum(y0_dict.values()) * (0.001 if method == "rk4" else 0.01)
+        assert np.allclose(constant_df[Term.DSIFR_COLUMNS[1:]], restart_df[Term.DSIFR_COLUMNS[1:]], atol=atol)
+        assert not np.array_equal(spline_df[Term.DSIFR_COLUMNS[1:]], constant_df[Term.DSIFR_COLUMNS[1:]])
+        with pytest.raises(UnExpectedValueError):
+            handler.simulate(interpolation="unknown")
+
+    @pytest.mark.parametrize("model", [SIR, SEWIRF])
+    def test_interpolation_spline(self, model):
+        y0_dict, param_dict = model.EXAMPLE[Term.Y0_DICT], model.EXAMPLE[Term.PARAM_DICT]
+        solver = _MultiPhaseODESolver(model, pd.to_datetime("01Jan2021"), 720, interpolation="spline")
+        for (i, end_date) in enumerate(["31Jan2021", "28Feb2021", "31Mar2021", "30Apr2021"]):
+            solver._add(pd.to_datetime(end_date), param_dict={k: v * (1 - 0.1 * i) for (k, v) in param_dict.items()}, y0_dict=y0_dict if i == 0 else None)
+        phases = solver._phases()
+        ((step_n, _, param_f),) = solver._segments(phases)
+        values = np.array([params for (_, _, params) in phases])
+        step_array = np.array([phase_step_n for (phase_step_n, _, _) in phases])
+        mids = np.cumsum(step_array) - step_array / 2
+        # Parameter values go through the values of the phases at the middle of the phases
+        assert np.allclose([param_f(t) for t in mids], values)
+        # Shape-preserving: values decrease monotonically between the middle of the phases and stay in the range of the neighbours
+        for (i, (start, end)) in enumerate(zip(mids[:-1], mids[1:])):
+            curve = np.array([param_f(t) for t in np.linspace(start, end, 50)])
+            assert np.all(np.diff(curve, axis=0) <= 1e-12)
+            assert np.all((curve >= values[i + 1] - 1e-12) & (curve <= values[i] + 1e-12))
+            # Not piecewise-constant
+            assert not np.allclose(curve[1:-1], values[i]) and not np.allclose(curve[1:-1], values[i + 1])
+        # Values are constant before the middle of the first phase and after the middle of the last phase
+        assert np.allclose(param_f(0), values[0]) and np.allclose(param_f(step_n), values[-1])
+
+    @pytest.mark.parametrize("model", [SIR, SIRF])
+    def test_simulate_ensemble(self, model):
+        y0_dict, param_dict = model.EXAMPLE[Term.Y0_DICT], model.EXAMPLE[Term.PARAM_DICT]
+        handler = ODEHandler(model, "01Jan2021", 720, method="rk4")
+        handler.add(end_date="31Jan2021", y0_dict=y0_dict, param_dict=param_dict)
+        handler.add(end_date="28Feb2021", param_dict={k: v * 0.8 for (k, v) in param_dict.items()})
+        rng = np.random.default_rng(0)
+        draw_df = pd.DataFrame({"rho": rng.normal(param_dict["rho"], 0.01, 40)})
+        q = [0.1, 0.5, 0.9]
+        band_df = handler.simulate_ensemble({"1st": draw_df}, q=q, chunk_size=15)
+        assert band_df.columns.tolist() == [(var, value) for var in model.VARIABLES for value in q]
+        # Simulation with each draw
+        sim_arrays = []
+        for rho in draw_df["rho"]:
+            each_handler = ODEHandler(model, "01Jan2021", 720, method="rk4")
+            each_handler.add(end_date="31Jan2021", y0_dict=y0_dict, param_dict=param_dict)
+            each_handler.add(end_date="28Feb2021", param_dict={**{k: v * 0.8 for (k, v) in param_dict.items()}, "rho": rho})
+            sim_df = each_handler.simulate().set_index(Term.DATE)
+            sim_arrays.append(model.convert(sim_df.reset_index(), tau=None).loc[:, model.VARIABLES].to_numpy())
+        assert band_df.index.tolist() == sim_df.index.tolist()
+        expected = np.quantile(np.array(sim_arrays), q, axis=0)
+        for (i, value) in enumerate(q):
+            assert np.allclose(band_df.xs(value, axis=1, level=1), expected[i], rtol=0.05, atol=5)
+        with pytest.raises(ValueError):
+            handler.simulate_ensemble({"0th": draw_df, "1st": draw_df.iloc[:10]})
+        with pytest.raises(UnExpectedValueError):
+            handler.simulate_ensemble({"2nd": draw_df})
+
+    @pytest.mark.parametrize("model", [SIR, SIRF])
+    def test_simulate_stochastic(self, model, tmp_path):
+        y0_dict, param_dict = model.EXAMPLE[Term.Y0_DICT], model.EXAMPLE[Term.PARAM_DICT]
+        handler = ODEHandler(model, "01Jan2021", 1440)
+        handler.add(end_date="31Jan2021", y0_dict=y0_dict, param_dict=param_dict)
+        handler.add(end_date="28Feb2021", param_dict={k: v * 0.8 for (k, v) in param_dict.items()})
+        q = [0.1, 0.5, 0.9]
+        band_df = handler.simulate_stochastic(replicates=200, q=q, seed=1, chunk_size=64, filename=tmp_path / "stochastic.bin")
+        assert band_df.equals(handler.simulate_stochastic(replicates=200, q=q, seed=1, chunk_size=64))
+        assert band_df.columns.tolist() == [(var, value) for var in model.VARIABLES for value in q]
+        values = TrajectoryStore(tmp_path / "stochastic.bin").array
+        assert values.shape == (200, len(band_df), len(model.VARIABLES))
+        assert (values >= 0).all() and (values.sum(axis=2) == sum(y0_dict.values())).all()
+        # Mean values are near to the results of deterministic simulation
+        sim_df = model.convert(handler.simulate(), tau=None)
+        assert np.allclose(values.mean(axis=0), sim_df[model.VARIABLES].to_numpy(), atol=sum(y0_dict.values()) * 0.05)
+        with pytest.raises(NotImplementedError):
+            sirfv_handler = ODEHandler(SIRFV, "01Jan2021", 1440)
+            sirfv_handler.add(end_date="31Jan2021", y0_dict=SIRFV.EXAMPLE[Term.Y0_DICT], param_dict=SIRFV.EXAMPLE[Term.PARAM_DICT])
+            sirfv_handler.simulate_stochastic(replicates=10)
+
     @pytest.mark.parametrize("model", [SIR])
     @pytest.mark.parametrize("first_date", ["01Jan2021"])
     @pytest.mark.parametrize("tau", [720])
@@ -67,6 +204,163 @@ class TestODEHandler(object):
         assert isinstance(tau_est, int)
         assert isinstance(info_dict_est, dict)
 
+    @pytest.mark.parametrize("model", [SIRF])
+    @pytest.mark.parametrize("optimizer", ["tpe", "lbfgs"])
+    def test_estimate_warm_start(self, model, optimizer):
+        sim_df = _simulate(model, ["31Jan2021", "28Feb2021"], rates=[1, 0.8])
+        handler = _estimation_handler(model, ["31Jan2021", "28Feb2021"], param_dict=model.EXAMPLE[Term.PARAM_DICT], n_jobs=1)
+        info_dict = handler.estimate_params(sim_df, phases=["1st"], optimizer=optimizer, n_trials=32, maxiter=10)
+        assert list(info_dict.keys()) == ["1st"]
+        # Warm start with the last estimation
+        rmsle = info_dict["1st"]["RMSLE"]
+        info_dict = handler.estimate_params(sim_df, phases=["1st"], optimizer=optimizer, n_trials=32, maxiter=10)
+        assert info_dict["1st"]["RMSLE"] <= rmsle
+        # Narrowing the parameter range around the last estimation
+        rmsle = info_dict["1st"]["RMSLE"]
+        info_dict = handler.estimate_params(sim_df, phases=["1st"], optimizer=optimizer, n_trials=32, maxiter=10, margin=0.5)
+        assert info_dict["1st"]["RMSLE"] <= rmsle
+        with pytest.raises(UnExpectedValueError):
+            handler.estimate_params(sim_df, phases=["2nd"])
+
+    @pytest.mark.parametrize("model", [SIR, SIRF])
+    def test_estimate_warm_start_trials(self, model):
+        sim_df = _simulate(model, ["31Jan2021", "28Feb2021"], rates=[1, 0.8])
+        handler = _estimation_handler(model, ["31Jan2021", "28Feb2021"], n_jobs=1)
+        check_dict = {"timeout": 60, "tail_n": 4, "tolerance": 0.01, "batch_size": 16}
+        cold_dict = handler.estimate_params(sim_df, check_dict=check_dict)
+        warm_dict = handler.estimate_params(sim_df, check_dict=check_dict)
+        # Warm start reduces the number of trials to convergence without worse scores
+        for phase in ["0th", "1st"]:
+            assert warm_dict[phase][Term.TRIALS] <= cold_dict[phase][Term.TRIALS]
+            # Scores of the same values slightly depend on the other trials simulated at once (shared steps of RK45)
+            assert warm_dict[phase]["RMSLE"] <= cold_dict[phase]["RMSLE"] * 1.01
+        assert sum(v[Term.TRIALS] for v in warm_dict.values()) < sum(v[Term.TRIALS] for v in cold_dict.values())
+
+    @pytest.mark.parametrize("model", [SIRF])
+    def test_estimate_neighbour_priors_first(self, model):
+        sim_df = _simulate(model, ["31Jan2021", "28Feb2021"], rates=[1, 0.8])
+        handler = _estimation_handler(model, ["31Jan2021", "28Feb2021"], n_jobs=1)
+        # The first estimation: no values of the neighbouring phases are registered
+        assert handler._priors("0th") == [] and handler._priors("1st") == []
+        # Estimated one by one, the values of the previous phase will be used for the next phase
+        est_dict = handler.estimate_params(sim_df, n_trials=32, phases=["0th"])["0th"]
+        assert handler._priors("1st") == [{param: est_dict[param] for param in model.PARAMETERS}]
+        assert handler._center("1st") is None
+        handler.estimate_params(sim_df, n_trials=32, phases=["1st"])
+        assert len(handler._priors("0th")) == 2
+
+    @pytest.mark.parametrize("model", [SIRF])
+    def test_estimate_neighbour_priors(self, model):
+        param_dict = model.EXAMPLE[Term.PARAM_DICT]
+        handler = _estimation_handler(model, ["31Jan2021", "28Feb2021"], param_dict=param_dict)
+        sim_df = _simulate(model, ["31Jan2021"])
+        assert handler._priors("1st") == [param_dict]
+        assert handler._center("1st") is None and handler._center("0th") == param_dict
+        study_dict = {**ODEHandler._STUDY_DICT, "margin": 0.5}
+        # Values of the neighbouring phases are only enqueued: the range is not narrowed
+        estimator = handler._estimator("0th", data=sim_df, quantiles=(0.1, 0.9))
+        guess_dict = {param: tuple(float(v) for v in values) for (param, values) in estimator._range_dict.items()}
+        estimator.start(study_dict, priors=[{k: v * 3 for (k, v) in param_dict.items()}], center=None)
+        for (param, (low, high)) in estimator._range_dict.items():
+            assert low <= guess_dict[param][0] and high >= guess_dict[param][1]
+            assert high >= param_dict[param] * 3 or param_dict[param] == 0
+        # The range is narrowed around the values of the phase itself
+        estimator = handler._estimator("0th", data=sim_df, quantiles=(0.1, 0.9))
+        estimator.start(study_dict, priors=[param_dict], center=param_dict)
+        for (param, (low, high)) in estimator._range_dict.items():
+            assert (low, high) == guess_dict[param] or param_dict[param] * 0.5 <= low <= high <= param_dict[param] * 1.5
+
+    @pytest.mark.parametrize("model", [SIR, SIRF])
+    def test_estimate_hybrid(self, model, tmp_path):
+        sim_df = _simulate(model, ["31Jan2021", "28Feb2021"], rates=[1, 0.8])
+        storage = f"sqlite:///{tmp_path / 'estimation.db'}"
+        info_list = []
+        for backend in ["thread", "process"]:
+            with ParallelExecutor(n_jobs=3, backend=backend) as executor:
+                handler = _estimation_handler(model, ["31Jan2021", "28Feb2021"], executor=executor)
+                # Storage shared by the workers is required
+                with pytest.raises(UnExpectedValueError):
+                    handler.estimate_params(sim_df, n_trials=64, hybrid=True)
+                info_list.append(handler.estimate_params(sim_df, n_trials=64, batch_size=16, hybrid=True, storage=storage, study_name=backend))
+            assert list(info_list[-1].keys()) == ["0th", "1st"]
+            assert all(info_dict[Term.TRIALS] <= 64 for info_dict in info_list[-1].values())
+        assert handler.simulate()[Term.DATE].max() == pd.Timestamp("28Feb2021")
+        # The two workers of the 0th phase sampled trials of the shared study
+        summaries = [summary for summary in optuna.get_all_study_summaries(storage) if summary.study_name.startswith("process/")]
+        assert len(summaries) == 2
+        trials = optuna.load_study(study_name=min(summary.study_name for summary in summaries), storage=storage).trials
+        assert {trial.user_attrs.get(_ParamEstimator._WORKER) for trial in trials} == {0, 1}
+        assert len(trials) == info_list[-1]["0th"][Term.TRIALS]
+
+    @pytest.mark.parametrize("model", [SIRF])
+    def test_estimate_storage(self, model, tmp_path):
+        sim_df = _simulate(model, ["31Jan2021"])
+        storage = f"sqlite:///{tmp_path / 'estimation.db'}"
+        info_list = []
+        for n_trials in [32, 64, 64]:
+            handler = _estimation_handler(model, ["31Jan2021"], n_jobs=1)
+            info_list.append(handler.estimate_params(sim_df, n_trials=n_trials, storage=storage, study_name="Japan")["0th"])
+        # Resumed with the saved trials
+        assert [info_dict[Term.TRIALS] for info_dict in info_list] == [32, 64, 64]
+        assert info_list[1]["RMSLE"] <= info_list[0]["RMSLE"]
+        assert info_list[2]["RMSLE"] == info_list[1]["RMSLE"]
+        # Trials left running by a stopped process will be marked as failed and not be counted
+        study_name = handler._study_dict("0th", {"study_name": "Japan"}, data=sim_df)["study_name"]
+        study = optuna.load_study(study_name=study_name, storage=storage)
+        study.ask()
+        handler = _estimation_handler(model, ["31Jan2021"], n_jobs=1)
+        assert handler.estimate_params(sim_df, n_trials=96, storage=storage, study_name="Japan")["0th"][Term.TRIALS] == 96
+        study = optuna.load_study(study_name=study_name, storage=storage)
+        assert len(study.trials) == 97
+        assert [trial.state for trial in study.trials if trial.user_attrs.get("stale")] == [optuna.trial.TrialState.FAIL]
+        # New studies will be created when the records or tau changed
+        changed_df = sim_df.copy()
+        changed_df.loc[changed_df.index[-1], Term.CI] += 100
+        for (tau, df) in [(1440, changed_df), (720, sim_df)]:
+            handler = ODEHandler(model, "01Jan2021", tau, n_jobs=1)
+            handler.add(end_date="31Jan2021", y0_dict=model.EXAMPLE[Term.Y0_DICT])
+            assert handler._study_dict("0th", {"study_name": "Japan"}, data=df)["study_name"] != study_name
+            assert handler.estimate_params(df, n_trials=32, storage=storage, study_name="Japan")["0th"][Term.TRIALS] == 32
+        assert len(optuna.get_all_study_summaries(storage)) == 3
+
+    @pytest.mark.parametrize("model", [SIR, SIRF])
+    def test_estimate_tau_search(self, model):
+        param_dict = {k: v * 0.1 for (k, v) in model.EXAMPLE[Term.PARAM_DICT].items()}
+        sim_handler = ODEHandler(model, "01Jan2021", tau=720)
+        sim_handler.add(end_date="28Feb2021", y0_dict=model.EXAMPLE[Term.Y0_DICT], param_dict=param_dict)
+        sim_handler.add(end_date="31May2021", param_dict={k: v * 0.8 for (k, v) in param_dict.items()})
+        sim_df = sim_handler.simulate()
+        tau_dict, score_dict = {}, {}
+        for search in ["exhaustive", "coarse"]:
+            handler = ODEHandler(model, "01Jan2021", n_jobs=1)
+            handler.add(end_date="28Feb2021", y0_dict=model.EXAMPLE[Term.Y0_DICT])
+            handler.add(end_date="31May2021")
+            tau_dict[search] = handler.estimate_tau(sim_df, search=search)
+            score_dict[search] = handler.tau_scores()
+            assert len(score_dict[search]) == 36
+            assert score_dict[search][tau_dict[search]] == score_dict[search].min()
+        assert tau_dict["coarse"] == tau_dict["exhaustive"]
+        assert score_dict["exhaustive"].notna().all()
+        assert score_dict["coarse"].notna().sum() < 36
+        calculated = score_dict["coarse"].dropna()
+        assert np.allclose(calculated, score_dict["exhaustive"][calculated.index])
+
+    @pytest.mark.parametrize("model", [SIR])
+    def test_estimate_tau_search_multimodal(self, model, monkeypatch):
+        sim_handler = ODEHandler(model, "01Jan2021", tau=1440)
+        sim_handler.add(end_date="28Feb2021", y0_dict=model.EXAMPLE[Term.Y0_DICT], param_dict=model.EXAMPLE[Term.PARAM_DICT])
+        sim_df = sim_handler.simulate()
+        # Scores with a local minimum (720 min) and the global minimum (10 min)
+        monkeypatch.setattr(ODEHandler, "_score_tau", lambda self, tau, data, info_dict: abs(tau - 720) / 1000 - (10 if tau == 10 else 0))
+        tau_dict = {}
+        for search in [None, "exhaustive", "coarse"]:
+            handler = ODEHandler(model, "01Jan2021", n_jobs=1)
+            handler.add(end_date="28Feb2021", y0_dict=model.EXAMPLE[Term.Y0_DICT])
+            tau_dict[search] = handler.estimate_tau(sim_df) if search is None else handler.estimate_tau(sim_df, search=search)
+        # Exhaustive search (default) finds the global minimum, but coarse search stops at the local minimum
+        assert tau_dict[None] == tau_dict["exhaustive"] == 10
+        assert tau_dict["coarse"] == 720
+
     @pytest.mark.parametrize("model", [SIR])
     def test_model_common(self, model):
         model_ins = model(population=1_000_000, rho=0.2, sigma=0.075)
@@ -85,6 +379,23 @@ class TestODEHandler(object):
         assert model_ins.calc_r0() is None
         assert model_ins.calc_days_dict(tau=1440)
 
+    @pytest.mark.parametrize("model", [SIR, SIRD, SIRF, SEWIRF])
+    def test_calc_array(self, model):
+        rng = np.random.default_rng(0)
+        param_df = pd.DataFrame(rng.uniform(0.01, 0.3, (20, len(model.PARAMETERS))), columns=model.PARAMETERS)
+        param_df.loc[0, ["sigma", "kappa"] if "kappa" in model.PARAMETERS else ["sigma"]] = 0
+        r0_array = model.calc_r0_array(param_df)
+        days_df = model.calc_days_array(param_df, tau=720)
+        assert days_df.columns.tolist() == model.DAY_PARAMETERS
+        assert days_df.index.equals(param_df.index)
+        for (i, param_dict) in enumerate(param_df.to_dict(orient="records")):
+            model_ins = model(population=1_000_000, **param_dict)
+            r0 = model_ins.calc_r0()
+            assert (r0 is None and np.isnan(r0_array[i])) or r0 == r0_array[i]
+            assert model_ins.calc_days_dict(tau=720) == days_df.astype(object).where(days_df.notna(), None).iloc[i].to_dict()
+        assert np.isnan(r0_array[0]) and days_df.iloc[0].isna().all()
+        assert not days_df.iloc[1:].isna().any().any()
+
     @pytest.mark.parametrize("model", [ModelBase])
     def test_model_base(self, model):
         warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -129,3 +440,418 @@ class TestODEHandler(object):
         model_ins = model(population=1_000_000, **param_dict)
         assert model_ins.calc_r0()
         assert model_ins.calc_days_dict(tau=1440)
+
+
+class TestODESolver(object):
+    @pytest.mark.parametrize("model", [SIR, SIRD, SIRF, SEWIRF])
+    def test_run_batch(self, model):
+        step_n = model.EXAMPLE[Term.STEP_N]
+        param_dict, y0_dict = model.EXAMPLE[Term.PARAM_DICT], model.EXAMPLE[Term.Y0_DICT]
+        params = np.array([[param_dict[p] * scale for p in model.PARAMETERS] for scale in (0.8, 1.0, 1.2)])
+        y0 = np.array([[y0_dict[v] for v in model.VARIABLES]] * len(params))
+        batch = _ODESolver.run_batch(model, params, y0, step_n=step_n)
+        assert batch.shape == (len(params), step_n + 1, len(model.VARIABLES))
+        for (param_values, solution) in zip(params, batch):
+            solver = _ODESolver(model, **dict(zip(model.PARAMETERS, param_values)))
+            sim_df = solver.run(step_n=step_n, **y0_dict)
+            assert np.allclose(solution, sim_df.to_numpy(), atol=sum(y0_dict.values()) * 0.02)
+
+    @pytest.mark.parametrize("model", [SIR])
+    def test_run_batch_error(self, model):
+        y0 = np.array([[model.EXAMPLE[Term.Y0_DICT][v] for v in model.VARIABLES]])
+        with pytest.raises(ValueError):
+            _ODESolver.run_batch(model, np.array([[0.2, 0.075, 0.1]]), y0, step_n=10)
+        with pytest.raises(ValueError):
+            _ODESolver.run_batch(model, np.array([[0.2, 0.075], [0.2, 0.075]]), y0, step_n=10)
+        with pytest.raises(NotImplementedError):
+            _ODESolver.run_batch(SIRFV, np.zeros((1, 5)), np.ones((1, 5)), step_n=10)
+
+    @pytest.mark.parametrize("model", [SIR, SIRF, SEWIRF])
+    @pytest.mark.parametrize("method", ["euler", "heun", "rk4", "Radau", "BDF", "LSODA"])
+    def test_method(self, model, method):
+        step_n = model.EXAMPLE[Term.STEP_N]
+        param_dict, y0_dict = model.EXAMPLE[Term.PARAM_DICT], model.EXAMPLE[Term.Y0_DICT]
+        rk45_df = _ODESolver(model, **param_dict).run(step_n=step_n, **y0_dict)
+        sim_df = _ODESolver(model, method=method, **param_dict).run(step_n=step_n, **y0_dict)
+        assert sim_df.shape == rk45_df.shape
+        assert np.allclose(sim_df, rk45_df, atol=sum(y0_dict.values()) * 0.1)
+        with pytest.raises(UnExpectedValueError):
+            _ODESolver(model, method="unknown", **param_dict)
+
+    @pytest.mark.parametrize("model", [SIR, SEWIRF])
+    @pytest.mark.parametrize("method", ["RK45", "rk4"])
+    def test_run_steps(self, model, method):
+        step_n = model.EXAMPLE[Term.STEP_N]
+        param_dict, y0_dict = model.EXAMPLE[Term.PARAM_DICT], model.EXAMPLE[Term.Y0_DICT]
+        solver = _ODESolver(model, method=method, **param_dict)
+        all_df = solver.run(step_n=step_n, **y0_dict)
+        steps = [step_n, 0, 7, 30, 30]
+        sim_df = solver.run(step_n=step_n, steps=steps, **y0_dict)
+        assert sim_df.index.tolist() == [0, 7, 30, step_n]
+        assert sim_df.equals(all_df.loc[[0, 7, 30, step_n]])
+        with pytest.raises(UnExpectedValueRangeError):
+            solver.run(step_n=step_n, steps=[0, step_n + 1], **y0_dict)
+
+    @pytest.mark.parametrize("model", [SIR, SIRD, SIRF, SEWIRF])
+    def test_jacobian(self, model):
+        param_dict, y0_dict = model.EXAMPLE[Term.PARAM_DICT], model.EXAMPLE[Term.Y0_DICT]
+        model_ins = model(population=sum(y0_dict.values()), **param_dict)
+        X = np.array([y0_dict[v] for v in model.VARIABLES], dtype=np.float64) + 1000
+        jac = model_ins.jacobian(0, X)
+        assert jac.shape == (len(X), len(X))
+        diff = np.eye(len(X)) * 1e-3
+        jac_numerical = np.array([(model_ins(0, X + d) - model_ins(0, X - d)) / 2e-3 for d in diff]).T
+        assert np.allclose(jac, jac_numerical, atol=1e-6)
+        out = np.empty(len(X))
+        assert model_ins(0, X, out=out) is out
+        assert np.allclose(out, model_ins(0, X))
+        # Partial derivatives with respect to the parameters
+        params = np.array([param_dict[p] for p in model.PARAMETERS])
+        population = sum(y0_dict.values())
+        pjac = model._param_jacobian(X, params, population)
+        assert pjac.shape == (len(X), len(params))
+        diff = np.eye(len(params)) * 1e-6
+        pjac_numerical = np.array(
+            [(model._dydt(X, params + d, population) - model._dydt(X, params - d, population)) / 2e-6 for d in diff]).T
+        assert np.allclose(pjac, pjac_numerical, rtol=1e-5, atol=1e-3)
+
+    @pytest.mark.parametrize("model", [SIR, SIRD, SIRF, SEWIRF])
+    def test_run_sensitivity(self, model):
+        params = np.array([model.EXAMPLE[Term.PARAM_DICT][p] for p in model.PARAMETERS])
+        y0 = np.array([model.EXAMPLE[Term.Y0_DICT][v] for v in model.VARIABLES], dtype=np.float64)
+        sim, sens = _ODESolver.run_sensitivity(model, params, y0, step_n=50, method="rk4")
+        assert np.allclose(sim, _ODESolver.run_array(model, params, y0, step_n=50, method="rk4"))
+        assert sens.shape == (51, len(y0), len(params))
+        diff = np.eye(len(params)) * 1e-6
+        sim_f = functools.partial(_ODESolver.run_array, model, y0=y0, step_n=50, method="rk4")
+        sens_numerical = np.stack([(sim_f(params + d) - sim_f(params - d)) / 2e-6 for d in diff], axis=-1)
+        assert np.allclose(sens, sens_numerical, rtol=1e-4, atol=np.abs(sens_numerical).max() * 1e-6)
+
+
+class TestStochasticSolver(object):
+    @pytest.mark.parametrize("model", [SIR, SIRD, SIRF, SEWIRF])
+    def test_run_batch(self, model):
+        step_n = model.EXAMPLE[Term.STEP_N]
+        param_dict, y0_dict = model.EXAMPLE[Term.PARAM_DICT], model.EXAMPLE[Term.Y0_DICT]
+        params = np.array([param_dict[p] for p in model.PARAMETERS])
+        y0 = np.array([y0_dict[v] for v in model.VARIABLES])
+        batch = _StochasticSolver.run_batch(model, np.tile(params, (500, 1)), y0, step_n=step_n, rng=np.random.default_rng(0))
+        assert batch.shape == (500, step_n + 1, len(model.VARIABLES))
+        assert batch.dtype == np.int64
+        assert (batch >= 0).all() and (batch.sum(axis=2) == y0.sum()).all()
+        again = _StochasticSolver.run_batch(model, np.tile(params, (500, 1)), y0, step_n=step_n, rng=np.random.default_rng(0))
+        assert np.array_equal(batch, again)
+        steps = [0, 10, step_n]
+        assert _StochasticSolver.run_batch(model, params, y0, step_n, np.random.default_rng(0), steps=steps).shape == (1, 3, len(y0))
+        # Mean values are near to the solution of the ODE
+        solution = _ODESolver.run_array(model, params, y0.astype(np.float64), step_n=step_n)
+        assert np.allclose(batch.mean(axis=0), solution, atol=y0.sum() * 0.1)
+
+    @pytest.mark.parametrize("model", [SIR])
+    def test_run_batch_error(self, model):
+        y0 = np.array([model.EXAMPLE[Term.Y0_DICT][v] for v in model.VARIABLES])
+        rng = np.random.default_rng(0)
+        with pytest.raises(ValueError):
+            _StochasticSolver.run_batch(model, np.array([0.2, 0.075, 0.1]), y0, step_n=10, rng=rng)
+        with pytest.raises(ValueError):
+            _StochasticSolver.run_batch(model, np.array([[0.2, 0.075]] * 2), np.array([y0] * 3), step_n=10, rng=rng)
+        with pytest.raises(NotImplementedError):
+            _StochasticSolver.run_batch(SIRFV, np.zeros(5), np.ones(5, dtype=np.int64), step_n=10, rng=rng)
+
+
+class TestMetapopulation(object):
+    @pytest.mark.parametrize("model", [SIR, SIRD, SIRF, SEWIRF])
+    def test_independent(self, model):
+        regions = ["A", "B", "C"]
+        param_dict, y0_dict = model.EXAMPLE[Term.PARAM_DICT], model.EXAMPLE[Term.Y0_DICT]
+        param_df = pd.DataFrame([{k: v * scale for (k, v) in param_dict.items()} for scale in (0.8, 1.0, 1.2)], index=regions)
+        y0_df = pd.DataFrame([y0_dict] * len(regions), index=regions)
+        meta = Metapopulation(model, regions, sparse.csr_matrix((3, 3)), first_date="01Jan2022", method="rk4")
+        sim_df = meta.simulate(end_date="30Apr2022", y0_df=y0_df, param_df=param_df)
+        assert sim_df.columns.tolist() == [(region, var) for region in regions for var in model.VARIABLES]
+        y0 = np.array([y0_dict[v] for v in model.VARIABLES], dtype=np.float64)
+        for region in regions:
+            solution = _ODESolver.run_array(model, param_df.loc[region, model.PARAMETERS].to_numpy(), y0, len(sim_df) - 1, method="rk4")
+            assert np.array_equal(sim_df[region].to_numpy(), solution.round())
+
+    @pytest.mark.parametrize("model", [SIRF])
+    def test_coupling(self, model):
+        regions = [f"R{i}" for i in range(200)]
+        travel = sparse.random(200, 200, density=0.02, random_state=0) * 0.02
+        y0_df = pd.DataFrame({Term.S: 100_000, Term.CI: 0, Term.R: 0, Term.F: 0}, index=regions)
+        y0_df.loc["R0"] = [99_000, 1000, 0, 0]
+        meta = Metapopulation(model, regions, travel, first_date="01Jan2022")
+        assert np.allclose(np.asarray(meta.mobility.sum(axis=1)).ravel(), 1)
+        sim_df = meta.simulate(end_date="30Jun2022", y0_df=y0_df, param_df=model.EXAMPLE[Term.PARAM_DICT])
+        assert (sim_df.xs(Term.CI, axis=1, level=1).max() > 0).mean() > 0.9
+        assert np.allclose(sim_df.T.groupby(level=0).sum().T, 100_000, atol=2)
+        # Without travel, only the first region has cases
+        scaled = Metapopulation.scale_travel(travel, np.zeros(200))
+        sim_df = Metapopulation(model, regions, scaled, first_date="01Jan2022").simulate("30Jun2022", y0_df, model.EXAMPLE[Term.PARAM_DICT])
+        assert (sim_df.xs(Term.CI, axis=1, level=1).max() > 0).sum() == 1
+
+    @pytest.mark.parametrize("model", [SIRF])
+    def test_error(self, model):
+        regions = ["A", "B"]
+        with pytest.raises(ValueError):
+            Metapopulation(model, regions, np.zeros((3, 3)), first_date="01Jan2022")
+        with pytest.raises(UnExpectedValueRangeError):
+            Metapopulation(model, regions, np.array([[0, 1.5], [0, 0]]), first_date="01Jan2022")
+        with pytest.raises(NotImplementedError):
+            Metapopulation(SIRFV, regions, np.zeros((2, 2)), first_date="01Jan2022")
+        meta = Metapopulation(model, regions, np.zeros((2, 2)), first_date="01Jan2022")
+        y0_df = pd.DataFrame([model.EXAMPLE[Term.Y0_DICT]], index=["A"])
+        with pytest.raises(NAFoundError):
+            meta.simulate("31Jan2022", y0_df=y0_df, param_df=model.EXAMPLE[Term.PARAM_DICT])
+
+
+class TestBudgetScheduler(object):
+    @pytest.mark.parametrize("model", [SIR, SIRF])
+    def test_run(self, model):
+        scheduler = BudgetScheduler(n_trials=320, batch_size=16, n_jobs=1)
+        handler_dict = {}
+        for (name, rate) in zip(["A", "B"], [0.8, 1.2]):
+            sim_df = _simulate(model, ["31Jan2021", "28Feb2021"], rates=[1, rate])
+            handler = _estimation_handler(model, ["31Jan2021", "28Feb2021"])
+            scheduler.add(name, handler, sim_df)
+            handler_dict[name] = handler
+        with pytest.raises(UnExpectedValueError):
+            scheduler.add("A", handler, sim_df)
+        result_dict = scheduler.run()
+        assert list(result_dict.keys()) == ["A", "B"]
+        assert all(list(phase_dict.keys()) == ["0th", "1st"] for phase_dict in result_dict.values())
+        trials = [info_dict[Term.TRIALS] for phase_dict in result_dict.values() for info_dict in phase_dict.values()]
+        assert min(trials) >= 16 and sum(trials) <= 320
+        # Estimated values were registered
+        assert handler_dict["B"].simulate()[Term.DATE].max() == pd.Timestamp("28Feb2021")
+
+    @pytest.mark.parametrize("model", [SIRF])
+    def test_run_uneven(self, model):
+        sim_df = _simulate(model, ["31Mar2021"])
+        scheduler = BudgetScheduler(n_trials=320, batch_size=16, n_jobs=1)
+        # Easy: parameter values were registered (warm start), hard: without prior values
+        scheduler.add("easy", _estimation_handler(model, ["31Mar2021"], param_dict=model.EXAMPLE[Term.PARAM_DICT]), sim_df)
+        scheduler.add("hard", _estimation_handler(model, ["31Mar2021"]), sim_df)
+        result_dict = scheduler.run()
+        # The easy phase converged in the first round and released the budget
+        assert result_dict["easy"]["0th"][Term.TRIALS] == 16
+        assert result_dict["hard"]["0th"][Term.TRIALS] > 2 * result_dict["easy"]["0th"][Term.TRIALS]
+
+    @pytest.mark.parametrize("model", [SIRF])
+    @pytest.mark.parametrize("timeout", [1, 2])
+    def test_run_timeout(self, model, timeout):
+        sim_df = _simulate(model, ["31Mar2021"])
+        # Phases will not converge and the wall-clock budget will stop optimization
+        scheduler = BudgetScheduler(timeout=timeout, batch_size=16, tail_n=1000, allowance=(2, 3), n_jobs=1)
+        for name in ["A", "B"]:
+            scheduler.add(name, _estimation_handler(model, ["31Mar2021"]), sim_df)
+        stopwatch = StopWatch()
+        result_dict = scheduler.run()
+        # Time cost of the last round is estimated with the runtime of the previous round (margin for CPU load)
+        assert stopwatch.stop() <= timeout + 1
+        assert all(phase_dict["0th"][Term.TRIALS] > 16 for phase_dict in result_dict.values())
+
+    @pytest.mark.parametrize("model", [SIR])
+    def test_run_trial_cap(self, model):
+        sim_df = _simulate(model, ["31Mar2021"])
+        with ParallelExecutor(n_jobs=2) as executor:
+            scheduler = BudgetScheduler(n_trials=3, batch_size=16, executor=executor)
+            for name in ["A", "B", "C", "D", "E"]:
+                scheduler.add(name, _estimation_handler(model, ["31Mar2021"]), sim_df)
+            result_dict = scheduler.run()
+        # The trial budget is a hard cap, even when it is smaller than the number of phases
+        assert list(result_dict.keys()) == ["A"]
+        assert result_dict["A"]["0th"][Term.TRIALS] == 3
+        # Studies were kept in the main process
+        assert [estimator.trial_n for (_, estimator, _) in scheduler._task_dict.values()] == [3, 0, 0, 0, 0]
+
+    def test_error(self):
+        with pytest.raises(ValueError):
+            BudgetScheduler()
+        scheduler = BudgetScheduler(timeout=10)
+        with pytest.raises(UnExecutedError):
+            scheduler.run()
+        handler = ODEHandler(SIR, "01Jan2021")
+        handler.add(end_date="31Jan2021", y0_dict=SIR.EXAMPLE[Term.Y0_DICT])
+        with pytest.raises(UnExecutedError):
+            scheduler.add("A", handler, pd.DataFrame(columns=Term.DSIFR_COLUMNS))
+
+
+class TestSimulationCache(object):
+    def test_lru(self):
+        cache = SimulationCache(max_bytes=64 * 3)
+        keys = [cache.key(SIR, [0.2, 0.075], [999_000, 1000, 0], step_n) for step_n in range(4)]
+        assert cache.get(keys[0]) is None
+        arrays = [cache.put(key, np.full(8, i, dtype=np.float64)) for (i, key) in enumerate(keys[:3])]
+        assert not arrays[0].flags.writeable
+        assert cache.get(keys[0]) is arrays[0]
+        cache.put(keys[3], np.zeros(8))
+        assert cache.get(keys[1]) is None
+        assert cache.info() == {"hits": 1, "misses": 2, "size": 3, "bytes": 64 * 3, "max_bytes": 64 * 3}
+        cache.resize(max_bytes=64)
+        assert cache.info()["size"] == 1
+        cache.put(keys[0], np.zeros(16))
+        assert cache.get(keys[0]) is None
+        cache.clear()
+        assert (cache.hits, cache.misses, cache.info()["size"]) == (0, 0, 0)
+
+    def test_key(self):
+        cache = SimulationCache(digits=6)
+        key = cache.key(SIR, [0.2, 0.075], [999_000, 1000, 0], 180, method="RK45", steps=None)
+        assert key == cache.key(SIR, np.array([0.2 + 1e-9, 0.075]), [999_000, 1000, 0], 180, steps=None, method="RK45")
+        assert key != cache.key(SIR, [0.2 + 1e-5, 0.075], [999_000, 1000, 0], 180, method="RK45", steps=None)
+        assert key != cache.key(SIR, [0.2, 0.075], [999_000, 1000, 0], 180, method="rk4", steps=None)
+        assert key != cache.key(SIRD, [0.2, 0.075], [999_000, 1000, 0], 180, method="RK45", steps=None)
+
+    @pytest.mark.parametrize("model", [SIR])
+    def test_simulate(self, model):
+        cache = SimulationCache.shared()
+        cache.clear()
+        handler = ODEHandler(model, "01Jan2021", 720)
+        handler.add(end_date="31Jan2021", y0_dict=model.EXAMPLE[Term.Y0_DICT], param_dict=model.EXAMPLE[Term.PARAM_DICT])
+        # Disabled as default
+        assert not cache.enabled
+        original_df = handler.simulate()
+        assert handler.simulate().equals(original_df)
+        assert cache.info() == {"hits": 0, "misses": 0, "size": 0, "bytes": 0, "max_bytes": 0}
+        cache.resize(max_bytes=32 * 1024 ** 2)
+        try:
+            sim_df = handler.simulate()
+            sim_df.loc[0, Term.S] = -1
+            assert cache.hits == 0
+            cached_df = handler.simulate()
+            assert cache.hits == 1
+            assert cached_df.equals(original_df)
+            assert handler.simulate(interpolation="constant").equals(cached_df)
+            assert cache.hits == 1
+        finally:
+            cache.resize(max_bytes=0)
+            cache.clear()
+
+
+class TestTrajectoryStore(object):
+    def test_write_read(self, tmp_path):
+        filename = tmp_path / "trajectories.bin"
+        dates = pd.date_range("01Jan2021", "10Jan2021", freq="D")
+        values = np.arange(4 * len(dates) * 2).reshape(4, len(dates), 2)
+        with TrajectoryStore(filename, mode="w", dates=dates, variables=["Infected", "Fatal"]) as store:
+            store.write(ids=["A/0", "A/1"], values=values[:2])
+            with pytest.raises(ValueError):
+                store.write(ids=["A/1"], values=values[:1])
+            with pytest.raises(ValueError):
+                store.write(ids=["B/0"], values=values[:2])
+        with TrajectoryStore(filename, mode="a") as store:
+            store.write(ids=["B/0", "B/1"], values=values[2:])
+        store = TrajectoryStore(filename)
+        assert store.ids == ["A/0", "A/1", "B/0", "B/1"]
+        assert store.dates.equals(pd.DatetimeIndex(dates, name=Term.DATE))
+        assert isinstance(store.array, np.memmap)
+        assert np.array_equal(store.array, values)
+        assert np.array_equal(store.select(ids=["B/1", "A/0"], variables=["Fatal"]), values[[3, 0]][:, :, [1]])
+        df = store.read(ids=["B/0"], start_date="03Jan2021", end_date="05Jan2021", variables=["Infected"])
+        assert df.columns.tolist() == [Term.ID, Term.DATE, "Infected"]
+        assert df[Term.DATE].tolist() == dates[2:5].tolist()
+        assert df["Infected"].tolist() == values[2, 2:5, 0].tolist()
+        with pytest.raises(UnExpectedValueError):
+            store.read(ids=["C/0"])
+        with pytest.raises(ValueError):
+            store.write(ids=["C/0"], values=values[:1])
+
+    def test_interrupted(self, tmp_path):
+        filename = tmp_path / "trajectories.bin"
+        dates = pd.date_range("01Jan2021", "10Jan2021", freq="D")
+        values = np.arange(3 * len(dates) * 2).reshape(3, len(dates), 2)
+        store = TrajectoryStore(filename, mode="w", dates=dates, variables=["Infected", "Fatal"])
+        store.write(ids=["A/0", "A/1"], values=values[:2])
+        # Metadata was saved with .write() before .close()
+        assert TrajectoryStore(filename).ids == ["A/0", "A/1"]
+        # Stopped after appending a part of the array, before saving metadata
+        with filename.open("ab") as fh:
+            fh.write(values[2].tobytes()[:40])
+        with pytest.raises(ValueError):
+            TrajectoryStore(filename)
+        with TrajectoryStore(filename, mode="a") as store:
+            assert store.ids == ["A/0", "A/1"]
+            store.write(ids=["A/2"], values=values[2:])
+        assert np.array_equal(TrajectoryStore(filename).array, values)
+        # Broken array
+        with filename.open("r+b") as fh:
+            fh.truncate(100)
+        with pytest.raises(ValueError):
+            TrajectoryStore(filename, mode="a")
+
+    @pytest.mark.parametrize("model", [SIR])
+    def test_simulate_ensemble(self, model, tmp_path):
+        filename = tmp_path / "ensemble.bin"
+        y0_dict, param_dict = model.EXAMPLE[Term.Y0_DICT], model.EXAMPLE[Term.PARAM_DICT]
+        handler = ODEHandler(model, "01Jan2021", 1440, method="rk4")
+        handler.add(end_date="31Jan2021", y0_dict=y0_dict, param_dict=param_dict)
+        draw_df = pd.DataFrame({"rho": [0.1, 0.2, 0.3]}, index=["low", "middle", "high"])
+        band_df = handler.simulate_ensemble(draw_df, q=[0.5], chunk_size=2, filename=filename)
+        store = TrajectoryStore(filename)
+        assert store.ids == ["low", "middle", "high"]
+        assert store.dates.equals(band_df.index)
+        assert store.variables == model.VARIABLES
+        assert np.allclose(store.select(ids=["middle"])[0], band_df.to_numpy(), rtol=0.02, atol=1)
+
+
+class TestParamEstimator(object):
+    @pytest.mark.parametrize("model", [SIR, SIRF])
+    @pytest.mark.parametrize("metric", ["MAE", "MSE", "MSLE", "MAPE", "RMSE", "RMSLE", "R2"])
+    def test_score(self, model, metric):
+        handler = ODEHandler(model, "01Jan2021", tau=720)
+        handler.add("31Mar2021", y0_dict=model.EXAMPLE[Term.Y0_DICT], param_dict=model.EXAMPLE[Term.PARAM_DICT])
+        data_df = handler.simulate()
+        estimator = _ParamEstimator(model, data_df, tau=720, metric=metric, quantiles=(0.1, 0.9))
+        param_dict = {k: v * 1.1 for (k, v) in model.EXAMPLE[Term.PARAM_DICT].items()}
+        sim_df = _ODESolver(model, **param_dict).run(step_n=estimator._step_n, **estimator._y0_dict)
+        evaluator = Evaluator(estimator._taufree_df.iloc[:, 1:], sim_df.iloc[:, 1:], how="inner")
+        assert estimator._score(**param_dict) == pytest.approx(evaluator.score(metric=metric), rel=1e-3)
+
+    @pytest.mark.parametrize("model", [SIR, SIRF])
+    @pytest.mark.parametrize("batch_size", [1, 8])
+    def test_run(self, model, batch_size):
+        handler = ODEHandler(model, "01Jan2021", tau=720)
+        handler.add("31Mar2021", y0_dict=model.EXAMPLE[Term.Y0_DICT], param_dict=model.EXAMPLE[Term.PARAM_DICT])
+        estimator = _ParamEstimator(model, handler.simulate(), tau=720, metric="RMSLE", quantiles=(0.1, 0.9))
+        check_dict = {"timeout": 5, "batch_size": batch_size, "tail_n": 4, "allowance": (0.99, 1.01)}
+        study_dict = {"pruner": "threshold", "upper": 0.5, "percentile": 50, "seed": 0, "constant_liar": False}
+        est_dict = estimator.run(check_dict, study_dict)
+        assert set(model.PARAMETERS).issubset(est_dict)
+        assert est_dict[Term.TRIALS] % batch_size == 0
+        # The score is the best value of the trials (simulated at once), not re-simulated
+        assert est_dict["RMSLE"] == estimator._study.best_value == estimator.scores[-1]
+
+    @pytest.mark.parametrize("model", [SIR, SIRD, SIRF])
+    def test_run_gradient(self, model):
+        param_dict = model.EXAMPLE[Term.PARAM_DICT]
+        handler = ODEHandler(model, "01Jan2021", tau=1440, n_jobs=1)
+        handler.add("31Mar2021", y0_dict=model.EXAMPLE[Term.Y0_DICT], param_dict=param_dict)
+        data_df = handler.simulate()
+        est_handler = ODEHandler(model, "01Jan2021", tau=1440, n_jobs=1)
+        est_handler.add("31Mar2021", y0_dict=model.EXAMPLE[Term.Y0_DICT])
+        est_dict = est_handler.estimate_params(data_df, optimizer="lbfgs")["0th"]
+        assert est_dict["rho"] == pytest.approx(param_dict["rho"], rel=0.05)
+        assert est_dict["sigma"] == pytest.approx(param_dict["sigma"], rel=0.05)
+        assert est_dict[Term.TRIALS] < 100
+        with pytest.raises(UnExpectedValueError):
+            est_handler.estimate_params(data_df, optimizer="unknown")
+        mae_handler = ODEHandler(model, "01Jan2021", tau=1440, metric="MAE", n_jobs=1)
+        mae_handler.add("31Mar2021", y0_dict=model.EXAMPLE[Term.Y0_DICT])
+        with pytest.raises(UnExpectedValueError):
+            mae_handler.estimate_params(data_df, optimizer="lbfgs")
+
+    @pytest.mark.parametrize("model", [SIR, SIRF])
+    def test_run_trial_budget(self, model):
+        handler = ODEHandler(model, "01Jan2021", tau=720)
+        handler.add("31Mar2021", y0_dict=model.EXAMPLE[Term.Y0_DICT], param_dict=model.EXAMPLE[Term.PARAM_DICT])
+        estimator = _ParamEstimator(model, handler.simulate(), tau=720, metric="RMSLE", quantiles=(0.1, 0.9))
+        check_dict = {"timeout": 0, "batch_size": 16, "n_trials": 40, "tail_n": 100, "allowance": (2, 3)}
+        study_dict = {"pruner": "threshold", "upper": 0.5, "percentile": 50, "seed": 0, "constant_liar": False}
+        est_dict = estimator.run(check_dict, study_dict)
+        assert est_dict[Term.TRIALS] == 40
+        est_dict_again = estimator.run(check_dict, study_dict)
+        assert all(est_dict[param] == est_dict_again[param] for param in model.PARAMETERS)
+        # Stop with convergence tolerance
+        check_dict.update({"n_trials": 1000, "tail_n": 2, "tolerance": 1.0})
+        assert estimator.run(check_dict, study_dict)[Term.TRIALS] == 32
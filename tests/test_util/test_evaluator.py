@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import numpy as np
 import pandas as pd
 import pytest
 from covsirphy import Evaluator, UnExpectedValueError
@@ -47,6 +48,23 @@ class TestEvaluator(object):
             return
         assert isinstance(evaluator.score(metric=metric), float)
 
+    @pytest.mark.parametrize("metric", ["ME", "MAE", "MSE", "MSLE", "MAPE", "RMSE", "RMSLE", "R2"])
+    @pytest.mark.parametrize("columns", [["value"], ["value", "constant"]])
+    def test_score_array(self, metric, columns):
+        true = pd.DataFrame({"value": [20, 40, 30, 50, 90, 10], "constant": [5, 5, 5, 5, 5, 5]})
+        pred = pd.DataFrame({"value": [20, 45, 30, 50, 110, 55], "constant": [5, 5, 6, 5, 5, 5]})
+        true_array, pred_array = true[columns].to_numpy(), pred[columns].to_numpy()
+        if metric == "ME" and len(columns) > 1:
+            with pytest.raises(ValueError):
+                Evaluator.score_array(true_array, pred_array, metric=metric)
+            return
+        score = Evaluator(true[columns], pred[columns], how="all").score(metric=metric)
+        assert Evaluator.score_array(true_array, pred_array, metric=metric) == pytest.approx(score)
+        batch_scores = Evaluator.score_array(true_array, np.stack([pred_array, true_array]), metric=metric)
+        assert batch_scores.shape == (2,)
+        assert batch_scores[0] == pytest.approx(score)
+        assert Evaluator.score_array(true_array, true_array, metric=metric) == batch_scores[1]
+
     def test_error(self):
         with pytest.raises(TypeError):
             Evaluator([1, 2, 3], [2, 5, 7])
@@ -57,3 +75,7 @@ class TestEvaluator(object):
             evaluator.score(metric="Unknown")
         with pytest.raises(UnExpectedValueError):
             evaluator.smaller_is_better(metric="Unknown")
+        with pytest.raises(UnExpectedValueError):
+            Evaluator.score_array(np.array([5, 10]), np.array([8, 12]), metric="Unknown")
+        with pytest.raises(ValueError):
+            Evaluator.score_array(np.array([5, 10]), np.array([8, 12, 6]))
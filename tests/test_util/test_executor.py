@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import functools
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client
+import pytest
+from covsirphy import ParallelExecutor, UnExpectedTypeError, ODEHandler, SIR
+
+
+def _power(x, y):
+    return (x ** y, os.getpid())
+
+
+def _fail(x):
+    raise ValueError(f"{x} cannot be handled.")
+
+
+class _UnpicklableError(Exception):
+    def __init__(self, x):
+        super().__init__(f"{x} cannot be handled.")
+        self.lock = threading.Lock()
+
+
+def _fail_unpicklable(x):
+    raise _UnpicklableError(x)
+
+
+def _start_nodes(jobs_list):
+    # Stand-in of a multi-node cluster: worker nodes on localhost
+    addresses, processes = [], []
+    for n_jobs in jobs_list:
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "covsirphy.util.executor", "--port", str(port), "--authkey", "test", "--n_jobs", str(n_jobs)]))
+        addresses.append(("localhost", port))
+    for address in addresses:
+        for _ in range(100):
+            try:
+                with Client(address, authkey=b"test") as conn:
+                    conn.recv()
+                    conn.send(("close", None))
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.2)
+    return (addresses, processes)
+
+
+@pytest.fixture(scope="module")
+def cluster_addresses():
+    addresses, processes = _start_nodes([1, 2])
+    yield addresses
+    for process in processes:
+        process.terminate()
+        process.wait()
+
+
+class TestParallelExecutor(object):
+    @pytest.mark.parametrize("n_jobs", [1, 2])
+    def test_map(self, n_jobs):
+        with ParallelExecutor(n_jobs=n_jobs) as executor:
+            assert executor.n_jobs == n_jobs
+            results = executor.map(functools.partial(_power, y=2), range(10))
+            assert [value for (value, _) in results] == [x ** 2 for x in range(10)]
+            # Workers will be kept alive across calls
+            pids = {pid for (_, pid) in results}
+            results = executor.map(functools.partial(_power, y=3), range(10))
+            assert [value for (value, _) in results] == [x ** 3 for x in range(10)]
+            pids |= {pid for (_, pid) in results}
+            if n_jobs == 1:
+                assert pids == {os.getpid()}
+            else:
+                assert pids.issubset({process.pid for process in executor._backend._pool._pool})
+        assert getattr(executor._backend, "_pool", None) is None
+
+    @pytest.mark.parametrize("backend", ["serial", "thread", "process"])
+    @pytest.mark.parametrize("start_method", [None, "spawn", "forkserver"])
+    def test_backend(self, backend, start_method):
+        with ParallelExecutor(n_jobs=2, backend=backend, start_method=start_method) as executor:
+            results = executor.map(functools.partial(_power, y=2), range(10))
+            assert [value for (value, _) in results] == [x ** 2 for x in range(10)]
+            pids = {pid for (_, pid) in results}
+            assert (os.getpid() in pids) == (backend != "process")
+            with pytest.raises(ValueError):
+                executor.map(_fail, range(10))
+
+    def test_cluster(self, cluster_addresses):
+        with ParallelExecutor(backend="cluster", addresses=cluster_addresses, authkey="test") as executor:
+            assert executor.n_jobs == 3
+            for y in [2, 3]:
+                results = executor.map(functools.partial(_power, y=y), range(20))
+                assert [value for (value, _) in results] == [x ** y for x in range(20)]
+                assert os.getpid() not in {pid for (_, pid) in results}
+            with pytest.raises(ValueError):
+                executor.map(_fail, range(10))
+        # Nodes can serve the next executor
+        with ParallelExecutor(backend="cluster", addresses=cluster_addresses[:1], authkey="test") as executor:
+            assert [value for (value, _) in executor.map(functools.partial(_power, y=2), range(5))] == [0, 1, 4, 9, 16]
+        with pytest.raises(ValueError):
+            ParallelExecutor(backend="cluster", addresses=cluster_addresses)
+
+    def test_cluster_error(self, cluster_addresses):
+        # Exceptions which cannot be serialized will be raised as RuntimeError with the traceback
+        with ParallelExecutor(backend="cluster", addresses=cluster_addresses[:1], authkey="test") as executor:
+            with pytest.raises(RuntimeError, match="_UnpicklableError"):
+                executor.map(_fail_unpicklable, range(5))
+            # The node is still alive
+            assert [value for (value, _) in executor.map(functools.partial(_power, y=2), range(5))] == [0, 1, 4, 9, 16]
+
+    def test_cluster_disconnected(self, cluster_addresses):
+        addresses, processes = _start_nodes([1, 1])
+        try:
+            with ParallelExecutor(backend="cluster", addresses=[*cluster_addresses, addresses[0]], authkey="test") as executor:
+                assert executor.n_jobs == 4
+                processes[0].terminate()
+                processes[0].wait()
+                # Chunks of the disconnected node will be sent to the other nodes
+                results = executor.map(functools.partial(_power, y=2), range(20))
+                assert [value for (value, _) in results] == [x ** 2 for x in range(20)]
+                assert executor.n_jobs == 3
+            with ParallelExecutor(backend="cluster", addresses=addresses[1:], authkey="test") as executor:
+                assert executor.n_jobs == 1
+                processes[1].terminate()
+                processes[1].wait()
+                with pytest.raises(ConnectionError, match="disconnected"):
+                    executor.map(functools.partial(_power, y=2), range(20))
+        finally:
+            for process in processes:
+                process.kill()
+                process.wait()
+
+    def test_handler(self):
+        model = SIR
+        sim_handler = ODEHandler(model, "01Jan2021", tau=1440)
+        sim_handler.add("31Mar2021", y0_dict=model.EXAMPLE["y0_dict"], param_dict=model.EXAMPLE["param_dict"])
+        sim_df = sim_handler.simulate()
+        with ParallelExecutor(n_jobs=2) as executor:
+            handler = ODEHandler(model, "01Jan2021", executor=executor)
+            handler.add("28Feb2021", y0_dict=model.EXAMPLE["y0_dict"])
+            handler.add("31Mar2021")
+            assert isinstance(handler.estimate_tau(sim_df), int)
+            pool = executor._backend._pool
+            est_dict = handler.estimate_params(sim_df, n_trials=64)
+            assert executor._backend._pool is pool
+        assert set(est_dict.keys()) == {"0th", "1st"}
+        with pytest.raises(UnExpectedTypeError):
+            ODEHandler(model, "01Jan2021", executor=2)